@@ -18,11 +18,154 @@ class Settings(BaseSettings):
     BRAVE_API_KEY: str = os.getenv("BRAVE_API_KEY", "")
     NEWS_API_KEY: str = os.getenv("NEWS_API_KEY", "")
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", "2"))
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("REDIS_CONNECT_TIMEOUT_SECONDS", "2"))
+    REDIS_CODEC: str = os.getenv("REDIS_CODEC", "msgpack")  # 'msgpack' or 'json'
+    REDIS_COMPRESS_THRESHOLD: int = int(os.getenv("REDIS_COMPRESS_THRESHOLD", "4096"))  # bytes; 0 disables zstd
     SEARXNG_URL: str = os.getenv("SEARXNG_URL", "http://localhost:8888")
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "a_very_secret_key_that_should_be_changed")
     VLLM_MODEL_NAME: str = os.getenv("VLLM_MODEL_NAME", "Magistral-Small-2506-Q4_0")  # Model name for llama-cpp-server
     JWT_ALGORITHM: str = "HS256"
 
+    # Session store: 'memory' (single worker) or 'redis' (shared by all workers/replicas)
+    SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))  # idle expiry, renewed on activity
+    SESSION_NEAR_CACHE_SECONDS: float = float(os.getenv("SESSION_NEAR_CACHE_SECONDS", "2"))
+    SESSION_HISTORY_TURNS: int = int(os.getenv("SESSION_HISTORY_TURNS", "20"))  # recent turns kept per session
+    SESSION_MAX_COUNT: int = int(os.getenv("SESSION_MAX_COUNT", "10000"))  # in-memory backend LRU caps
+    SESSION_MAX_BYTES: int = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+    SESSION_SWEEP_INTERVAL_SECONDS: float = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "30"))
+
+    # Tool output is compacted to this many (estimated) tokens before re-entering the model
+    TOOL_RESULT_TOKEN_BUDGET: int = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "800"))
+
+    # Agent loop limits per user turn (overridable per session via agent_config)
+    AGENT_MAX_TOOL_ITERATIONS: int = int(os.getenv("AGENT_MAX_TOOL_ITERATIONS", "4"))
+    AGENT_MAX_TURN_SECONDS: float = float(os.getenv("AGENT_MAX_TURN_SECONDS", "90"))
+    TOOL_CALL_TIMEOUT_SECONDS: float = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "30"))
+    LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+    # Compiled graph variants kept for sessions whose agent_config picks other tools or another model
+    GRAPH_CACHE_MAX_VARIANTS: int = int(os.getenv("GRAPH_CACHE_MAX_VARIANTS", "16"))
+    AGENT_ALLOWED_MODELS: str = os.getenv("AGENT_ALLOWED_MODELS", "")  # comma-separated, besides OLLAMA_MODEL
+
+    # Page fetch-and-extract tool
+    PAGE_FETCH_MAX_PAGES: int = int(os.getenv("PAGE_FETCH_MAX_PAGES", "3"))
+    PAGE_FETCH_MAX_CONCURRENCY: int = int(os.getenv("PAGE_FETCH_MAX_CONCURRENCY", "4"))
+    PAGE_FETCH_MAX_BYTES: int = int(os.getenv("PAGE_FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+    PAGE_FETCH_TIMEOUT_SECONDS: float = float(os.getenv("PAGE_FETCH_TIMEOUT_SECONDS", "10"))
+    PAGE_FETCH_MAX_CHARS: int = int(os.getenv("PAGE_FETCH_MAX_CHARS", "4000"))
+    PAGE_PARSER_WORKERS: int = int(os.getenv("PAGE_PARSER_WORKERS", "2"))
+    PAGE_CACHE_TTL_SECONDS: int = int(os.getenv("PAGE_CACHE_TTL_SECONDS", "86400"))
+
+    # Circuit breakers for outbound dependencies (mem0, search providers, LLM backend)
+    CIRCUIT_FAILURE_RATE: float = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+    CIRCUIT_WINDOW_SIZE: int = int(os.getenv("CIRCUIT_WINDOW_SIZE", "20"))
+    CIRCUIT_MINIMUM_CALLS: int = int(os.getenv("CIRCUIT_MINIMUM_CALLS", "5"))
+    CIRCUIT_RESET_TIMEOUT_SECONDS: float = float(os.getenv("CIRCUIT_RESET_TIMEOUT_SECONDS", "30"))
+
+    # End-to-end request deadline (X-Request-Timeout header or agent_config["request_timeout_seconds"])
+    REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "120"))
+    MAX_REQUEST_TIMEOUT_SECONDS: float = float(os.getenv("MAX_REQUEST_TIMEOUT_SECONDS", "600"))
+    # Per-stage caps; each is further shrunk to the time left on the request
+    MEMORY_TIMEOUT_SECONDS: float = float(os.getenv("MEMORY_TIMEOUT_SECONDS", "5"))
+    SEARCH_PROVIDER_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_PROVIDER_TIMEOUT_SECONDS", "8"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+    # Optional work is skipped when less than this much budget is left
+    DEADLINE_MEMORY_MIN_SECONDS: float = float(os.getenv("DEADLINE_MEMORY_MIN_SECONDS", "10"))
+    DEADLINE_TOOL_RESERVE_SECONDS: float = float(os.getenv("DEADLINE_TOOL_RESERVE_SECONDS", "15"))
+
+    # Graph checkpoints: "sqlite" (local file), "redis" (shared by all replicas) or "none"
+    CHECKPOINT_BACKEND: str = os.getenv("CHECKPOINT_BACKEND", "sqlite")
+    # Checkpoint store (SQLite, WAL with separate reader/writer connections)
+    CHECKPOINT_DB_PATH: str = os.getenv("CHECKPOINT_DB_PATH", "data/checkpoints.sqlite")
+    CHECKPOINT_SQLITE_CACHE_MB: int = int(os.getenv("CHECKPOINT_SQLITE_CACHE_MB", "64"))
+    CHECKPOINT_SQLITE_MMAP_MB: int = int(os.getenv("CHECKPOINT_SQLITE_MMAP_MB", "256"))
+    # Retention: keep the newest N checkpoints per thread, drop threads idle longer than the TTL
+    CHECKPOINT_KEEP_LAST: int = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+    CHECKPOINT_THREAD_TTL_SECONDS: int = int(os.getenv("CHECKPOINT_THREAD_TTL_SECONDS", str(7 * 86400)))
+    CHECKPOINT_RETENTION_INTERVAL_SECONDS: float = float(os.getenv("CHECKPOINT_RETENTION_INTERVAL_SECONDS", "600"))
+    CHECKPOINT_VACUUM_PAGES: int = int(os.getenv("CHECKPOINT_VACUUM_PAGES", "2000"))
+    # "compact" (compact messages + zstd) or "jsonplus" (LangGraph default); both can read either format
+    CHECKPOINT_SERDE: str = os.getenv("CHECKPOINT_SERDE", "compact")
+    CHECKPOINT_COMPRESS_THRESHOLD: int = int(os.getenv("CHECKPOINT_COMPRESS_THRESHOLD", "1024"))
+    # Store each message once per thread and only refs in each checkpoint
+    CHECKPOINT_MESSAGE_DEDUP: bool = os.getenv("CHECKPOINT_MESSAGE_DEDUP", "true").lower() == "true"
+
+    # llama.cpp KV cache slots: pin sessions to server slots, save/restore their cache
+    # (needs llama-server started with --slot-save-path; inactive on other backends)
+    KV_SLOTS_ENABLED: bool = os.getenv("KV_SLOTS_ENABLED", "false").lower() == "true"
+    KV_SLOTS_URL: str = os.getenv("KV_SLOTS_URL", "")  # defaults to VLLM_URL
+    KV_SLOT_SAVE_DIR: str = os.getenv("KV_SLOT_SAVE_DIR", "")  # the server's --slot-save-path, mounted here
+    KV_SLOT_IDLE_SECONDS: float = float(os.getenv("KV_SLOT_IDLE_SECONDS", "60"))
+    KV_SLOT_MAX_SAVED_FILES: int = int(os.getenv("KV_SLOT_MAX_SAVED_FILES", "200"))
+    KV_SLOT_MAX_SAVED_MB: int = int(os.getenv("KV_SLOT_MAX_SAVED_MB", "8192"))
+    KV_SLOT_TIMEOUT_SECONDS: float = float(os.getenv("KV_SLOT_TIMEOUT_SECONDS", "120"))
+
+    # WebSocket chat: frames queued per connection, and how long a client may stop reading
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_SEND_TIMEOUT_SECONDS: float = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "30"))
+
+    # SSE streaming: token coalescing window, keep-alive interval and the Last-Event-ID resume buffer
+    SSE_COALESCE_CHARS: int = int(os.getenv("SSE_COALESCE_CHARS", "64"))
+    SSE_COALESCE_SECONDS: float = float(os.getenv("SSE_COALESCE_SECONDS", "0.05"))
+    SSE_HEARTBEAT_SECONDS: float = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+    SSE_BUFFER_MAX_EVENTS: int = int(os.getenv("SSE_BUFFER_MAX_EVENTS", "2000"))
+    SSE_RESUME_TTL_SECONDS: float = float(os.getenv("SSE_RESUME_TTL_SECONDS", "120"))
+
+    # Job API: "memory" runs jobs on workers inside the API process, "redis" queues them
+    # for `python -m api.worker` processes. Claims and event reads block for at most
+    # JOB_BLOCK_SECONDS, which has to stay below REDIS_SOCKET_TIMEOUT_SECONDS.
+    JOB_BACKEND: str = os.getenv("JOB_BACKEND", "memory")
+    JOB_WORKER_CONCURRENCY: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))
+    JOB_TTL_SECONDS: int = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+    JOB_MAX_EVENTS: int = int(os.getenv("JOB_MAX_EVENTS", "2000"))
+    JOB_BLOCK_SECONDS: float = float(os.getenv("JOB_BLOCK_SECONDS", "1"))
+    JOB_SHUTDOWN_GRACE_SECONDS: float = float(os.getenv("JOB_SHUTDOWN_GRACE_SECONDS", "30"))
+
+    # Opt-in response cache (agent_config["response_cache"] = "exact" or "semantic"). Answers are
+    # only reused for turns sampled at or below RESPONSE_CACHE_MAX_TEMPERATURE, which
+    # agent_config["response_cache_max_temperature"] can raise for simulation traffic.
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # exact tier: 'memory' or 'redis'
+    RESPONSE_CACHE_TTL_SECONDS: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+    RESPONSE_CACHE_MAX_TEMPERATURE: float = float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0"))
+    RESPONSE_CACHE_SIMILARITY: float = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))  # cosine, semantic tier
+    RESPONSE_CACHE_EMBED_MODEL: str = os.getenv("RESPONSE_CACHE_EMBED_MODEL", "nomic-embed-text")
+    RESPONSE_CACHE_EMBED_TIMEOUT_SECONDS: float = float(os.getenv("RESPONSE_CACHE_EMBED_TIMEOUT_SECONDS", "2"))
+
+    # Rate limits per user and per session (token buckets; per-minute limits, 0 disables one).
+    # 'redis' shares the buckets across replicas and falls back to in-process ones while Redis is down.
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "redis")
+    RATE_LIMIT_REDIS_RETRY_SECONDS: float = float(os.getenv("RATE_LIMIT_REDIS_RETRY_SECONDS", "5"))
+    RATE_LIMIT_USER_REQUESTS_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_USER_REQUESTS_PER_MINUTE", "30"))
+    RATE_LIMIT_SESSION_REQUESTS_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_SESSION_REQUESTS_PER_MINUTE", "20"))
+    RATE_LIMIT_USER_TOKENS_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_USER_TOKENS_PER_MINUTE", "60000"))
+    RATE_LIMIT_SESSION_TOKENS_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_SESSION_TOKENS_PER_MINUTE", "30000"))
+    RATE_LIMIT_USER_TOOL_CALLS_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_USER_TOOL_CALLS_PER_MINUTE", "30"))
+    RATE_LIMIT_SESSION_TOOL_CALLS_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_SESSION_TOOL_CALLS_PER_MINUTE", "20"))
+
+    # Readiness probe (/ready): dependency results cached this long; mem0 is optional by default
+    READINESS_CACHE_SECONDS: float = float(os.getenv("READINESS_CACHE_SECONDS", "2"))
+    READINESS_CHECK_TIMEOUT_SECONDS: float = float(os.getenv("READINESS_CHECK_TIMEOUT_SECONDS", "2"))
+    READINESS_REQUIRE_LLM: bool = os.getenv("READINESS_REQUIRE_LLM", "true").lower() == "true"
+    READINESS_REQUIRE_MEMORY: bool = os.getenv("READINESS_REQUIRE_MEMORY", "false").lower() == "true"
+
+    # Response compression (gzip, or brotli when the brotli package is installed)
+    RESPONSE_COMPRESSION_MIN_BYTES: int = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+    RESPONSE_GZIP_LEVEL: int = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+    RESPONSE_BROTLI_QUALITY: int = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+    # Idempotency-Key on message submission: responses kept this long for retries
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+
+    # Session export (NDJSON stream or files written under EXPORT_DIR)
+    EXPORT_DIR: str = os.getenv("EXPORT_DIR", "data/exports")
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))  # messages read per checkpointer query
+    EXPORT_MAX_CONCURRENCY: int = int(os.getenv("EXPORT_MAX_CONCURRENCY", "4"))  # bulk export
+    EXPORT_MAX_SESSIONS: int = int(os.getenv("EXPORT_MAX_SESSIONS", "1000"))  # per bulk export request
+
     class Config:
         case_sensitive = True
 
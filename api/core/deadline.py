@@ -0,0 +1,88 @@
+"""Per-request latency budget shared by every stage that handles the request.
+
+``post_message`` opens a deadline for the request; memory, search, tool and LLM
+calls read it through a context variable and shrink their own timeouts to fit
+whatever is left, or skip optional work when the budget is nearly spent.
+
+A stage that times out because the request ran out of budget raises
+``DeadlineExceeded``: that is the caller's limit, not a slow dependency, so
+circuit breakers do not count it as a failure.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Tuple, Type
+
+
+class Deadline:
+    """An absolute point in (monotonic) time by which the request must finish."""
+
+    def __init__(self, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.expires_at = time.monotonic() + timeout_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def allows(self, seconds: float) -> bool:
+        """Whether at least ``seconds`` of budget are left."""
+        return self.remaining() >= seconds
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.2f}s of {self.timeout_seconds:.2f}s)"
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def get_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make ``deadline`` the current request deadline inside the block."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def stage_timeout(cap: float, minimum: float = 0.05) -> float:
+    """Timeout for one stage: its own ``cap``, shrunk to the time left on the request."""
+    deadline = get_deadline()
+    if deadline is None:
+        return cap
+    return max(minimum, min(cap, deadline.remaining()))
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """A stage timed out on the request deadline rather than on its own cap."""
+
+
+@contextmanager
+def stage_budget(cap: float, minimum: float = 0.05, timeouts: Tuple[Type[BaseException], ...] = (asyncio.TimeoutError,)):
+    """Yield the stage's timeout (see ``stage_timeout``).
+
+    A ``timeouts`` error raised inside becomes ``DeadlineExceeded`` when the
+    request deadline, not ``cap``, set the timeout.
+    """
+    timeout = stage_timeout(cap, minimum)
+    try:
+        yield timeout
+    except timeouts as e:
+        if timeout < cap and not isinstance(e, DeadlineExceeded):
+            raise DeadlineExceeded(f"Request deadline reached after {timeout:.2f}s (stage cap {cap:.1f}s)") from e
+        raise
+
+
+def budget_allows(seconds: float) -> bool:
+    """False when the current request has less than ``seconds`` left (always True without a deadline)."""
+    deadline = get_deadline()
+    return deadline is None or deadline.allows(seconds)
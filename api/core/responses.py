@@ -0,0 +1,136 @@
+"""Response encoding: orjson bodies, a fast path for trusted models, and gzip/brotli.
+
+The app's default response class is ``ORJSONResponse``. Endpoints that build
+their response model themselves (already validated) return it through
+``trusted_response``: pydantic-core writes the JSON directly, and FastAPI's
+second validation and encoding pass against ``response_model`` is skipped.
+The route keeps ``response_model`` for the OpenAPI schema.
+
+``CompressionMiddleware`` compresses complete bodies of at least
+RESPONSE_COMPRESSION_MIN_BYTES with the best encoding the client accepts
+(brotli when the ``brotli`` package is installed, else gzip). Streamed
+responses (SSE, NDJSON exports) pass through untouched so that events are
+not held back in a compressor buffer.
+"""
+import asyncio
+import gzip
+from typing import Any, Mapping, Optional
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from api.core.config import settings
+
+try:
+    import brotli  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover
+    brotli = None
+
+__all__ = ["ORJSONResponse", "trusted_response", "CompressionMiddleware"]
+
+# Bodies this large are compressed in a worker thread instead of on the event loop
+_OFFLOAD_BYTES = 1 << 20
+
+
+def trusted_response(
+    content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """JSON response for a model (or plain data) the endpoint built itself; no re-validation."""
+    if isinstance(content, BaseModel):
+        body = content.model_dump_json()
+    else:
+        body = orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """'br', 'gzip' or None for an Accept-Encoding header."""
+    offered = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[coding.strip().lower()] = quality
+    wildcard = offered.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_quality = None, 0.0
+    for coding in candidates:
+        quality = offered.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _compressible(content_type: str) -> bool:
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type == "text/event-stream":
+        return False
+    return content_type.startswith("text/") or content_type.endswith(("json", "xml", "javascript"))
+
+
+def _compress(encoding: str, body: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.RESPONSE_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.RESPONSE_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compress large, complete response bodies with the client's preferred encoding."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = settings.RESPONSE_COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+
+        async def send_compressed(message: Message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # held until the first body chunk shows whether it is complete
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            response_start, start = start, None
+            headers = MutableHeaders(raw=response_start["headers"])
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not _compressible(headers.get("content-type", ""))
+            ):
+                await send(response_start)
+                await send(message)
+                return
+            if len(body) >= _OFFLOAD_BYTES:
+                compressed = await asyncio.to_thread(_compress, encoding, body)
+            else:
+                compressed = _compress(encoding, body)
+            headers.add_vary_header("Accept-Encoding")
+            if len(compressed) < len(body):
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                body = compressed
+            await send(response_start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,3 +1,14 @@
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import pathlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import orjson
 from langgraph.graph import StateGraph, END
 try:
     from langgraph.checkpoint.sqlite import SqliteSaver  # type: ignore
@@ -5,45 +16,87 @@ except ModuleNotFoundError:  # pragma: no cover
     # Optional dependency: allow running without SQLite checkpoint support
     SqliteSaver = None
 
+try:
+    from api.services.checkpoint_store import TunedSqliteSaver  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover
+    TunedSqliteSaver = None  # aiosqlite / langgraph-checkpoint-sqlite not installed
+
+from api.core.config import settings
 from api.logic.graph_state import AgentState
 from api.logic.graph_nodes import call_model, call_tool, should_continue
+from api.logic.tools import tools
+from api.services.kv_slots import kv_slots
+from api.services.redis_checkpointer import RedisCheckpointSaver
 
 import logging
 logger = logging.getLogger(__name__)
 
-# Define the graph workflow
-workflow = StateGraph(AgentState)
 
-# Add the nodes
-workflow.add_node("agent", call_model)
-workflow.add_node("action", call_tool)
+def build_workflow(tool_names=None, model_name=None) -> StateGraph:
+    """The agent workflow for one graph variant; the defaults give the global graph."""
+    workflow = StateGraph(AgentState)
 
-# Set the entrypoint
-workflow.set_entry_point("agent")
+    # Add the nodes
+    if tool_names is None and model_name is None:
+        workflow.add_node("agent", call_model)
+        workflow.add_node("action", call_tool)
+    else:
+        workflow.add_node("agent", functools.partial(call_model, tool_names=tool_names, model_name=model_name))
+        workflow.add_node("action", functools.partial(call_tool, tool_names=tool_names))
 
-# Add the conditional edge
-workflow.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "action": "action",
-        END: END
-    }
-)
+    # Set the entrypoint
+    workflow.set_entry_point("agent")
 
-# Add the normal edge
-workflow.add_edge('action', 'agent')
+    # Add the conditional edge
+    workflow.add_conditional_edges(
+        "agent",
+        should_continue,
+        {
+            "action": "action",
+            END: END
+        }
+    )
+
+    # Add the normal edge
+    workflow.add_edge('action', 'agent')
+    return workflow
+
+# Define the graph workflow
+workflow = build_workflow()
 
 app_graph = None # Will be initialized at FastAPI startup or on first use
 _compilation_attempted = False
 _last_checkpointer = None
 
+async def open_checkpointer(backend: str = settings.CHECKPOINT_BACKEND):
+    """Create the checkpoint saver selected by CHECKPOINT_BACKEND ("sqlite", "redis" or "none").
+
+    Returns None when checkpointing is disabled or unavailable.
+    """
+    if backend == "redis":
+        logger.info("Using Redis checkpointer (graph state shared by all replicas).")
+        return RedisCheckpointSaver()
+    if backend == "sqlite":
+        if TunedSqliteSaver is None:
+            logger.warning("aiosqlite or AsyncSqliteSaver unavailable; proceeding without checkpointing.")
+            return None
+        db_path = pathlib.Path(settings.CHECKPOINT_DB_PATH)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        logger.info(f"SQLite DB path: {db_path.resolve()}")
+        checkpointer = await TunedSqliteSaver.open(db_path)
+        logger.info(f"Successfully opened SQLite checkpoint DB (WAL, reader/writer connections): {db_path}")
+        return checkpointer
+    if backend != "none":
+        logger.warning(f"Unknown CHECKPOINT_BACKEND '{backend}', proceeding without checkpointing.")
+    return None
+
 def compile_global_graph(checkpointer_instance):
     """Compile the global conversation graph with checkpointer."""
     global app_graph, _compilation_attempted, _last_checkpointer
     
     _compilation_attempted = True
     _last_checkpointer = checkpointer_instance
+    graph_cache.clear()  # variants compiled with an earlier checkpointer
     
     logger.info(f"Attempting to compile global graph. Checkpointer provided: {checkpointer_instance is not None}")
     logger.info(f"Workflow object: {workflow}")
@@ -51,7 +104,7 @@ def compile_global_graph(checkpointer_instance):
     
     try:
         if checkpointer_instance:
-            logger.info("Compiling graph WITH checkpointer")
+            logger.info(f"Compiling graph WITH checkpointer {type(checkpointer_instance).__name__}")
             app_graph = workflow.compile(checkpointer=checkpointer_instance)
             logger.info(f"Global graph compiled successfully WITH checkpointer: {app_graph}")
         else:
@@ -69,6 +122,10 @@ def compile_global_graph(checkpointer_instance):
         logger.error(f"Exception during graph compilation: {e}", exc_info=True)
         app_graph = None # Ensure app_graph is None if compilation fails
 
+def get_checkpointer():
+    """The checkpointer the global graph was compiled with (None without checkpointing)."""
+    return _last_checkpointer
+
 def get_compiled_graph():
     """Get the compiled graph, compiling it lazily if needed (for TestClient compatibility)."""
     global app_graph, _compilation_attempted
@@ -77,9 +134,183 @@ def get_compiled_graph():
     if app_graph is not None:
         return app_graph
     
-    # If compilation was never attempted (e.g., TestClient), compile without checkpointer
+    # If compilation was never attempted (e.g., TestClient), compile lazily. Only the
+    # Redis checkpointer can be created outside the event loop's startup.
     if not _compilation_attempted:
-        logger.warning("Graph not compiled during startup (likely TestClient). Compiling lazily without checkpointer.")
-        compile_global_graph(None)
+        if settings.CHECKPOINT_BACKEND == "redis":
+            logger.warning("Graph not compiled during startup (likely TestClient). Compiling lazily with the Redis checkpointer.")
+            compile_global_graph(RedisCheckpointSaver())
+        else:
+            logger.warning("Graph not compiled during startup (likely TestClient). Compiling lazily without checkpointer.")
+            compile_global_graph(None)
     
     return app_graph
+
+
+def graph_spec(agent_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """The part of an agent_config that needs its own compiled graph: the tools and the model.
+
+    Other keys (temperature, loop limits, ...) are read from the graph state
+    on every turn and share a graph. Raises ValueError for unknown tools and
+    for models other than OLLAMA_MODEL and AGENT_ALLOWED_MODELS.
+    """
+    agent_config = agent_config or {}
+    tool_names = agent_config.get("tools")
+    if tool_names is not None:
+        if not isinstance(tool_names, list) or not all(isinstance(name, str) for name in tool_names):
+            raise ValueError("agent_config.tools must be a list of tool names")
+        known = {t.name for t in tools}
+        unknown = sorted(set(tool_names) - known)
+        if unknown:
+            raise ValueError(f"Unknown tools in agent_config: {', '.join(unknown)} (available: {', '.join(sorted(known))})")
+        tool_names = None if set(tool_names) == known else sorted(set(tool_names))
+    model_name = agent_config.get("model")
+    if model_name is not None and not isinstance(model_name, str):
+        raise ValueError("agent_config.model must be a model name")
+    if model_name == settings.OLLAMA_MODEL:
+        model_name = None
+    if model_name:
+        allowed = [name.strip() for name in settings.AGENT_ALLOWED_MODELS.split(",") if name.strip()]
+        if model_name not in allowed:
+            raise ValueError(
+                f"Model '{model_name}' is not allowed (available: {', '.join([settings.OLLAMA_MODEL, *allowed])})"
+            )
+    return {"tools": tool_names, "model": model_name or None}
+
+
+def model_name(agent_config: Optional[Dict[str, Any]]) -> str:
+    """The model a session's turns run on (llama-server's own while the KV slot manager is active)."""
+    return kv_slots.served_model((agent_config or {}).get("model"))
+
+
+def spec_key(spec: Dict[str, Any]) -> str:
+    """Canonical hash of a graph_spec."""
+    return hashlib.sha256(orjson.dumps(spec, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+
+
+_DEFAULT_KEY = spec_key({"tools": None, "model": None})
+
+
+class GraphCache:
+    """Bounded LRU of compiled graph variants, keyed by ``spec_key``.
+
+    Variants are compiled on first use, in a worker thread, with the
+    checkpointer of the global graph; concurrent requests for the same
+    variant (from any thread or event loop) wait for a single compilation.
+    The default variant is the global graph and is never evicted; its lookups
+    are counted apart, so ``hit_rate`` covers variant lookups only.
+    """
+
+    def __init__(self, max_variants: int = settings.GRAPH_CACHE_MAX_VARIANTS):
+        self.max_variants = max_variants
+        self._graphs: "OrderedDict[str, Any]" = OrderedDict()
+        self._compiling: Dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by clear(); compilations from an older one are discarded
+        self.default_lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.compiles = 0
+        self.compile_errors = 0
+        self.evictions = 0
+        self.compile_seconds = 0.0
+        self.max_compile_seconds = 0.0
+
+    def clear(self):
+        """Drop every variant, e.g. after the global graph was recompiled with a new checkpointer."""
+        with self._lock:
+            self._generation += 1
+            self._graphs.clear()
+            self._compiling.clear()
+
+    def _compile(self, key: str, spec: Dict[str, Any], future: concurrent.futures.Future, generation: int):
+        started = time.perf_counter()
+        try:
+            checkpointer = get_checkpointer()
+            graph = build_workflow(spec["tools"], spec["model"]).compile(checkpointer=checkpointer)
+        except Exception as e:
+            logger.error(f"Graph variant {key} ({spec}) failed to compile: {e}", exc_info=True)
+            with self._lock:
+                self.compile_errors += 1
+                if self._compiling.get(key) is future:
+                    del self._compiling[key]
+            future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            if generation != self._generation:
+                # Cleared while compiling: built with the old checkpointer, so waiters look it up again
+                logger.info(f"Discarding graph variant {key} compiled before the cache was cleared")
+                future.set_result(None)
+                return
+            self.compiles += 1
+            self.compile_seconds += elapsed
+            self.max_compile_seconds = max(self.max_compile_seconds, elapsed)
+            self._graphs[key] = graph
+            while len(self._graphs) > self.max_variants:
+                self._graphs.popitem(last=False)
+                self.evictions += 1
+            self._compiling.pop(key, None)
+        logger.info(f"Compiled graph variant {key} ({spec}) in {elapsed * 1000:.1f} ms")
+        future.set_result(graph)
+
+    async def get(self, agent_config: Optional[Dict[str, Any]]):
+        """The compiled graph for ``agent_config``; raises ValueError for an invalid one."""
+        spec = graph_spec(agent_config)
+        key = spec_key(spec)
+        if key == _DEFAULT_KEY:
+            with self._lock:
+                self.default_lookups += 1
+            return get_compiled_graph()
+        while True:
+            with self._lock:
+                graph = self._graphs.get(key)
+                if graph is not None:
+                    self._graphs.move_to_end(key)
+                    self.hits += 1
+                    return graph
+                future = self._compiling.get(key)
+                leader = future is None
+                if leader:
+                    future = self._compiling[key] = concurrent.futures.Future()
+                    self.misses += 1
+                else:
+                    self.coalesced += 1
+                generation = self._generation
+            if leader:
+                asyncio.get_running_loop().run_in_executor(None, self._compile, key, spec, future, generation)
+            # Shielded: a cancelled waiter must not cancel the compilation others wait for
+            graph = await asyncio.shield(asyncio.wrap_future(future))
+            if graph is not None:
+                return graph
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "variants": len(self._graphs),
+            "max_variants": self.max_variants,
+            "compiling": len(self._compiling),
+            "default_lookups": self.default_lookups,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "compiles": self.compiles,
+            "compile_errors": self.compile_errors,
+            "evictions": self.evictions,
+            "avg_compile_ms": round(self.compile_seconds * 1000 / self.compiles, 2) if self.compiles else 0.0,
+            "max_compile_ms": round(self.max_compile_seconds * 1000, 2),
+        }
+
+
+graph_cache = GraphCache()
+
+
+async def get_session_graph(agent_config: Optional[Dict[str, Any]]):
+    """The compiled graph for a session's agent_config (None when it cannot be compiled)."""
+    try:
+        return await graph_cache.get(agent_config)
+    except Exception as e:
+        logger.error(f"No graph for agent_config {agent_config}: {e}")
+        return None
@@ -1,95 +1,226 @@
 import asyncio
-from typing import AsyncIterator, Dict, Any
-from langchain_core.messages import ToolMessage, AIMessageChunk, AIMessage
+import logging
+import time
+from typing import Optional, Sequence, Tuple
+from langchain_core.messages import ToolMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_ollama import ChatOllama
+from langchain_openai import ChatOpenAI
 from langgraph.graph import END
 
 from api.logic.graph_state import AgentState
 from api.logic.tools import tools
+from api.logic.tool_results import compact_tool_result
 from api.core.config import settings
+from api.core.deadline import budget_allows, get_deadline, stage_budget
+from api.services.kv_slots import kv_slots
+from api.services.rate_limiter import rate_limiter
+from api.services.vllm_client import llm_breaker
+
+logger = logging.getLogger(__name__)
+
+
+def _loop_limits(state: AgentState) -> Tuple[int, float]:
+    """Return (max tool iterations, max wall seconds) for the current turn."""
+    agent_config = state.get("agent_config") or {}
+    max_iterations = int(agent_config.get("max_tool_iterations", settings.AGENT_MAX_TOOL_ITERATIONS))
+    max_seconds = float(agent_config.get("max_turn_seconds", settings.AGENT_MAX_TURN_SECONDS))
+    return max_iterations, max_seconds
+
+
+def _turn_elapsed(state: AgentState) -> float:
+    started = state.get("turn_started_at")
+    return 0.0 if started is None else time.time() - started
+
+
+def _tool_budget_left(state: AgentState, rounds_done: int) -> bool:
+    """Whether the current turn may still run another round of tool calls.
+
+    Besides the loop limits, enough of the request deadline has to be left to
+    run the tools *and* produce a final answer afterwards.
+    """
+    max_iterations, max_seconds = _loop_limits(state)
+    return (
+        rounds_done < max_iterations
+        and _turn_elapsed(state) < max_seconds
+        and budget_allows(settings.DEADLINE_TOOL_RESERVE_SECONDS)
+    )
+
+
+def _graph_tools(tool_names: Optional[Sequence[str]]):
+    """The tools a graph variant may use: all of them when ``tool_names`` is None."""
+    return tools if tool_names is None else [t for t in tools if t.name in tool_names]
 
 
 async def should_continue(state: AgentState):
-    """Determine whether to continue the graph or end."""
-    # Since Gemma3 doesn't support tools, always end the conversation
+    """Route to the tool node when the model asked for tools, otherwise end the turn."""
+    last_message = state["messages"][-1] if state["messages"] else None
+    if getattr(last_message, "tool_calls", None):
+        return "action"
     return END
 
 
-async def call_model(state: AgentState):
-    """The 'decide' node. Invokes the LLM to determine the next action."""
+def _chat_model(model_name: Optional[str], temperature: float):
+    """llama-server (OpenAI-compatible) while the KV slot manager is active, Ollama otherwise."""
+    if kv_slots.active:
+        return ChatOpenAI(
+            base_url=f"{kv_slots.base_url.rstrip('/')}/v1",
+            api_key="none",
+            model=kv_slots.served_model(model_name),
+            temperature=temperature,
+        )
+    return ChatOllama(model=kv_slots.served_model(model_name), base_url=settings.OLLAMA_URL, temperature=temperature)
+
+
+async def call_model(
+    state: AgentState,
+    config: Optional[RunnableConfig] = None,
+    tool_names: Optional[Sequence[str]] = None,
+    model_name: Optional[str] = None,
+):
+    """The 'decide' node. Invokes the LLM to determine the next action.
+
+    ``tool_names`` and ``model_name`` are fixed per compiled graph variant.
+    """
     from api.logic.tools import WEB_SEARCH_SYSTEM_PROMPT
     from langchain_core.messages import SystemMessage
     
-    model = ChatOllama(
-        model=settings.OLLAMA_MODEL,
-        base_url=settings.OLLAMA_URL,
-        temperature=0.7
+    model = _chat_model(
+        model_name, float((state.get("agent_config") or {}).get("temperature", settings.LLM_TEMPERATURE))
     )
     
     # Bind tools to the model with better tool descriptions
+    graph_tools = _graph_tools(tool_names)
     model_with_tools = model.bind_tools(
-        tools,
+        graph_tools,
         tool_choice="auto"  # Let the model decide when to use tools
-    )
+    ) if graph_tools else model
     
     # Add system message if this is the first message
     if len(state["messages"]) == 0 or not any(isinstance(m, SystemMessage) for m in state["messages"]):
         state["messages"].insert(0, SystemMessage(content=WEB_SEARCH_SYSTEM_PROMPT))
-    
-    # For non-streaming, keep the existing behavior
-    if not state.get("streaming", False):
-        response = await model_with_tools.ainvoke(state["messages"])
-        return {"messages": [response], "streaming": False}
-    
-    # For streaming, return a generator
-    async def stream_response() -> AsyncIterator[Dict[str, Any]]:
-        full_response = ""
-        async for chunk in model_with_tools.astream(state["messages"]):
-            if isinstance(chunk, AIMessageChunk):
-                content = chunk.content or ""
-                full_response += content
-                yield {
-                    "type": "chunk",
-                    "content": content,
-                    "done": False,
-                    "tool_calls": getattr(chunk, 'tool_calls', None)  # Include any tool calls
-                }
-        
-        # Send final message with full response
-        yield {
-            "type": "final",
-            "content": full_response,
-            "done": True,
-            "tool_calls": getattr(chunk, 'tool_calls', None) if 'chunk' in locals() else None
+
+    # A human message at the tail means a new user turn: reset the loop budget
+    if isinstance(state["messages"][-1], HumanMessage):
+        loop_state = {"iterations": 0, "turn_started_at": time.time(), "iteration_latencies": []}
+    else:
+        loop_state = {
+            "iterations": state.get("iterations", 0),
+            "turn_started_at": time.time() - _turn_elapsed(state),
+            "iteration_latencies": list(state.get("iteration_latencies") or []),
         }
-    
-    return {
-        "messages": [],  # Will be populated by the stream
-        "streaming": True,
-        "stream_generator": stream_response()
-    }
 
+    # Once the tool budget is spent the model has to answer with what it has
+    # (every earlier model call in this turn was followed by a tool round)
+    if not _tool_budget_left({**state, **loop_state}, loop_state["iterations"]):
+        logger.info(f"Tool budget exhausted after {loop_state['iterations']} iterations; answering without tools")
+        model_with_tools = model
+
+    # Token streaming needs no branch here: under astream(stream_mode="messages")
+    # LangGraph streams this call's tokens through its callbacks
+    async def invoke():
+        with stage_budget(settings.LLM_TIMEOUT_SECONDS) as timeout:
+            return await asyncio.wait_for(model_with_tools.ainvoke(state["messages"]), timeout=timeout)
 
-async def call_tool(state: AgentState):
-    """The 'act' node. Executes tools based on the model's decision."""
+    # On llama-server, the session's thread runs in the slot holding (or restored with) its KV cache
+    configurable = (config or {}).get("configurable") or {}
+    started = time.monotonic()
+    async with kv_slots.session_slot(configurable.get("thread_id"), configurable.get("kv_prefix_thread")) as slot_id:
+        if slot_id is not None:
+            model_with_tools = model_with_tools.bind(extra_body={"id_slot": slot_id, "cache_prompt": True})
+        response = await llm_breaker.call(invoke)
+    latency = time.monotonic() - started
+    loop_state["iteration_latencies"].append(round(latency, 3))
+    loop_state["iterations"] += 1
+    logger.info(
+        f"Agent iteration {loop_state['iterations']} took {latency:.2f}s "
+        f"(tool calls: {len(getattr(response, 'tool_calls', None) or [])})"
+    )
+    return {"messages": [response], **loop_state}
+
+
+def _skip_tool_calls(tool_calls, reason: str):
+    """Answer every call without running it, so the transcript stays well-formed."""
+    return {"messages": [
+        ToolMessage(content=reason, tool_call_id=tool_call["id"], name=tool_call["name"])
+        for tool_call in tool_calls
+    ]}
+
+
+async def call_tool(
+    state: AgentState, config: Optional[RunnableConfig] = None, tool_names: Optional[Sequence[str]] = None
+):
+    """The 'act' node. Executes the model's tool calls concurrently."""
     last_message = state["messages"][-1]
-    
-    # LangGraph can handle multiple tool calls in parallel
     tool_calls = last_message.tool_calls
-    
-    tool_map = {t.name: t for t in tools}
-    
-    tasks = []
-    for tool_call in tool_calls:
-        tool_to_call = tool_map[tool_call["name"]]
-        # The tool invocation is now asynchronous
-        tasks.append(tool_to_call.ainvoke(tool_call["args"]))
-        
-    results = await asyncio.gather(*tasks)
-    
-    tool_messages = [
-        ToolMessage(content=str(result), tool_call_id=tool_call["id"])
-        for result, tool_call in zip(results, tool_calls)
-    ]
-    
+
+    # The model may have asked for tools right as the turn ran out of budget;
+    # answer every call and let the agent wrap up.
+    if not _tool_budget_left(state, state.get("iterations", 1) - 1):
+        logger.info(f"Skipping {len(tool_calls)} tool call(s): turn budget exhausted")
+        return _skip_tool_calls(
+            tool_calls, "Tool budget for this turn is exhausted. Answer with the information you already have."
+        )
+
+    # Tool calls count against the user's and session's tool-call rate limits
+    session_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    if session_id is not None and state.get("user_id"):
+        decision = await rate_limiter.acquire_tool_calls(state["user_id"], session_id, len(tool_calls))
+        if decision is not None and not decision.allowed:
+            logger.info(f"Skipping {len(tool_calls)} tool call(s): {decision.budget} rate limit reached")
+            return _skip_tool_calls(
+                tool_calls, "Tool call rate limit reached. Answer with the information you already have."
+            )
+
+    tool_map = {t.name: t for t in _graph_tools(tool_names)}
+    _, max_seconds = _loop_limits(state)
+    remaining = max_seconds - _turn_elapsed(state)
+    timeout = max(1.0, min(settings.TOOL_CALL_TIMEOUT_SECONDS, remaining))
+    deadline = get_deadline()
+    if deadline is not None:
+        # Leave room on the request deadline for the final answer
+        timeout = max(0.5, min(timeout, deadline.remaining() - settings.DEADLINE_TOOL_RESERVE_SECONDS))
+
+    async def run(tool_call):
+        tool_to_call = tool_map.get(tool_call["name"])
+        if tool_to_call is None:
+            return f"Error: unknown tool '{tool_call['name']}'"
+        try:
+            return await asyncio.wait_for(tool_to_call.ainvoke(tool_call["args"]), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool '{tool_call['name']}' timed out after {timeout:.1f}s")
+            return f"Error: tool '{tool_call['name']}' timed out"
+        except Exception as e:
+            logger.error(f"Tool '{tool_call['name']}' failed: {e}", exc_info=True)
+            return f"Error running tool '{tool_call['name']}': {e}"
+
+    # Independent tool calls run concurrently
+    started = time.monotonic()
+    results = await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
+    logger.info(f"Ran {len(tool_calls)} tool call(s) in {time.monotonic() - started:.2f}s")
+
+    token_budget = (state.get("agent_config") or {}).get(
+        "tool_result_token_budget", settings.TOOL_RESULT_TOKEN_BUDGET
+    )
+
+    tool_messages = []
+    for result, tool_call in zip(results, tool_calls):
+        content, report = compact_tool_result(
+            tool_call["name"],
+            result,
+            query=str(tool_call["args"].get("query", "")),
+            token_budget=token_budget,
+        )
+        logger.info(
+            f"Tool '{tool_call['name']}' result: {report.raw_tokens} -> {report.compact_tokens} tokens "
+            f"(saved {report.saved_tokens}, kept {report.items_kept}/{report.items_in}, "
+            f"dropped {report.duplicates_dropped} duplicates)"
+        )
+        tool_messages.append(ToolMessage(
+            content=content,
+            tool_call_id=tool_call["id"],
+            name=tool_call["name"],
+            response_metadata={"prompt_size": report.as_dict()},
+        ))
+
     return {"messages": tool_messages}
@@ -6,3 +6,7 @@ class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], operator.add]
     user_id: str
     agent_config: dict
+    # Agent loop bookkeeping for the current user turn
+    iterations: int
+    turn_started_at: float
+    iteration_latencies: List[float]
@@ -0,0 +1,134 @@
+"""Job workers: claim queued message jobs and run them through the graph.
+
+``JobWorkers`` runs ``concurrency`` loops in one process. Each loop claims a
+job, runs its turn with ``turns.stream_events`` and publishes the events
+(tokens coalesced) and the final status back to the job queue. With
+JOB_BACKEND=memory the API process runs the workers itself; with redis they
+run in ``python -m api.worker`` processes, scaled with LLM capacity.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Dict, List, Set
+
+from api.core.config import settings
+from api.core.deadline import Deadline, deadline_scope
+from api.logic import conversation_graph, turn_events, turns
+from api.services import job_queue as jobs
+from api.services.session_manager import session_manager
+from api.services.sse import coalesce_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def _result(done: Dict[str, Any]) -> Dict[str, Any]:
+    """The done event as a SimulateMessageResponse body."""
+    return {
+        "response": done["response"],
+        "thinking_time": done["thinking_time"],
+        "tokens_used": 0,
+        "model": done["model"],
+        "iterations": done.get("iterations"),
+        "iteration_latencies": done.get("iteration_latencies"),
+    }
+
+
+async def run_job(queue, job: Dict[str, Any], worker: str):
+    """Run one claimed job; its outcome is published as events and in the job record."""
+    job_id = job["job_id"]
+    await queue.update(job_id, status=jobs.RUNNING, started_at=time.time(), worker=worker)
+    session_id = uuid.UUID(job["session_id"])
+    # The budget starts when the job runs, not when it was queued
+    deadline = Deadline(job["timeout_seconds"])
+    with deadline_scope(deadline):
+        try:
+            session = await session_manager.get_session(session_id)
+            if not session or 'graph_config' not in session:
+                raise LookupError("Session not found or not initialized")
+            app_graph = await conversation_graph.get_session_graph(session.get('agent_config'))
+            if app_graph is None:
+                raise RuntimeError("Conversation graph not initialized")
+            async with asyncio.timeout(deadline.remaining()):
+                events = turns.stream_events(session_id, session, app_graph, job["content"], deadline)
+                async for event in coalesce_tokens(events):
+                    if event["type"] == turn_events.DONE:
+                        # Status first, so a streamer that saw done finds the result
+                        await queue.update(job_id, status=jobs.DONE, finished_at=time.time(), result=_result(event))
+                    await queue.publish(job_id, event)
+            logger.info(f"Job {job_id} done on {worker}")
+        except asyncio.CancelledError:
+            await _fail(queue, job_id, {"type": turn_events.ERROR, "status": 503, "detail": "Worker shut down"})
+            raise
+        except LookupError as e:
+            await _fail(queue, job_id, {"type": turn_events.ERROR, "status": 404, "detail": str(e)})
+        except Exception as e:
+            await _fail(queue, job_id, turns.error_event(e, deadline))
+
+
+async def _fail(queue, job_id: str, event: Dict[str, Any]):
+    logger.warning(f"Job {job_id} failed: {event['detail']}")
+    await queue.update(job_id, status=jobs.FAILED, finished_at=time.time(), error=event["detail"])
+    await queue.publish(job_id, event)
+
+
+class JobWorkers:
+    """Worker loops of one process."""
+
+    def __init__(
+        self,
+        queue=None,
+        concurrency: int = settings.JOB_WORKER_CONCURRENCY,
+        block_seconds: float = settings.JOB_BLOCK_SECONDS,
+    ):
+        self.queue = queue or jobs.job_queue
+        self.concurrency = concurrency
+        self.block_seconds = block_seconds
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._busy: Set[asyncio.Task] = set()
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._work(f"{self.name}/{n}")) for n in range(self.concurrency)]
+        logger.info(f"Started {self.concurrency} job worker(s) on the {self.queue.backend} queue")
+
+    async def _work(self, worker: str):
+        task = asyncio.current_task()
+        while not self._stopping:
+            try:
+                job = await self.queue.claim(self.block_seconds)
+            except Exception as e:
+                logger.error(f"Job worker {worker} could not claim a job: {e}")
+                await asyncio.sleep(self.block_seconds)
+                continue
+            if job is None:
+                continue
+            self._busy.add(task)
+            try:
+                await run_job(self.queue, job, worker)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {worker} failed on job {job['job_id']}: {e}", exc_info=True)
+            finally:
+                self._busy.discard(task)
+
+    async def stop(self, grace_seconds: float = settings.JOB_SHUTDOWN_GRACE_SECONDS):
+        """Stop claiming and give running jobs ``grace_seconds`` to finish before cancelling them."""
+        self._stopping = True
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            if task not in self._busy:
+                task.cancel()
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=grace_seconds)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+job_workers = JobWorkers()
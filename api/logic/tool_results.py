@@ -0,0 +1,211 @@
+"""Post-processing for tool output before it is fed back to the model.
+
+Raw tool results (e.g. the list of ``{"snippet", "link"}`` dicts returned by
+``web_search``) are rendered into a compact numbered list, near-duplicate
+snippets coming from different providers are dropped, the remaining items are
+ranked by relevance to the query and the text is truncated to a token budget.
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Rough heuristic used throughout the prompt-size reporting; good enough to
+# compare before/after sizes without pulling in a tokenizer.
+CHARS_PER_TOKEN = 4
+
+# Two snippets whose word shingles overlap at least this much are duplicates
+DUPLICATE_SIMILARITY = 0.8
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_WS_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of tokens in ``text``."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@dataclass
+class PromptSizeReport:
+    """How much prompt space a single tool call consumed before and after compaction."""
+    tool: str
+    raw_tokens: int
+    compact_tokens: int
+    items_in: int = 0
+    items_kept: int = 0
+    duplicates_dropped: int = 0
+    truncated: bool = False
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.raw_tokens - self.compact_tokens)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["saved_tokens"] = self.saved_tokens
+        return data
+
+
+def _clean(text: Any) -> str:
+    return _WS_RE.sub(" ", str(text or "")).strip()
+
+
+def _words(text: str) -> List[str]:
+    return [w.lower() for w in _WORD_RE.findall(text)]
+
+
+def _shingles(words: List[str], size: int = 3) -> set:
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _normalize_link(link: str) -> str:
+    parts = urlsplit(link.strip().lower())
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max(0, max_chars - 1)]
+    # Prefer cutting on a word boundary so the model doesn't see half words
+    if " " in cut[len(cut) // 2:]:
+        cut = cut[:cut.rfind(" ")]
+    return cut + "…"
+
+
+def _dedupe(items: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], int]:
+    kept: List[Dict[str, str]] = []
+    kept_shingles: List[set] = []
+    seen_links = set()
+    dropped = 0
+    for item in items:
+        link = _normalize_link(item["link"]) if item["link"] else ""
+        shingles = _shingles(_words(item["snippet"]))
+        if link and link in seen_links:
+            dropped += 1
+            continue
+        duplicate = False
+        for other in kept_shingles:
+            if not shingles or not other:
+                continue
+            overlap = len(shingles & other) / min(len(shingles), len(other))
+            if overlap >= DUPLICATE_SIMILARITY:
+                duplicate = True
+                break
+        if duplicate:
+            dropped += 1
+            continue
+        if link:
+            seen_links.add(link)
+        kept.append(item)
+        kept_shingles.append(shingles)
+    return kept, dropped
+
+
+def _rank(items: List[Dict[str, str]], query: str) -> List[Dict[str, str]]:
+    terms = set(_words(query))
+    if not terms:
+        return items
+
+    def score(indexed):
+        position, item = indexed
+        words = _words(f"{item.get('title', '')} {item['snippet']}")
+        hits = len(terms.intersection(words))
+        # Keep the provider's own ordering as the tie-breaker
+        return (-hits, position)
+
+    return [item for _, item in sorted(enumerate(items), key=score)]
+
+
+def _as_items(result: Any) -> List[Dict[str, str]] | None:
+    """Return search-like results as ``snippet``/``link`` items, or None for other shapes."""
+    if not isinstance(result, list) or not result:
+        return None
+    if not all(isinstance(r, dict) for r in result):
+        return None
+    items = []
+    for r in result:
+        snippet = _clean(r.get("snippet") or r.get("content") or r.get("text") or r.get("body") or "")
+        link = _clean(r.get("link") or r.get("url") or r.get("href") or "")
+        if not snippet and not link:
+            return None
+        items.append({"snippet": snippet, "link": link, "title": _clean(r.get("title", ""))})
+    return items
+
+
+def compact_tool_result(
+    tool_name: str,
+    result: Any,
+    query: str = "",
+    token_budget: int = 800,
+) -> Tuple[str, PromptSizeReport]:
+    """Render ``result`` compactly for the model and report the prompt size saved.
+
+    Search-style results are deduplicated, ranked against ``query`` and emitted as
+    a numbered list until ``token_budget`` is exhausted. Anything else is rendered
+    as compact JSON (or cleaned text) and truncated to the budget.
+    """
+    raw_tokens = estimate_tokens(str(result))
+    items = _as_items(result)
+
+    if items is None:
+        if isinstance(result, str):
+            text = _clean(result)
+        else:
+            try:
+                text = json.dumps(result, separators=(",", ":"), ensure_ascii=False, default=str)
+            except (TypeError, ValueError):
+                text = _clean(result)
+        compact = _truncate_to_tokens(text, token_budget)
+        report = PromptSizeReport(
+            tool=tool_name,
+            raw_tokens=raw_tokens,
+            compact_tokens=estimate_tokens(compact),
+            truncated=compact != text,
+        )
+        return compact, report
+
+    unique, dropped = _dedupe(items)
+    ranked = _rank(unique, query)
+
+    lines: List[str] = []
+    used = 0
+    truncated = False
+    for number, item in enumerate(ranked, start=1):
+        body = item["snippet"]
+        if item["title"] and item["title"].lower() not in body.lower():
+            body = f"{item['title']}: {body}" if body else item["title"]
+        line = f"{number}. {body}" + (f" ({item['link']})" if item["link"] else "")
+        cost = estimate_tokens(line) + 1  # newline
+        if used + cost > token_budget:
+            remaining = token_budget - used
+            # Only squeeze in a partial item if there is room for something useful
+            if remaining >= 32:
+                lines.append(_truncate_to_tokens(line, remaining - 1))
+            truncated = True
+            break
+        lines.append(line)
+        used += cost
+
+    compact = "\n".join(lines)
+    report = PromptSizeReport(
+        tool=tool_name,
+        raw_tokens=raw_tokens,
+        compact_tokens=estimate_tokens(compact),
+        items_in=len(items),
+        items_kept=len(lines),
+        duplicates_dropped=dropped,
+        truncated=truncated,
+    )
+    return compact, report
@@ -1,6 +1,8 @@
 from typing import Optional, Type
 from langchain_core.tools import BaseTool, tool
+from api.core.config import settings
 from api.services.web_search import web_search_service
+from api.services.page_fetcher import page_fetcher
 
 # System prompt that will be added to the conversation to guide the agent
 WEB_SEARCH_SYSTEM_PROMPT = """You are an AI assistant with access to web search. 
@@ -12,6 +14,7 @@ Use the web search tool when:
 - You need more context about a specific topic
 
 When using web search, be specific with your queries to get the most relevant results.
+If the search snippets are not enough to answer, use the fetch_pages tool to read the full text of the top results.
 """
 
 @tool
@@ -34,5 +37,34 @@ async def web_search(query: str):
     except Exception as e:
         return f"Error performing web search: {str(e)}"
 
+@tool
+async def fetch_pages(query: str, max_pages: int = 3):
+    """
+    Searches the web and reads the main text of the top result pages.
+
+    Use this tool when search snippets are too short to answer the question
+    and you need the actual content of the pages.
+
+    Args:
+        query: The search query whose top results should be read.
+        max_pages: How many of the top result pages to read.
+
+    Returns:
+        list: The title, link and extracted text of each page.
+    """
+    try:
+        max_pages = max(1, min(max_pages, settings.PAGE_FETCH_MAX_PAGES))
+        results = await web_search_service.search(query, max_results=max_pages)
+        if not isinstance(results, list) or not results:
+            return "No search results to read."
+        pages = await page_fetcher.fetch_many([r.get("link", "") for r in results[:max_pages]])
+        return [
+            {"title": p.get("title", ""), "snippet": p["text"], "link": p["url"]}
+            for p in pages
+            if p.get("text")
+        ] or "None of the result pages could be read."
+    except Exception as e:
+        return f"Error fetching pages: {str(e)}"
+
 # This is where we will add more tools like Playwright, Wikipedia, etc.
-tools = [web_search]
+tools = [web_search, fetch_pages]
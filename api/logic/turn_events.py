@@ -0,0 +1,66 @@
+"""Typed events for one conversation turn, read while the graph runs.
+
+``stream_turn`` runs the compiled graph with LangGraph's ``messages`` and
+``updates`` stream modes and translates what it sees into plain dicts:
+
+* ``token`` - a piece of the answer text as the model produces it;
+* ``tool_start`` / ``tool_end`` - a tool call requested by the model, and its
+  result once the tool node has run;
+* ``usage`` - token counts reported by the model for one call;
+* ``done`` - the final answer with the turn's iteration stats.
+
+Transports (WebSocket, SSE) only frame these events.
+"""
+import logging
+from typing import Any, AsyncIterator, Dict
+
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+logger = logging.getLogger(__name__)
+
+TOKEN = "token"
+TOOL_START = "tool_start"
+TOOL_END = "tool_end"
+USAGE = "usage"
+DONE = "done"
+ERROR = "error"
+
+
+async def stream_turn(app_graph, inputs: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """Run one turn of ``app_graph`` and yield its events, ending with ``done``."""
+    answer, iterations, latencies = "", 0, []
+    streamed = False  # whether the current model call's text arrived as tokens
+    async for mode, payload in app_graph.astream(inputs, config=config, stream_mode=["messages", "updates"]):
+        if mode == "messages":
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") == "agent" and isinstance(chunk, AIMessageChunk) and chunk.content:
+                streamed = True
+                yield {"type": TOKEN, "content": chunk.content}
+            continue
+
+        for node, update in (payload or {}).items():
+            if not update:
+                continue
+            if node == "agent":
+                iterations = update.get("iterations", iterations)
+                latencies = update.get("iteration_latencies", latencies)
+                for message in update.get("messages", []):
+                    if not isinstance(message, AIMessage):
+                        continue
+                    if message.usage_metadata:
+                        yield {"type": USAGE, **message.usage_metadata}
+                    for tool_call in message.tool_calls:
+                        yield {"type": TOOL_START, "id": tool_call["id"], "name": tool_call["name"],
+                               "args": tool_call["args"]}
+                    if not message.tool_calls:
+                        answer = message.content if isinstance(message.content, str) else str(message.content)
+                        if answer and not streamed:
+                            # Models that don't stream deliver the whole answer at once
+                            yield {"type": TOKEN, "content": answer}
+                streamed = False
+            elif node == "action":
+                for message in update.get("messages", []):
+                    if isinstance(message, ToolMessage):
+                        yield {"type": TOOL_END, "id": message.tool_call_id, "name": message.name,
+                               "chars": len(str(message.content))}
+    yield {"type": DONE, "response": answer, "iterations": iterations, "iteration_latencies": latencies}
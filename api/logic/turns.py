@@ -0,0 +1,170 @@
+"""One user turn, shared by every way of running it.
+
+Builds the graph input (relevant memories plus the message), runs the turn
+as events (``turn_events.stream_turn``) and records the exchange in memory
+and the session history. The HTTP endpoints, the WebSocket and the job
+workers all run turns through here.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.messages import HumanMessage
+
+from api.core.config import settings
+from api.core.deadline import Deadline, deadline_scope
+from api.logic import conversation_graph, turn_events
+from api.services.circuit_breaker import CircuitOpenError
+from api.services.memory_client import memory_client
+from api.services.rate_limiter import rate_limiter
+from api.services.session_manager import session_manager
+from api.v1.schemas.simulate import MemoryMessage
+
+logger = logging.getLogger(__name__)
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-flight
+_background_tasks: set = set()
+
+
+def request_deadline(header_timeout: Optional[float], session: Optional[Dict[str, Any]]) -> Deadline:
+    """Build the request deadline: header first, then the session's agent_config, then the default."""
+    timeout = header_timeout
+    if not timeout and session:
+        timeout = (session.get('agent_config') or {}).get('request_timeout_seconds')
+    timeout = float(timeout or settings.REQUEST_TIMEOUT_SECONDS)
+    return Deadline(max(1.0, min(timeout, settings.MAX_REQUEST_TIMEOUT_SECONDS)))
+
+
+async def store_memory(user_id: str, user_content: str, ai_content: str, deadline: Deadline):
+    """Store the exchange in mem0, off the critical path if the request budget is nearly spent."""
+    conversation_to_log = [
+        MemoryMessage(role="user", content=user_content).model_dump(),
+        MemoryMessage(role="assistant", content=ai_content).model_dump()
+    ]
+
+    async def store():
+        # Detached from the request deadline: the response no longer waits on it
+        with deadline_scope(None):
+            await memory_client.add_memory(user_id=user_id, messages=conversation_to_log)
+
+    if deadline.allows(settings.MEMORY_TIMEOUT_SECONDS):
+        await memory_client.add_memory(user_id=user_id, messages=conversation_to_log)
+        logger.info("Memory stored successfully")
+    else:
+        logger.info(f"Request budget nearly spent ({deadline}); storing memory in the background")
+        task = asyncio.create_task(store())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+MEMORY_MESSAGE_NAME = "memories"
+_MEMORY_PREFIX = "You have the following relevant memories:\n"
+
+
+def is_memory_message(message: Any) -> bool:
+    """Whether a message is recalled memories injected ahead of a user turn (untagged in older checkpoints)."""
+    if getattr(message, "type", None) != "human":
+        return False
+    return getattr(message, "name", None) == MEMORY_MESSAGE_NAME or str(message.content).startswith(_MEMORY_PREFIX)
+
+
+async def graph_input_messages(session: Dict[str, Any], content: str, deadline: Deadline) -> List[HumanMessage]:
+    """Graph input for one user turn: relevant memories (skipped when the budget is tight) and the message."""
+    # 1. Search for relevant memories (optional: skipped when the budget is tight)
+    relevant_memories = []
+    if not deadline.allows(settings.DEADLINE_MEMORY_MIN_SECONDS):
+        logger.info(f"Skipping memory retrieval, request budget too small: {deadline}")
+    else:
+        logger.info(f"Searching for memories for user_id: {session['user_id']}")
+        try:
+            relevant_memories = await memory_client.search_memory(user_id=session['user_id'], query=content)
+            logger.info(f"Found {len(relevant_memories) if relevant_memories else 0} relevant memories")
+        except Exception as e:
+            logger.error(f"Memory search failed: {e}", exc_info=True)
+            relevant_memories = []  # Continue without memories if search fails
+
+    # 2. Construct the initial messages for the graph
+    logger.info("Constructing graph input messages...")
+    messages = []
+    if relevant_memories:
+        memory_str = _MEMORY_PREFIX
+        for mem in relevant_memories:
+            memory_content = mem.get('text', '') if isinstance(mem, dict) else getattr(mem, 'text', '')
+            if memory_content:
+                memory_str += f"- {memory_content}\n"
+        if len(memory_str) > len(_MEMORY_PREFIX):
+            # Named, so transcripts can tell it from the user's own messages
+            messages.append(HumanMessage(content=memory_str, name=MEMORY_MESSAGE_NAME))
+
+    messages.append(HumanMessage(content=content))
+    logger.info(f"Created {len(messages)} input messages for graph")
+    return messages
+
+
+async def record_turn(
+    session_id: uuid.UUID, session: Dict[str, Any], user_content: str, ai_content: str, deadline: Deadline,
+    generated: bool = True
+):
+    """Store the exchange in memory and append it to the session history; failures are logged, not raised.
+
+    A ``generated`` answer is charged to the user's and session's token budgets.
+    """
+    if generated:
+        await rate_limiter.charge_tokens(session['user_id'], str(session_id), ai_content)
+
+    logger.info("Storing conversation in memory...")
+    try:
+        await store_memory(session['user_id'], user_content, ai_content, deadline)
+    except Exception as e:
+        logger.error(f"Memory storage failed: {e}", exc_info=True)
+        # Continue even if memory storage fails
+
+    logger.info("Updating session...")
+    try:
+        # Appends the turn and bumps message_count / last_activity atomically
+        await session_manager.update_history(session_id, user_content, ai_content)
+        logger.info("Session updated successfully")
+    except Exception as e:
+        logger.error(f"Session update failed: {e}", exc_info=True)
+        # Continue even if session update fails
+
+
+def run_config(session: Dict[str, Any]) -> Dict[str, Any]:
+    """The session's graph config for a turn; a fork names its source thread for the KV slot manager."""
+    config = session['graph_config']
+    if session.get('forked_from'):
+        config = {**config, "configurable": {**config["configurable"], "kv_prefix_thread": session['forked_from']}}
+    return config
+
+
+async def stream_events(
+    session_id: uuid.UUID, session: Dict[str, Any], app_graph, content: str, deadline: Deadline
+) -> AsyncIterator[Dict[str, Any]]:
+    """Events of one turn, ending with done or raising; the history is recorded before done."""
+    started = time.time()
+    inputs = {
+        "messages": await graph_input_messages(session, content, deadline),
+        "user_id": session['user_id'],
+        "agent_config": session.get('agent_config', {})
+    }
+    async for event in turn_events.stream_turn(app_graph, inputs, run_config(session)):
+        if event["type"] == turn_events.DONE:
+            # Recorded first, so a client that saw done can rely on the history
+            await record_turn(session_id, session, content, event["response"], deadline)
+            event = {**event, "thinking_time": time.time() - started, "model": conversation_graph.model_name(session.get('agent_config'))}
+        yield event
+
+
+def error_event(e: Exception, deadline: Deadline) -> Dict[str, Any]:
+    """Error event for a failed streamed turn, with the status the HTTP path would answer."""
+    if isinstance(e, TimeoutError):
+        logger.error(f"Streamed turn exceeded the request deadline ({deadline.timeout_seconds:.1f}s)")
+        return {"type": turn_events.ERROR, "status": 504, "detail": "Request deadline exceeded while generating a response"}
+    if isinstance(e, CircuitOpenError):
+        logger.warning(f"Streamed turn rejected: {e}")
+        return {"type": turn_events.ERROR, "status": 503, "retry_after": e.retry_after,
+                "detail": "Language model backend is unavailable, try again later"}
+    logger.error(f"Streamed turn failed: {e}", exc_info=e)
+    return {"type": turn_events.ERROR, "status": 500, "detail": f"Graph invocation failed: {str(e)}"}
@@ -3,45 +3,41 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 logger.info("########## api/main.py: TOP OF FILE ##########")
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from api.v1.api import api_router
 from api.core.config import settings
-import os
-import pathlib
+from api.core.responses import CompressionMiddleware, ORJSONResponse
 from contextlib import asynccontextmanager
-try:
-    import aiosqlite  # type: ignore
-    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver  # type: ignore
-except ModuleNotFoundError:  # pragma: no cover
-    aiosqlite = None  # type: ignore
-    AsyncSqliteSaver = None
-from api.logic.conversation_graph import compile_global_graph
+from api.logic.conversation_graph import compile_global_graph, open_checkpointer
 from api.logic import conversation_graph
+from api.logic.jobs import job_workers
+from api.services.job_queue import job_queue
+from api.services.kv_slots import kv_slots
+from api.services.page_fetcher import page_fetcher
+from api.services.readiness import readiness
+from api.services.redis_client import redis_client
+from api.services.session_manager import session_manager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("FastAPI app startup: Initializing resources...")
-    # Ensure data directory exists
-    data_dir = pathlib.Path("data")
-    data_dir.mkdir(parents=True, exist_ok=True) # parents=True to create intermediate dirs if needed
-    db_path = data_dir / "checkpoints.sqlite"
-    logger.info(f"SQLite DB path: {db_path.resolve()}")
-
-    conn = None
     checkpointer = None
     try:
-        if aiosqlite is not None and AsyncSqliteSaver is not None:
-            conn = await aiosqlite.connect(db_path)
-            app.state.db_conn = conn
-            logger.info(f"Successfully connected to SQLite DB: {db_path}")
-            checkpointer = AsyncSqliteSaver(conn=conn)  # type: ignore[arg-type]
+        checkpointer = await open_checkpointer()
+        if checkpointer is not None:
             app.state.checkpointer = checkpointer
-            logger.info(f"AsyncSqliteSaver initialized: {checkpointer}")
-        else:
-            logger.warning("aiosqlite or AsyncSqliteSaver unavailable; proceeding without checkpointing.")
+            checkpointer.start_retention()
+        readiness.checkpointer = checkpointer
+        readiness.draining = False
         
+        session_manager.start_sweeper()
+        if settings.KV_SLOTS_ENABLED:
+            await kv_slots.start()
+
         compile_global_graph(checkpointer)  # type: ignore[arg-type]
+        if job_queue.backend == "memory":
+            job_workers.start()  # without Redis, queued jobs run in this process
         logger.info(
             f"Global graph compilation triggered from lifespan startup. Compiled graph: "
             f"{conversation_graph.app_graph}"
@@ -58,19 +54,43 @@ async def lifespan(app: FastAPI):
         # Optionally re-raise or handle to prevent app from starting in a bad state
         raise
     finally:
-        if hasattr(app.state, 'db_conn') and app.state.db_conn:
-            await app.state.db_conn.close()
-            logger.info("SQLite connection closed.")
+        readiness.draining = True  # balancers stop routing here while in-flight work finishes
+        await job_workers.stop()
+        if checkpointer is not None:
+            await checkpointer.close()
+            logger.info("Checkpointer closed.")
+        await session_manager.stop_sweeper()
+        await kv_slots.close()
+        await page_fetcher.close()
+        await readiness.close()
+        readiness.checkpointer = None
+        await redis_client.close()
         logger.info("FastAPI app shutdown: Resources cleaned up.")
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/health")
 def health_check():
+    """Liveness, kept for existing probes; same as /live."""
     return {"status": "ok"}
+
+@app.get("/live")
+def liveness():
+    """The process serves requests; says nothing about its dependencies (see /ready)."""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness_check(response: Response):
+    """200 when this replica can take traffic, 503 while a critical dependency is down or it is draining."""
+    report = await readiness.check()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
@@ -0,0 +1,194 @@
+"""Compact serializer for conversation checkpoints.
+
+The stock ``JsonPlusSerializer`` writes every LangChain message as a full
+``model_dump()`` tagged with its module and class name, so each message
+carries a dozen empty default fields. ``CompactCheckpointSerializer`` writes
+known message classes as ``[class code, non-default fields]`` instead and
+zstd-compresses blobs above ``compress_threshold``. Anything else, and any
+blob written by the stock serializer, goes through ``JsonPlusSerializer``
+unchanged, so existing checkpoint databases stay readable.
+
+``MessageDeduplicator`` lets a saver store messages once per thread instead
+of once per checkpoint (see ``TunedSqliteSaver`` and ``RedisCheckpointSaver``).
+"""
+import hashlib
+import logging
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import ormsgpack
+from langchain_core.messages import (
+    AIMessage, AIMessageChunk, ChatMessage, FunctionMessage,
+    HumanMessage, HumanMessageChunk, RemoveMessage, SystemMessage, ToolMessage,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer, _msgpack_default, _msgpack_ext_hook
+
+from api.core.config import settings
+
+try:
+    import zstandard  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+TYPE_COMPACT = "cmsgpack"
+TYPE_COMPACT_ZSTD = "cmsgpack+zstd"
+# Key under channel_values["messages"] when a checkpoint stores message refs instead of messages
+MESSAGE_REFS = "__message_refs__"
+MESSAGE_KEY_BYTES = 12
+
+# Outside the ext codes used by JsonPlusSerializer
+_EXT_MESSAGE = 64
+# Codes are persisted: append only, never renumber
+_MESSAGE_CLASSES = (
+    HumanMessage, AIMessage, SystemMessage, ToolMessage, AIMessageChunk,
+    HumanMessageChunk, ChatMessage, FunctionMessage, RemoveMessage,
+)
+_MESSAGE_CODES = {cls: code for code, cls in enumerate(_MESSAGE_CLASSES)}
+_OPTIONS = ormsgpack.OPT_NON_STR_KEYS
+
+
+def _field_defaults(cls) -> Dict[str, Any]:
+    defaults = {"type": cls.model_fields["type"].default}
+    for name, field in cls.model_fields.items():
+        if field.default_factory is not None:
+            defaults[name] = field.default_factory()
+        elif not field.is_required():
+            defaults[name] = field.default
+    return defaults
+
+
+_DEFAULTS = {cls: _field_defaults(cls) for cls in _MESSAGE_CLASSES}
+
+
+def _default(obj: Any):
+    code = _MESSAGE_CODES.get(type(obj))
+    if code is None:
+        return _msgpack_default(obj)
+    defaults = _DEFAULTS[type(obj)]
+    fields = {k: v for k, v in obj.model_dump().items() if k not in defaults or v != defaults[k]}
+    return ormsgpack.Ext(_EXT_MESSAGE, _pack([code, fields]))
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == _EXT_MESSAGE:
+        class_code, fields = ormsgpack.unpackb(data, ext_hook=_ext_hook, option=_OPTIONS)
+        return _MESSAGE_CLASSES[class_code](**fields)
+    return _msgpack_ext_hook(code, data)
+
+
+def _pack(value: Any) -> bytes:
+    return ormsgpack.packb(value, default=_default, option=_OPTIONS)
+
+
+class CompactCheckpointSerializer(SerializerProtocol):
+    """Checkpoint serializer with compact message encoding and zstd compression."""
+
+    def __init__(
+        self,
+        compress_threshold: int = settings.CHECKPOINT_COMPRESS_THRESHOLD,
+        compression_level: int = 3,
+        compact: bool = True,
+    ):
+        # compact=False writes the stock format but can still read compact blobs
+        self.compact = compact
+        self.fallback = JsonPlusSerializer()
+        self.compress_threshold = compress_threshold if zstandard is not None else 0
+        self._compressor = zstandard.ZstdCompressor(level=compression_level) if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.fallback.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.fallback.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        if not self.compact or obj is None or isinstance(obj, (bytes, bytearray)):
+            return self.fallback.dumps_typed(obj)
+        try:
+            payload = _pack(obj)
+        except (ormsgpack.MsgpackEncodeError, TypeError) as e:
+            logger.debug(f"Compact encoding failed, using JsonPlusSerializer: {e}")
+            return self.fallback.dumps_typed(obj)
+        if self.compress_threshold and len(payload) >= self.compress_threshold:
+            return TYPE_COMPACT_ZSTD, self._compressor.compress(payload)
+        return TYPE_COMPACT, payload
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_ == TYPE_COMPACT_ZSTD:
+            if self._decompressor is None:
+                raise ValueError("Checkpoint is zstd-compressed but zstandard is not installed")
+            type_, payload = TYPE_COMPACT, self._decompressor.decompress(payload)
+        if type_ == TYPE_COMPACT:
+            return ormsgpack.unpackb(payload, ext_hook=_ext_hook, option=_OPTIONS)
+        return self.fallback.loads_typed(data)
+
+
+def default_serde() -> CompactCheckpointSerializer:
+    """Serializer selected by ``CHECKPOINT_SERDE``."""
+    return CompactCheckpointSerializer(compact=settings.CHECKPOINT_SERDE != "jsonplus")
+
+
+def message_key(type_: str, payload: bytes) -> bytes:
+    """Content address of one serialized message, unique within a thread."""
+    return hashlib.blake2b(type_.encode() + b"\0" + payload, digest_size=MESSAGE_KEY_BYTES).digest()
+
+
+class MessageDeduplicator:
+    """Splits a checkpoint's messages into refs plus the rows a thread has not stored yet.
+
+    Graph state keeps the same message objects from step to step, so keys are
+    cached per object and every checkpoint after the first only serializes the
+    newly added messages. Keys already stored are remembered for the most
+    recently written ``known_threads`` threads.
+    """
+
+    def __init__(self, serde: SerializerProtocol, known_threads: int = 1024):
+        self.serde = serde
+        self.known_threads = known_threads
+        self._known_keys: "OrderedDict[Tuple[str, str], Set[bytes]]" = OrderedDict()
+        self._object_keys: Dict[int, Tuple[weakref.ref, bytes]] = {}
+
+    def _key(self, message: Any) -> Tuple[bytes, Optional[Tuple[str, bytes]]]:
+        cached = self._object_keys.get(id(message))
+        if cached is not None and cached[0]() is message:
+            return cached[1], None
+        type_, payload = self.serde.dumps_typed(message)
+        key = message_key(type_, payload)
+        try:
+            oid = id(message)
+            self._object_keys[oid] = (weakref.ref(message, lambda _, oid=oid: self._object_keys.pop(oid, None)), key)
+        except TypeError:  # not weak-referenceable
+            pass
+        return key, (type_, payload)
+
+    def split(self, thread: Tuple[str, str], messages: List[Any]) -> Tuple[List[bytes], List[Tuple[bytes, str, bytes]]]:
+        """Refs for every message, and (key, type, payload) for those not yet stored for ``thread``."""
+        known = self._known_keys.get(thread, ())
+        refs, new_rows = [], []
+        for message in messages:
+            key, encoded = self._key(message)
+            refs.append(key)
+            if key not in known:
+                if encoded is None:
+                    encoded = self.serde.dumps_typed(message)
+                new_rows.append((key, *encoded))
+        return refs, new_rows
+
+    def remember(self, thread: Tuple[str, str], keys: List[bytes]):
+        """Record keys as stored; call only once the write that stored them has succeeded."""
+        known = self._known_keys.setdefault(thread, set())
+        known.update(keys)
+        self._known_keys.move_to_end(thread)
+        if len(self._known_keys) > self.known_threads:
+            self._known_keys.popitem(last=False)
+
+    def forget(self, thread_id: str):
+        for thread in [t for t in self._known_keys if t[0] == thread_id]:
+            del self._known_keys[thread]
+
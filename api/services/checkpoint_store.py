@@ -0,0 +1,425 @@
+"""SQLite checkpoint store tuned for many concurrent conversation threads.
+
+``TunedSqliteSaver`` is a drop-in ``AsyncSqliteSaver`` that:
+
+* runs the database in WAL mode with ``synchronous=NORMAL``, a larger page
+  cache and memory-mapped reads;
+* writes through one connection and reads through a second, query-only one,
+  so loading a thread's state never queues behind another thread's write;
+* serializes with ``CompactCheckpointSerializer`` and, with
+  ``dedup_messages``, stores each conversation message once per thread in
+  ``checkpoint_messages``; a checkpoint then only holds the list of message
+  refs (the append-only delta since the previous step is the only new data
+  written), instead of repeating the whole conversation. Message rows live
+  as long as their thread;
+* prunes old data in the background: only the newest ``keep_last``
+  checkpoints per thread are kept, threads idle for longer than
+  ``thread_ttl_seconds`` are dropped, and freed pages are returned to the
+  filesystem with an incremental vacuum.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.base.id import UUID as CheckpointUUID
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from api.core.config import settings
+from api.services.checkpoint_serde import MESSAGE_REFS, MessageDeduplicator, default_serde
+
+logger = logging.getLogger(__name__)
+
+# Checkpoint ids are UUIDv6: 100ns ticks since the Gregorian epoch (1582-10-15)
+_GREGORIAN_TO_UNIX_SECONDS = 12219292800
+_DELETE_BATCH = 5000
+_IN_CLAUSE_BATCH = 500
+
+
+def checkpoint_timestamp(checkpoint_id: str) -> Optional[float]:
+    """Unix time a checkpoint was created, read from its UUIDv6 id."""
+    try:
+        uid = CheckpointUUID(checkpoint_id)
+    except (TypeError, ValueError):
+        return None
+    if uid.version != 6:
+        return None
+    return uid.time / 10_000_000 - _GREGORIAN_TO_UNIX_SECONDS
+
+
+def _connection_pragmas(cache_mb: int, mmap_mb: int):
+    return [
+        "PRAGMA busy_timeout=5000",
+        f"PRAGMA cache_size=-{cache_mb * 1024}",
+        f"PRAGMA mmap_size={mmap_mb * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+async def _execute_all(conn: aiosqlite.Connection, statements):
+    for statement in statements:
+        async with conn.execute(statement) as cursor:
+            await cursor.fetchall()
+
+
+class TunedSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver with WAL tuning, a separate reader connection and retention."""
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        reader: aiosqlite.Connection,
+        *,
+        keep_last: int = settings.CHECKPOINT_KEEP_LAST,
+        thread_ttl_seconds: int = settings.CHECKPOINT_THREAD_TTL_SECONDS,
+        vacuum_pages: int = settings.CHECKPOINT_VACUUM_PAGES,
+        dedup_messages: bool = settings.CHECKPOINT_MESSAGE_DEDUP,
+        serde=None,
+    ):
+        super().__init__(conn, serde=serde or default_serde())
+        self.reader_conn = reader
+        self._reader = AsyncSqliteSaver(reader, serde=self.serde)
+        self._reader.is_setup = True  # tables are created through the writer
+        self.keep_last = keep_last
+        self.thread_ttl_seconds = thread_ttl_seconds
+        self.vacuum_pages = vacuum_pages
+        self.last_retention: Optional[Dict[str, Any]] = None
+        self._retention_task: Optional[asyncio.Task] = None
+        self.dedup_messages = dedup_messages
+        self._messages_ready = False
+        self.messages = MessageDeduplicator(self.serde)
+
+    @classmethod
+    async def open(
+        cls,
+        db_path: str | os.PathLike = settings.CHECKPOINT_DB_PATH,
+        cache_mb: int = settings.CHECKPOINT_SQLITE_CACHE_MB,
+        mmap_mb: int = settings.CHECKPOINT_SQLITE_MMAP_MB,
+        **kwargs,
+    ) -> "TunedSqliteSaver":
+        """Open (and if needed create) the checkpoint DB with tuned writer and reader connections."""
+        writer = await aiosqlite.connect(db_path)
+        try:
+            # auto_vacuum only takes effect on a new database or after a full VACUUM
+            await _execute_all(writer, ["PRAGMA auto_vacuum=INCREMENTAL"])
+            async with writer.execute("PRAGMA auto_vacuum") as cursor:
+                auto_vacuum = (await cursor.fetchone())[0]
+            if auto_vacuum != 2:
+                logger.info(f"Converting {db_path} to incremental auto-vacuum (one-off full VACUUM).")
+                await _execute_all(writer, ["VACUUM"])
+            await _execute_all(writer, [
+                "PRAGMA journal_mode=WAL",
+                "PRAGMA synchronous=NORMAL",
+                "PRAGMA journal_size_limit=67108864",
+                *_connection_pragmas(cache_mb, mmap_mb),
+            ])
+            reader = await aiosqlite.connect(db_path)
+        except Exception:
+            await writer.close()
+            raise
+        await _execute_all(reader, [*_connection_pragmas(cache_mb, mmap_mb), "PRAGMA query_only=ON"])
+        saver = cls(writer, reader, **kwargs)
+        await saver.setup()
+        return saver
+
+    async def setup(self) -> None:
+        if self._messages_ready:
+            return
+        await super().setup()
+        async with self.lock:
+            if not self._messages_ready:
+                await self.conn.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS checkpoint_messages (
+                        thread_id TEXT NOT NULL,
+                        checkpoint_ns TEXT NOT NULL DEFAULT '',
+                        msg_key BLOB NOT NULL,
+                        type TEXT,
+                        value BLOB,
+                        PRIMARY KEY (thread_id, checkpoint_ns, msg_key)
+                    );
+                    """
+                )
+                self._messages_ready = True
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        messages = checkpoint.get("channel_values", {}).get("messages")
+        if not (self.dedup_messages and isinstance(messages, list) and messages):
+            return await super().aput(config, checkpoint, metadata, new_versions)
+        await self.setup()
+        thread = (str(config["configurable"]["thread_id"]), config["configurable"].get("checkpoint_ns", ""))
+        refs, new_keys = await self._store_messages(thread, messages)
+        checkpoint = {
+            **checkpoint,
+            "channel_values": {**checkpoint["channel_values"], "messages": {MESSAGE_REFS: refs}},
+        }
+        # The message rows are committed together with the checkpoint row that refers to them
+        next_config = await super().aput(config, checkpoint, metadata, new_versions)
+        self.messages.remember(thread, new_keys)
+        return next_config
+
+    async def _store_messages(self, thread: Tuple[str, str], messages: List[Any]) -> Tuple[List[bytes], List[bytes]]:
+        """Insert the messages this thread has not stored yet; returns all refs and the new keys."""
+        refs, new_rows = self.messages.split(thread, messages)
+        if new_rows:
+            async with self.lock:
+                await self.conn.executemany(
+                    "INSERT OR IGNORE INTO checkpoint_messages (thread_id, checkpoint_ns, msg_key, type, value)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [(*thread, *row) for row in new_rows],
+                )
+        return refs, [row[0] for row in new_rows]
+
+    async def _fetch_messages(self, thread_id: str, checkpoint_ns: str, refs: List[bytes]) -> Dict[bytes, Any]:
+        found: Dict[bytes, Any] = {}
+        unique = list(dict.fromkeys(refs))
+        for start in range(0, len(unique), _IN_CLAUSE_BATCH):
+            chunk = unique[start:start + _IN_CLAUSE_BATCH]
+            async with self.reader_conn.execute(
+                "SELECT msg_key, type, value FROM checkpoint_messages WHERE thread_id = ? AND checkpoint_ns = ?"
+                f" AND msg_key IN ({','.join('?' * len(chunk))})",
+                (thread_id, checkpoint_ns, *chunk),
+            ) as cursor:
+                for key, type_, value in await cursor.fetchall():
+                    found[key] = self.serde.loads_typed((type_, value))
+        if len(found) < len(unique):
+            logger.error(f"Thread {thread_id} references {len(unique) - len(found)} missing messages; they are skipped.")
+        return found
+
+    async def _load_messages(self, item: Optional[CheckpointTuple]) -> Optional[CheckpointTuple]:
+        """Replace a checkpoint's message refs with the stored messages."""
+        if item is None:
+            return None
+        channel_values = item.checkpoint.get("channel_values", {})
+        stored = channel_values.get("messages")
+        if not (isinstance(stored, dict) and MESSAGE_REFS in stored):
+            return item
+        refs = stored[MESSAGE_REFS]
+        found = await self._fetch_messages(
+            str(item.config["configurable"]["thread_id"]), item.config["configurable"].get("checkpoint_ns", ""), refs
+        )
+        channel_values["messages"] = [found[key] for key in refs if key in found]
+        return item
+
+    async def aiter_messages(self, config: RunnableConfig, batch_size: int = 500) -> AsyncIterator[List[Any]]:
+        """Messages of a checkpoint (the latest by default) in batches, without loading them all at once."""
+        await self.setup()
+        item = await self._reader.aget_tuple(config)
+        if item is None:
+            return
+        stored = item.checkpoint.get("channel_values", {}).get("messages") or []
+        if not (isinstance(stored, dict) and MESSAGE_REFS in stored):
+            for start in range(0, len(stored), batch_size):
+                yield stored[start:start + batch_size]
+            return
+        refs = stored[MESSAGE_REFS]
+        thread_id = str(item.config["configurable"]["thread_id"])
+        checkpoint_ns = item.config["configurable"].get("checkpoint_ns", "")
+        for start in range(0, len(refs), batch_size):
+            chunk = refs[start:start + batch_size]
+            found = await self._fetch_messages(thread_id, checkpoint_ns, chunk)
+            yield [found[key] for key in chunk if key in found]
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        await self.setup()
+        return await self._load_messages(await self._reader.aget_tuple(config))
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self.setup()
+        async for item in self._reader.alist(config, filter=filter, before=before, limit=limit):
+            yield await self._load_messages(item)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.setup()
+        await super().adelete_thread(thread_id)
+        async with self.lock:
+            async with self.conn.execute(
+                "DELETE FROM checkpoint_messages WHERE thread_id = ?", (str(thread_id),)
+            ):
+                await self.conn.commit()
+        self.messages.forget(str(thread_id))
+
+    async def acopy_thread(
+        self, source_thread_id: str, target_thread_id: str, checkpoint_id: Optional[str] = None
+    ) -> Optional[RunnableConfig]:
+        """Start ``target_thread_id`` from one checkpoint (the latest by default) of ``source_thread_id``.
+
+        Rows are copied inside SQLite, as stored, in one transaction: nothing is
+        deserialized and the source thread is left untouched. Returns the new
+        thread's config, or None if the checkpoint does not exist.
+        """
+        await self.setup()
+        source, target = str(source_thread_id), str(target_thread_id)
+        async with self.lock:
+            if checkpoint_id is None:
+                async with self.conn.execute(
+                    "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''", (source,)
+                ) as cursor:
+                    checkpoint_id = (await cursor.fetchone())[0]
+            async with self.conn.execute(
+                "INSERT INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata)"
+                " SELECT ?, checkpoint_ns, checkpoint_id, NULL, type, checkpoint, metadata FROM checkpoints"
+                " WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id = ?",
+                (target, source, checkpoint_id),
+            ) as cursor:
+                copied = cursor.rowcount
+            if copied <= 0:
+                await self.conn.rollback()
+                return None
+            await self.conn.execute(
+                "INSERT INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value)"
+                " SELECT ?, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value FROM writes"
+                " WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id = ?",
+                (target, source, checkpoint_id),
+            )
+            # Messages are keyed by content, so the whole set is valid for any checkpoint of the source
+            await self.conn.execute(
+                "INSERT OR IGNORE INTO checkpoint_messages (thread_id, checkpoint_ns, msg_key, type, value)"
+                " SELECT ?, checkpoint_ns, msg_key, type, value FROM checkpoint_messages"
+                " WHERE thread_id = ? AND checkpoint_ns = ''",
+                (target, source),
+            )
+            await self.conn.commit()
+        return {"configurable": {"thread_id": target, "checkpoint_ns": "", "checkpoint_id": checkpoint_id}}
+
+    async def _delete_in_batches(self, sql: str, params=()) -> int:
+        """Run a rowid-batched DELETE, releasing the writer lock between batches."""
+        removed = 0
+        while True:
+            async with self.lock:
+                async with self.conn.execute(sql, (*params, _DELETE_BATCH)) as cursor:
+                    count = cursor.rowcount
+                await self.conn.commit()
+            removed += max(count, 0)
+            if count < _DELETE_BATCH:
+                return removed
+            await asyncio.sleep(0)
+
+    async def prune(self, keep_last: Optional[int] = None, thread_ttl_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """Apply the retention policy once and return what was removed."""
+        await self.setup()
+        keep_last = self.keep_last if keep_last is None else keep_last
+        thread_ttl_seconds = self.thread_ttl_seconds if thread_ttl_seconds is None else thread_ttl_seconds
+        started = time.perf_counter()
+
+        threads_dropped = 0
+        if thread_ttl_seconds > 0:
+            cutoff = time.time() - thread_ttl_seconds
+            async with self.reader_conn.execute(
+                "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"
+            ) as cursor:
+                latest = await cursor.fetchall()
+            for thread_id, checkpoint_id in latest:
+                created = checkpoint_timestamp(checkpoint_id)
+                if created is not None and created < cutoff:
+                    await self.adelete_thread(thread_id)
+                    threads_dropped += 1
+
+        checkpoints_removed = 0
+        if keep_last > 0:
+            checkpoints_removed = await self._delete_in_batches(
+                "DELETE FROM checkpoints WHERE rowid IN ("
+                " SELECT rowid FROM ("
+                "  SELECT rowid, ROW_NUMBER() OVER ("
+                "   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rn"
+                "  FROM checkpoints)"
+                " WHERE rn > ? LIMIT ?)",
+                (keep_last,),
+            )
+        writes_removed = await self._delete_in_batches(
+            "DELETE FROM writes WHERE rowid IN ("
+            " SELECT w.rowid FROM writes w LEFT JOIN checkpoints c"
+            " ON c.thread_id = w.thread_id AND c.checkpoint_ns = w.checkpoint_ns"
+            " AND c.checkpoint_id = w.checkpoint_id"
+            " WHERE c.checkpoint_id IS NULL LIMIT ?)"
+        )
+
+        async with self.lock:
+            pages = self.vacuum_pages if self.vacuum_pages > 0 else ""
+            # incremental_vacuum frees one page per step; executescript steps it to completion
+            await self.conn.executescript(
+                f"PRAGMA incremental_vacuum({pages}); PRAGMA wal_checkpoint(PASSIVE); PRAGMA optimize;"
+            )
+
+        self.last_retention = {
+            "threads_dropped": threads_dropped,
+            "checkpoints_removed": checkpoints_removed,
+            "writes_removed": writes_removed,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "finished_at": int(time.time()),
+        }
+        if threads_dropped or checkpoints_removed or writes_removed:
+            logger.info(f"Checkpoint retention: {self.last_retention}")
+        return self.last_retention
+
+    async def stats(self) -> Dict[str, Any]:
+        """Database size and row counts, plus the result of the last retention run."""
+        async with self.reader_conn.execute(
+            "SELECT (SELECT COUNT(*) FROM checkpoints), (SELECT COUNT(DISTINCT thread_id) FROM checkpoints),"
+            " (SELECT COUNT(*) FROM writes), (SELECT COUNT(*) FROM checkpoint_messages)"
+        ) as cursor:
+            checkpoints, threads, writes, messages = await cursor.fetchone()
+        sizes = {}
+        for pragma in ("page_count", "page_size", "freelist_count", "journal_mode"):
+            async with self.reader_conn.execute(f"PRAGMA {pragma}") as cursor:
+                sizes[pragma] = (await cursor.fetchone())[0]
+        return {
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "writes": writes,
+            "messages": messages,
+            "db_bytes": sizes["page_count"] * sizes["page_size"],
+            "free_bytes": sizes["freelist_count"] * sizes["page_size"],
+            "journal_mode": sizes["journal_mode"],
+            "keep_last": self.keep_last,
+            "thread_ttl_seconds": self.thread_ttl_seconds,
+            "last_retention": self.last_retention,
+        }
+
+    async def _retain_forever(self, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.prune()
+            except Exception as e:
+                logger.error(f"Checkpoint retention failed: {e}", exc_info=True)
+
+    def start_retention(self, interval_seconds: float = settings.CHECKPOINT_RETENTION_INTERVAL_SECONDS):
+        if self._retention_task is None or self._retention_task.done():
+            self._retention_task = asyncio.create_task(self._retain_forever(interval_seconds))
+
+    async def stop_retention(self):
+        if self._retention_task is not None:
+            self._retention_task.cancel()
+            try:
+                await self._retention_task
+            except asyncio.CancelledError:
+                pass
+            self._retention_task = None
+
+    async def ping(self):
+        """Raise unless the database answers a query."""
+        async with self.reader_conn.execute("SELECT 1") as cursor:
+            await cursor.fetchone()
+
+    async def close(self):
+        await self.stop_retention()
+        await self.reader_conn.close()
+        await self.conn.close()
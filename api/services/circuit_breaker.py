@@ -0,0 +1,176 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from api.core.config import settings
+from api.core.deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the dependency's breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_dependency_failure(exc: BaseException) -> bool:
+    """Default ``is_failure``: everything except running out of the caller's request deadline."""
+    return not isinstance(exc, DeadlineExceeded)
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker for one outbound dependency.
+
+    Outcomes of the last ``window_size`` calls are kept; once at least
+    ``minimum_calls`` have been seen and the failure rate reaches
+    ``failure_rate_threshold`` the breaker opens and calls fail fast for
+    ``reset_timeout_seconds``. After that, up to ``half_open_max_calls`` trial
+    calls are let through: a success closes the breaker, a failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = settings.CIRCUIT_FAILURE_RATE,
+        window_size: int = settings.CIRCUIT_WINDOW_SIZE,
+        minimum_calls: int = settings.CIRCUIT_MINIMUM_CALLS,
+        reset_timeout_seconds: float = settings.CIRCUIT_RESET_TIMEOUT_SECONDS,
+        half_open_max_calls: int = 1,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure or is_dependency_failure
+        self._window: deque = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_seconds:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    @property
+    def failure_rate(self) -> float:
+        if not self._window:
+            return 0.0
+        return self._window.count(False) / len(self._window)
+
+    def _transition(self, new_state: str):
+        if new_state == self._state:
+            return
+        logger.warning(f"Circuit '{self.name}' {self._state} -> {new_state} (failure rate {self.failure_rate:.0%})")
+        self._state = new_state
+        self._half_open_in_flight = 0
+        if new_state == self.OPEN:
+            self._opened_at = time.monotonic()
+        elif new_state == self.CLOSED:
+            self._window.clear()
+
+    def retry_after(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout_seconds - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        """Reserve a call slot; False means the caller should fail fast."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+            self._half_open_in_flight += 1
+            return True
+        self.total_rejected += 1
+        return False
+
+    def record_success(self):
+        self.total_calls += 1
+        self._window.append(True)
+        if self._state == self.HALF_OPEN:
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self.total_calls += 1
+        self.total_failures += 1
+        self._window.append(False)
+        if self._state == self.HALF_OPEN:
+            self._transition(self.OPEN)
+        elif (
+            self._state == self.CLOSED
+            and len(self._window) >= self.minimum_calls
+            and self.failure_rate >= self.failure_rate_threshold
+        ):
+            self._transition(self.OPEN)
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, fallback: Any = _MISSING, **kwargs) -> Any:
+        """Await ``func(*args, **kwargs)`` through the breaker.
+
+        When the breaker is open the call is not attempted: ``fallback`` is
+        returned if given, otherwise ``CircuitOpenError`` is raised. Errors from
+        ``func`` are recorded and re-raised.
+        """
+        if not self.allow_request():
+            if fallback is not _MISSING:
+                return fallback
+            raise CircuitOpenError(self.name, self.retry_after())
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            if isinstance(e, Exception) and self.is_failure(e):
+                self.record_failure()
+            elif self._state == self.HALF_OPEN:
+                # Cancelled or ignored errors don't decide the trial; free the slot
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            raise
+        self.record_success()
+        return result
+
+    def reset(self):
+        self._transition(self.CLOSED)
+        self._window.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "failure_rate": round(self.failure_rate, 3),
+            "calls_in_window": len(self._window),
+            "retry_after": round(self.retry_after(), 1),
+            "total_calls": self.total_calls,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Return the process-wide breaker for ``name``, creating it on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+    return breaker
+
+
+def all_breakers() -> Dict[str, CircuitBreaker]:
+    return dict(_breakers)
@@ -0,0 +1,174 @@
+"""Idempotency-Key support: each keyed request runs once.
+
+The first request with a key claims it in Redis (``SET NX``) and runs; its
+response is stored under the key for ``ttl_seconds``. A retry with the same
+key gets the stored response. If the original is still running, the retry
+waits for it instead of starting a second run. It waits on the local task
+when the original runs in this worker, and polls Redis when it runs in
+another one. A failed run releases the key, so the next retry runs again.
+Without Redis, keys are kept in process.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+
+from api.core.config import settings
+from api.services.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+_RUNNING = "running"
+_DONE = "done"
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different body."""
+
+
+class IdempotencyInProgress(Exception):
+    """The original request is still running and did not finish within the wait."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("A request with this Idempotency-Key is still in progress")
+        self.retry_after = retry_after
+
+
+def request_fingerprint(*parts: Any) -> str:
+    return hashlib.sha256(orjson.dumps(parts, default=str)).hexdigest()
+
+
+class IdempotencyStore:
+    """Idempotency-Key records in Redis (shared by all workers) or in process."""
+
+    def __init__(
+        self,
+        redis: RedisClient = redis_client,
+        ttl_seconds: int = settings.IDEMPOTENCY_TTL_SECONDS,
+        running_ttl_seconds: int = int(settings.MAX_REQUEST_TIMEOUT_SECONDS) + 60,
+        poll_interval: float = 0.25,
+    ):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        # A claim outlives the longest request, so a crashed worker's key frees itself
+        self.running_ttl_seconds = running_ttl_seconds
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._local: Dict[str, Tuple[float, Dict[str, Any]]] = {}  # used without Redis
+
+    @staticmethod
+    def key(scope: str, idempotency_key: str) -> str:
+        return f"idempotency:{scope}:{idempotency_key}"
+
+    async def _claim(self, key: str, fingerprint: str) -> bool:
+        record = {"state": _RUNNING, "fingerprint": fingerprint}
+        if self.redis.client is None:
+            self._expire_local()
+            if key in self._local:
+                return False
+            self._local[key] = (time.monotonic() + self.running_ttl_seconds, record)
+            return True
+        return bool(await self.redis.client.set(key, self.redis.encode(record), nx=True, ex=self.running_ttl_seconds))
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.redis.client is None:
+            self._expire_local()
+            entry = self._local.get(key)
+            return entry[1] if entry else None
+        return self.redis.decode(await self.redis.client.get(key))
+
+    async def _finish(self, key: str, record: Optional[Dict[str, Any]]):
+        """Store the final record, or release the key when ``record`` is None."""
+        if self.redis.client is None:
+            if record is None:
+                self._local.pop(key, None)
+            else:
+                self._local[key] = (time.monotonic() + self.ttl_seconds, record)
+            return
+        if record is None:
+            await self.redis.delete(key)
+        else:
+            await self.redis.set(key, record, ttl_seconds=self.ttl_seconds)
+
+    def _expire_local(self):
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._local.items() if expires_at <= now]:
+            del self._local[key]
+
+    async def run_once(
+        self,
+        key: str,
+        fingerprint: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        wait_seconds: float,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Run ``compute`` once per key; returns (response, replayed).
+
+        Raises IdempotencyConflict when the key was used with another
+        fingerprint, and IdempotencyInProgress when the original run does not
+        finish within ``wait_seconds``.
+        """
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            local = self._inflight.get(key)
+            if local is not None:
+                if local[0] != fingerprint:
+                    raise IdempotencyConflict()
+                try:
+                    result = await asyncio.wait_for(asyncio.shield(local[1]), max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    raise IdempotencyInProgress(self.poll_interval * 4)
+                except asyncio.CancelledError:
+                    if local[1].cancelled():
+                        continue  # the original was cancelled, not this request
+                    raise
+                return result, True
+
+            try:
+                claimed = await self._claim(key, fingerprint)
+            except Exception as e:
+                # Redis down: serving the request beats failing it
+                logger.error(f"Idempotency store unavailable, running without it: {e}")
+                return await compute(), False
+
+            if claimed:
+                return await self._run(key, fingerprint, compute), False
+
+            record = await self._get(key)
+            if record is None:
+                continue  # released or expired in between: try to claim again
+            if record.get("fingerprint") != fingerprint:
+                raise IdempotencyConflict()
+            if record.get("state") == _DONE:
+                return record["response"], True
+            # Running in another worker
+            if time.monotonic() + self.poll_interval > deadline:
+                raise IdempotencyInProgress(self.poll_interval * 4)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run(self, key: str, fingerprint: str, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (fingerprint, future)
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            await self._finish(key, None)
+            future.cancel()  # waiting retries claim the key and run it themselves
+            raise
+        except Exception as e:
+            await self._finish(key, None)
+            future.set_exception(e)
+            future.exception()  # retrieved here, so nobody waiting is not an error
+            raise
+        else:
+            await self._finish(key, {"state": _DONE, "fingerprint": fingerprint, "response": result})
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,203 @@
+"""Queue of message jobs, and the progress events published back by workers.
+
+A job is one user message submitted without waiting for the answer. The API
+queues it; a worker claims it, runs the turn and writes events to the job's
+event log (ids ``"<n>-<m>"``, increasing). Pollers read the job record,
+streamers read the log from any event id on. ``RedisJobQueue`` uses a list
+for the queue, a key per job record and a Redis stream per event log, so API
+replicas and worker processes scale separately. ``MemoryJobQueue`` is the
+in-process stand-in used without Redis (JOB_BACKEND=memory) and in tests.
+Jobs are delivered at most once: a worker that dies mid-job leaves it
+"running" until its record expires.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from api.core.config import settings
+from api.services.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def new_job(session_id: uuid.UUID, content: str, timeout_seconds: float) -> Dict[str, Any]:
+    return {
+        "job_id": str(uuid.uuid4()),
+        "session_id": str(session_id),
+        "content": content,
+        "timeout_seconds": timeout_seconds,
+        "status": QUEUED,
+        "submitted_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "worker": None,
+        "result": None,
+        "error": None,
+    }
+
+
+class MemoryJobQueue:
+    """In-process job queue; jobs run on workers in this process."""
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: int = settings.JOB_TTL_SECONDS, max_events: int = settings.JOB_MAX_EVENTS):
+        self.ttl_seconds = ttl_seconds
+        self.max_events = max_events
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, Deque[Tuple[int, Dict[str, Any]]]] = {}
+        self._seq: Dict[str, int] = {}
+        self._pending: Deque[str] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+
+    async def _wait_changed(self, timeout: float) -> bool:
+        loop = asyncio.get_running_loop()
+        if self._changed is None or self._loop is not loop:
+            self._loop, self._changed = loop, asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _notify(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        for job_id in [k for k, job in self._jobs.items() if (job["finished_at"] or job["submitted_at"]) < cutoff]:
+            del self._jobs[job_id]
+            self._events.pop(job_id, None)
+            self._seq.pop(job_id, None)
+
+    async def submit(self, job: Dict[str, Any]):
+        self._expire()
+        self._jobs[job["job_id"]] = dict(job)
+        self._events[job["job_id"]] = deque(maxlen=self.max_events)
+        self._pending.append(job["job_id"])
+        self._notify()
+
+    async def claim(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Next queued job, or None when none arrives within ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while not self._pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not await self._wait_changed(remaining):
+                return None
+        job = self._jobs.get(self._pending.popleft())
+        return dict(job) if job else None
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def update(self, job_id: str, **fields: Any):
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+            self._notify()
+
+    async def publish(self, job_id: str, event: Dict[str, Any]):
+        if job_id not in self._events:
+            return
+        self._seq[job_id] = self._seq.get(job_id, 0) + 1
+        self._events[job_id].append((self._seq[job_id], event))
+        self._notify()
+
+    async def read_events(self, job_id: str, after: str = "0", timeout: float = 0) -> List[Tuple[str, Dict[str, Any]]]:
+        """Events after id ``after``, waiting up to ``timeout`` seconds for the first one."""
+        seq = int(after.split("-")[0])
+        deadline = time.monotonic() + timeout
+        while True:
+            events = [(f"{n}-0", event) for n, event in self._events.get(job_id, ()) if n > seq]
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0 or not await self._wait_changed(remaining):
+                return events
+
+
+class RedisJobQueue:
+    """Job queue in Redis, shared by API replicas and worker processes."""
+
+    backend = "redis"
+    QUEUE_KEY = "jobs:queue"
+
+    def __init__(
+        self,
+        redis: RedisClient = redis_client,
+        ttl_seconds: int = settings.JOB_TTL_SECONDS,
+        max_events: int = settings.JOB_MAX_EVENTS,
+    ):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.max_events = max_events
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    @staticmethod
+    def _events_key(job_id: str) -> str:
+        return f"job:{job_id}:events"
+
+    async def submit(self, job: Dict[str, Any]):
+        async with self.redis.pipeline() as pipe:
+            pipe.set(self._key(job["job_id"]), self.redis.encode(job), ex=self.ttl_seconds)
+            pipe.lpush(self.QUEUE_KEY, job["job_id"])
+
+    async def claim(self, timeout: float) -> Optional[Dict[str, Any]]:
+        item = await self.redis.client.brpop([self.QUEUE_KEY], timeout=timeout)
+        if not item:
+            return None
+        job_id = item[1].decode() if isinstance(item[1], bytes) else item[1]
+        job = await self.get(job_id)
+        if job is None:
+            logger.warning(f"Job {job_id} expired before a worker claimed it")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.redis.decode(await self.redis.client.get(self._key(job_id)))
+
+    async def update(self, job_id: str, **fields: Any):
+        # Only the worker that claimed the job writes it after submission
+        job = await self.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        await self.redis.client.set(self._key(job_id), self.redis.encode(job), ex=self.ttl_seconds)
+
+    async def publish(self, job_id: str, event: Dict[str, Any]):
+        key = self._events_key(job_id)
+        async with self.redis.pipeline() as pipe:
+            pipe.xadd(key, {"event": self.redis.encode(event)}, maxlen=self.max_events, approximate=True)
+            pipe.expire(key, self.ttl_seconds)
+
+    async def read_events(self, job_id: str, after: str = "0", timeout: float = 0) -> List[Tuple[str, Dict[str, Any]]]:
+        block = int(timeout * 1000) or None  # BLOCK 0 would wait forever
+        result = await self.redis.client.xread({self._events_key(job_id): after}, count=500, block=block)
+        events = []
+        for _, entries in result or []:
+            for event_id, fields in entries:
+                event_id = event_id.decode() if isinstance(event_id, bytes) else event_id
+                events.append((event_id, self.redis.decode(fields[b"event"])))
+        return events
+
+
+def _create_job_queue():
+    if settings.JOB_BACKEND == "redis":
+        logger.info("Using Redis job queue; jobs run in api.worker processes.")
+        return RedisJobQueue()
+    if settings.JOB_BACKEND != "memory":
+        logger.warning(f"Unknown JOB_BACKEND '{settings.JOB_BACKEND}', using the in-process job queue.")
+    return MemoryJobQueue()
+
+job_queue = _create_job_queue()
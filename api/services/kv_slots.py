@@ -0,0 +1,259 @@
+"""Session-to-slot manager for the llama.cpp server's KV cache.
+
+``llama-server`` keeps one KV cache per slot and, when started with
+``--slot-save-path``, can write a slot's cache to a file and load it back
+(``POST /slots/{id}?action=save|restore``). ``KVSlotManager`` pins each
+session to a slot while it is active. It saves the session's cache once the
+session has been idle for ``idle_seconds``, or before its slot is handed to
+another session, and restores it on the session's next turn. A returning
+session then skips prompt evaluation of its history.
+
+Saved files are kept in LRU order within ``max_saved_files`` and
+``max_saved_bytes``. Evicted files are deleted from ``save_dir``, which is the
+server's ``--slot-save-path`` as mounted into the API; without it they are
+only forgotten. Backends without the slot API (Ollama, ``llama_cpp.server``)
+are detected by ``start`` and the manager stays inactive.
+
+While active, the agent's model calls go to llama-server and run inside
+``session_slot`` for their graph thread (``graph_nodes.call_model``); a fork
+names its source thread as ``kv_prefix_thread`` in its graph config. Those
+calls run on the server's model whatever ``agent_config.model`` asks for, so
+responses report and the response cache keys on ``served_model``.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from api.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _Slot:
+    __slots__ = ("id", "session", "busy", "dirty", "last_used")
+
+    def __init__(self, slot_id: int):
+        self.id = slot_id
+        self.session: Optional[str] = None  # whose KV cache the slot holds
+        self.busy = False
+        self.dirty = False  # used since its cache was last saved
+        self.last_used = 0.0
+
+
+class KVSlotManager:
+    """Pins sessions to llama.cpp slots and saves/restores their KV cache."""
+
+    def __init__(
+        self,
+        base_url: str = settings.KV_SLOTS_URL or settings.VLLM_URL,
+        save_dir: str = settings.KV_SLOT_SAVE_DIR,
+        idle_seconds: float = settings.KV_SLOT_IDLE_SECONDS,
+        max_saved_files: int = settings.KV_SLOT_MAX_SAVED_FILES,
+        max_saved_bytes: int = settings.KV_SLOT_MAX_SAVED_MB * 1024 * 1024,
+        timeout_seconds: float = settings.KV_SLOT_TIMEOUT_SECONDS,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.base_url = base_url
+        self.save_dir = save_dir
+        self.idle_seconds = idle_seconds
+        self.max_saved_files = max_saved_files
+        self.max_saved_bytes = max_saved_bytes
+        self.client = client or httpx.AsyncClient(base_url=base_url, timeout=timeout_seconds)
+        self.slots: List[_Slot] = []
+        # session -> (filename, bytes), least -> most recently used
+        self.saved: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self.saved_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "saves": 0, "restores": 0, "evictions": 0, "errors": 0}
+        self._lock = asyncio.Lock()
+        self._saver: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.slots)
+
+    def served_model(self, requested: Optional[str]) -> str:
+        """The model a turn asking for ``requested`` runs on; llama-server serves only the one it loaded."""
+        if self.active:
+            return settings.VLLM_MODEL_NAME
+        return requested or settings.OLLAMA_MODEL
+
+    async def start(self) -> bool:
+        """Probe the backend for slots and start the idle saver; False if slots are unsupported."""
+        try:
+            response = await self.client.get("/props")
+            response.raise_for_status()
+            total_slots = int(response.json().get("total_slots") or 0)
+        except Exception as e:
+            logger.warning(f"KV slot manager disabled: backend does not expose llama.cpp slots ({e})")
+            return False
+        if total_slots <= 0:
+            logger.warning("KV slot manager disabled: backend reports no slots")
+            return False
+        self.slots = [_Slot(i) for i in range(total_slots)]
+        if self._saver is None or self._saver.done():
+            self._saver = asyncio.create_task(self._save_idle_forever())
+        logger.info(f"KV slot manager active with {total_slots} slot(s)")
+        return True
+
+    async def close(self):
+        if self._saver is not None:
+            self._saver.cancel()
+            try:
+                await self._saver
+            except asyncio.CancelledError:
+                pass
+            self._saver = None
+        await self.client.aclose()
+
+    @staticmethod
+    def _filename(session: str) -> str:
+        return re.sub(r"[^A-Za-z0-9_-]", "_", session) + ".bin"
+
+    async def _slot_action(self, slot_id: int, action: str, filename: Optional[str] = None) -> Dict[str, Any]:
+        response = await self.client.post(
+            f"/slots/{slot_id}", params={"action": action}, json={"filename": filename} if filename else {}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def _save(self, slot: _Slot, session: str):
+        """Save the slot's cache as ``session``'s (the slot must be held busy)."""
+        filename = self._filename(session)
+        try:
+            result = await self._slot_action(slot.id, "save", filename)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"Saving KV cache of session {session} from slot {slot.id} failed: {e}")
+            return
+        slot.dirty = False
+        self.counters["saves"] += 1
+        _, old_bytes = self.saved.pop(session, ("", 0))
+        nbytes = int(result.get("n_written") or 0)
+        self.saved[session] = (filename, nbytes)
+        self.saved_bytes += nbytes - old_bytes
+        logger.info(f"Saved KV cache of session {session} from slot {slot.id} "
+                    f"({result.get('n_saved')} tokens, {nbytes} bytes)")
+        self._evict_saved()
+
+    def _evict_saved(self):
+        while self.saved and (len(self.saved) > self.max_saved_files or self.saved_bytes > self.max_saved_bytes):
+            session, (filename, nbytes) = self.saved.popitem(last=False)
+            self.saved_bytes -= nbytes
+            self.counters["evictions"] += 1
+            if self.save_dir:
+                try:
+                    os.remove(os.path.join(self.save_dir, filename))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Could not delete saved KV cache {filename}: {e}")
+
+    async def _restore(self, slot: _Slot, session: str) -> bool:
+        filename, _ = self.saved[session]
+        try:
+            result = await self._slot_action(slot.id, "restore", filename)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"Restoring KV cache {filename} into slot {slot.id} failed: {e}")
+            entry = self.saved.pop(session, None)
+            if entry:
+                self.saved_bytes -= entry[1]
+            return False
+        self.saved.move_to_end(session)
+        self.counters["restores"] += 1
+        logger.info(f"Restored KV cache {filename} into slot {slot.id} ({result.get('n_restored')} tokens)")
+        return True
+
+    async def acquire(self, session: str, prefix_session: Optional[str] = None) -> Optional[int]:
+        """Pin ``session`` to a slot holding its KV cache, restoring it if needed.
+
+        ``prefix_session`` (e.g. the session a fork was made from) is restored
+        instead when ``session`` has nothing saved, since its cache is a prefix
+        of this session's prompt. Returns None when no slot is free; the
+        request then goes to whichever slot the server picks.
+        """
+        if not self.active:
+            return None
+        async with self._lock:
+            slot = next((s for s in self.slots if s.session == session), None)
+            if slot is not None and slot.busy:
+                return None  # concurrent turn of the same session
+            if slot is None:
+                idle = [s for s in self.slots if not s.busy]
+                if not idle:
+                    return None
+                slot = min(idle, key=lambda s: (s.session is not None, s.last_used))
+            slot.busy = True
+            previous, slot.session = slot.session, session
+
+        if previous == session:
+            self.counters["hits"] += 1
+            return slot.id
+        self.counters["misses"] += 1
+        if previous is not None and slot.dirty:
+            # The other session's cache is only in this slot: keep it before it is overwritten
+            await self._save(slot, previous)
+        slot.dirty = False
+        for candidate in (session, prefix_session):
+            if candidate and candidate in self.saved and await self._restore(slot, candidate):
+                break
+        return slot.id
+
+    def release(self, slot_id: Optional[int]):
+        if slot_id is None or not self.active:
+            return
+        slot = self.slots[slot_id]
+        slot.busy = False
+        slot.dirty = True
+        slot.last_used = time.monotonic()
+
+    @asynccontextmanager
+    async def session_slot(self, session: Optional[str], prefix_session: Optional[str] = None) -> AsyncIterator[Optional[int]]:
+        """``async with kv_slots.session_slot(session_id) as slot_id:`` around one LLM call."""
+        slot_id = await self.acquire(session, prefix_session) if session else None
+        try:
+            yield slot_id
+        finally:
+            self.release(slot_id)
+
+    async def save_idle(self) -> int:
+        """Save the cache of every session idle for ``idle_seconds`` that changed since its last save."""
+        cutoff = time.monotonic() - self.idle_seconds
+        async with self._lock:
+            due = [s for s in self.slots if s.session and s.dirty and not s.busy and s.last_used <= cutoff]
+            for slot in due:
+                slot.busy = True
+        for slot in due:
+            try:
+                await self._save(slot, slot.session)
+            finally:
+                slot.busy = False
+        return len(due)
+
+    async def _save_idle_forever(self):
+        interval = max(1.0, self.idle_seconds / 2)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save_idle()
+            except Exception as e:
+                logger.error(f"KV slot idle saver failed: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "slots": [{"id": s.id, "session": s.session, "busy": s.busy} for s in self.slots],
+            "saved_sessions": len(self.saved),
+            "saved_bytes": self.saved_bytes,
+            **self.counters,
+        }
+
+
+kv_slots = KVSlotManager()
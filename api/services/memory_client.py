@@ -1,8 +1,10 @@
+import asyncio
 import logging
 import os
 from typing import List, Dict, Any, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
 from api.core.config import settings
+from api.core.deadline import stage_budget
+from api.services.circuit_breaker import get_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +34,18 @@ class MemoryClient:
                 self.enabled = False
                 self.client = None
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
+        self.breaker = get_breaker("mem0")
+
+    async def _call(self, func, *args, **kwargs):
+        """Run a blocking mem0 SDK call in a worker thread behind the mem0 circuit breaker.
+
+        The wait is bounded by MEMORY_TIMEOUT_SECONDS, shrunk to the request deadline.
+        """
+        async def run():
+            with stage_budget(settings.MEMORY_TIMEOUT_SECONDS) as timeout:
+                return await asyncio.wait_for(asyncio.to_thread(func, *args, **kwargs), timeout=timeout)
+        return await self.breaker.call(run)
+
     async def add_memory(self, user_id: str, messages: List[Dict[str, str]], metadata: Optional[Dict[str, Any]] = None, infer: bool = True):
         """
         Adds memories using the official mem0ai SDK.
@@ -44,14 +57,13 @@ class MemoryClient:
         
         try:
             # Use the official SDK's add method
-            result = self.client.add(messages, user_id=user_id, metadata=metadata)
+            result = await self._call(self.client.add, messages, user_id=user_id, metadata=metadata)
             logger.info(f"Memory added successfully for user {user_id}: {result}")
             return result
         except Exception as e:
             logger.error(f"Error adding memory for user {user_id}: {e}")
             return None
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
     async def get_memory(self, memory_id: str):
         """Get a specific memory by ID."""
         if not self.enabled or not self.client:
@@ -59,14 +71,13 @@ class MemoryClient:
             return None
         
         try:
-            result = self.client.get(memory_id)
+            result = await self._call(self.client.get, memory_id)
             logger.info(f"Retrieved memory {memory_id}: {result}")
             return result
         except Exception as e:
             logger.error(f"Error retrieving memory {memory_id}: {e}")
             return None
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
     async def update_memory(self, memory_id: str, data: Dict[str, Any]):
         """Update a memory by ID."""
         if not self.enabled or not self.client:
@@ -74,14 +85,13 @@ class MemoryClient:
             return None
         
         try:
-            result = self.client.update(memory_id, data)
+            result = await self._call(self.client.update, memory_id, data)
             logger.info(f"Updated memory {memory_id}: {result}")
             return result
         except Exception as e:
             logger.error(f"Error updating memory {memory_id}: {e}")
             return None
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
     async def delete_memory(self, memory_id: str):
         """Delete a memory by ID."""
         if not self.enabled or not self.client:
@@ -89,14 +99,13 @@ class MemoryClient:
             return False
         
         try:
-            result = self.client.delete(memory_id)
+            result = await self._call(self.client.delete, memory_id)
             logger.info(f"Deleted memory {memory_id}: {result}")
             return True
         except Exception as e:
             logger.error(f"Error deleting memory {memory_id}: {e}")
             return False
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
     async def get_all_memories(self, user_id: str):
         """Get all memories for a user."""
         if not self.enabled or not self.client:
@@ -104,14 +113,13 @@ class MemoryClient:
             return []
         
         try:
-            result = self.client.get_all(user_id=user_id)
+            result = await self._call(self.client.get_all, user_id=user_id)
             logger.info(f"Retrieved all memories for user {user_id}: {len(result) if result else 0} memories")
             return result if result else []
         except Exception as e:
             logger.error(f"Error retrieving all memories for user {user_id}: {e}")
             return []
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
     async def search_memory(self, user_id: str, query: str, limit: int = 5):
         """Search memories for a user using the official SDK."""
         if not self.enabled or not self.client:
@@ -119,14 +127,13 @@ class MemoryClient:
             return []
         
         try:
-            result = self.client.search(query, user_id=user_id, limit=limit)
+            result = await self._call(self.client.search, query, user_id=user_id, limit=limit)
             logger.info(f"Memory search for user {user_id} with query '{query}': {len(result) if result else 0} results")
             return result if result else []
         except Exception as e:
             logger.error(f"Error searching memories for user {user_id}: {e}")
             return []
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
     async def delete_all_memories(self, user_id: str):
         """Delete all memories for a user."""
         if not self.enabled or not self.client:
@@ -134,14 +141,13 @@ class MemoryClient:
             return False
         
         try:
-            result = self.client.delete_all(user_id=user_id)
+            result = await self._call(self.client.delete_all, user_id=user_id)
             logger.info(f"Deleted all memories for user {user_id}: {result}")
             return True
         except Exception as e:
             logger.error(f"Error deleting all memories for user {user_id}: {e}")
             return False
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
     async def get_memory_history(self, memory_id: str):
         """Get the history of a memory."""
         if not self.enabled or not self.client:
@@ -149,7 +155,7 @@ class MemoryClient:
             return []
         
         try:
-            result = self.client.history(memory_id)
+            result = await self._call(self.client.history, memory_id)
             logger.info(f"Retrieved history for memory {memory_id}: {len(result) if result else 0} entries")
             return result if result else []
         except Exception as e:
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from api.core.config import settings
+from api.services.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Elements whose text is never part of the main content
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "footer", "header", "aside", "form", "iframe"}
+# Elements that start a new block of text
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "table", "tr", "td", "th",
+    "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "br", "hr", "dd", "dt",
+}
+_VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "embed", "source", "track", "wbr"}
+# Short blocks (menus, buttons, bylines) are dropped unless they are headings
+_MIN_BLOCK_CHARS = 40
+
+
+class _MainTextParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.blocks: List[str] = []
+        self._current: List[str] = []
+        self._skip_depth = 0
+        self._in_title = False
+        self._heading = False
+
+    def _flush(self):
+        text = " ".join("".join(self._current).split())
+        self._current = []
+        if text and (self._heading or len(text) >= _MIN_BLOCK_CHARS):
+            self.blocks.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            if tag not in _VOID_TAGS:
+                self._skip_depth += 1
+            return
+        if tag == "title":
+            self._in_title = True
+        elif tag in _BLOCK_TAGS and not self._skip_depth:
+            self._flush()
+            self._heading = tag in {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if tag == "title":
+            self._in_title = False
+        elif tag in _BLOCK_TAGS and not self._skip_depth:
+            self._flush()
+            self._heading = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self._current.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_main_text(html: str, max_chars: int = 4000) -> Dict[str, str]:
+    """Extract the title and readable body text from an HTML document.
+
+    Runs in a worker process (see ``PageFetcher``), so it must stay a plain
+    top-level function with picklable arguments.
+    """
+    parser = _MainTextParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:  # malformed markup: keep whatever was parsed so far
+        logger.debug(f"HTML parsing stopped early: {e}")
+    text = "\n".join(parser.blocks)
+    if len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + "…"
+    return {"title": " ".join(parser.title.split()), "text": text}
+
+
+class PageFetcher:
+    """Fetches pages concurrently over a shared connection pool and extracts their text.
+
+    Response bodies are capped at ``max_bytes``, parsing happens in a process
+    pool so it doesn't block the event loop, and extracted pages are cached by
+    URL and revalidated with ETag / Last-Modified on the next fetch.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.PAGE_FETCH_MAX_CONCURRENCY,
+        max_bytes: int = settings.PAGE_FETCH_MAX_BYTES,
+        timeout_seconds: float = settings.PAGE_FETCH_TIMEOUT_SECONDS,
+        max_chars: int = settings.PAGE_FETCH_MAX_CHARS,
+        parser_workers: int = settings.PAGE_PARSER_WORKERS,
+        cache=redis_client,
+        cache_ttl_seconds: int = settings.PAGE_CACHE_TTL_SECONDS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_bytes = max_bytes
+        self.timeout_seconds = timeout_seconds
+        self.max_chars = max_chars
+        self.parser_workers = parser_workers
+        self.cache = cache
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._client: Optional[httpx.AsyncClient] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout_seconds),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency * 2,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                follow_redirects=True,
+                headers={"User-Agent": "Mozilla/5.0 (compatible; LocalLLMSimulator/1.0)"},
+            )
+        return self._client
+
+    async def _extract(self, html: str) -> Dict[str, str]:
+        loop = asyncio.get_running_loop()
+        if self.parser_workers > 0:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.parser_workers)
+            try:
+                return await loop.run_in_executor(self._executor, extract_main_text, html, self.max_chars)
+            except BrokenProcessPool:
+                logger.warning("Page parser pool is broken; recreating it and parsing in a thread this time.")
+                self._executor = None
+        return await asyncio.to_thread(extract_main_text, html, self.max_chars)
+
+    async def _read_capped(self, response: httpx.Response) -> tuple[bytes, bool]:
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                return b"".join(chunks)[:self.max_bytes], True
+        return b"".join(chunks), False
+
+    async def fetch(self, url: str) -> Dict[str, Any]:
+        """Fetch one URL and return ``{"url", "title", "text", ...}``."""
+        cache_key = f"page:{url}"
+        cached = await self.cache.get(cache_key) if self.cache else None
+
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self._semaphore:
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    logger.info(f"Page not modified, using cached extract: {url}")
+                    await self.cache.set(cache_key, cached, ttl_seconds=self.cache_ttl_seconds)
+                    return {**cached, "cached": True}
+                response.raise_for_status()
+
+                content_type = response.headers.get("content-type", "")
+                if content_type and not any(t in content_type for t in ("html", "text/plain", "xml")):
+                    raise ValueError(f"Unsupported content type: {content_type}")
+                declared = int(response.headers.get("content-length") or 0)
+                if declared > self.max_bytes:
+                    logger.info(f"{url} declares {declared} bytes; reading only the first {self.max_bytes}")
+
+                body, truncated = await self._read_capped(response)
+                encoding = response.encoding or "utf-8"
+                etag = response.headers.get("etag")
+                last_modified = response.headers.get("last-modified")
+
+        html = body.decode(encoding, errors="replace")
+        if "html" in content_type or not content_type:
+            extracted = await self._extract(html)
+        else:
+            extracted = {"title": "", "text": " ".join(html.split())[:self.max_chars]}
+
+        page = {
+            "url": url,
+            "title": extracted["title"],
+            "text": extracted["text"],
+            "bytes": len(body),
+            "truncated": truncated,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        if self.cache and (etag or last_modified or page["text"]):
+            await self.cache.set(cache_key, page, ttl_seconds=self.cache_ttl_seconds)
+        return {**page, "cached": False}
+
+    async def fetch_many(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Fetch several URLs concurrently (bounded by ``max_concurrency``).
+
+        Failures are returned in place as ``{"url", "error"}`` so one bad page
+        doesn't discard the others.
+        """
+        async def guarded(url: str):
+            try:
+                return await asyncio.wait_for(self.fetch(url), timeout=self.timeout_seconds * 2)
+            except Exception as e:
+                logger.warning(f"Failed to fetch {url}: {e!r}")
+                return {"url": url, "error": str(e) or e.__class__.__name__}
+
+        # Preserve order, drop duplicates
+        unique_urls = list(dict.fromkeys(u for u in urls if u))
+        return await asyncio.gather(*(guarded(url) for url in unique_urls))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+page_fetcher = PageFetcher()
@@ -0,0 +1,232 @@
+"""Token-bucket rate limits per user and per session.
+
+Each user and each session has three budgets, configured per minute:
+
+* requests: one per message (HTTP, WebSocket frame or queued job)
+* tokens: the message's estimated prompt tokens at admission, and the
+  answer's estimated tokens charged after the turn
+* tool_calls: one per tool call the agent makes
+
+A bucket holds up to its per-minute limit and refills continuously, so short
+bursts pass and sustained floods are held to the rate. With Redis, every
+check is one Lua script over all the buckets it touches: atomic across API
+replicas and job workers, and timed by the Redis clock rather than the
+replicas'. When Redis is unreachable the limiter falls back to in-process
+buckets (per replica) and tries Redis again after RATE_LIMIT_REDIS_RETRY_SECONDS.
+A limit of 0 turns that budget off.
+"""
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from api.core.config import settings
+from api.logic.tool_results import estimate_tokens
+from api.services.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = "requests"
+TOKENS = "tokens"
+TOOL_CALLS = "tool_calls"
+
+# (key, capacity, refill per second, cost)
+_Bucket = Tuple[str, float, float, float]
+
+
+class RateLimitDecision:
+    """Outcome of a check, for the tightest bucket involved."""
+
+    __slots__ = ("allowed", "budget", "limit", "remaining", "reset", "retry_after")
+
+    def __init__(self, allowed: bool, budget: str, limit: float, remaining: float, reset: float, retry_after: float):
+        self.allowed = allowed
+        self.budget = budget  # e.g. "user requests"
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset  # seconds until the bucket is full again
+        self.retry_after = retry_after  # seconds until the request would pass (denied only)
+
+    def headers(self) -> Dict[str, str]:
+        """RateLimit-* headers (IETF draft), plus Retry-After when denied."""
+        headers = {
+            "RateLimit-Limit": str(int(self.limit)),
+            "RateLimit-Remaining": str(max(0, int(self.remaining))),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
+            "RateLimit-Policy": f"{int(self.limit)};w=60",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class RateLimiter:
+    """Token buckets in Redis (shared by all replicas), in process as a fallback."""
+
+    # KEYS: buckets; ARGV[1]: 'take' (all or nothing) or 'charge' (always, down to -capacity),
+    # then capacity, refill per second and cost for each bucket.
+    # Returns {allowed, wait, level per bucket}; numbers as strings so Redis keeps the fractions.
+    _SCRIPT = """
+        local t = redis.call('TIME')
+        local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+        local take = ARGV[1] == 'take'
+        local levels, wait = {}, 0
+        for i, key in ipairs(KEYS) do
+            local capacity = tonumber(ARGV[i * 3 - 1])
+            local rate = tonumber(ARGV[i * 3])
+            local cost = tonumber(ARGV[i * 3 + 1])
+            local state = redis.call('HMGET', key, 'level', 'at')
+            local level = tonumber(state[1]) or capacity
+            local at = tonumber(state[2]) or now
+            level = math.min(capacity, level + math.max(0, now - at) * rate)
+            levels[i] = level
+            if take and level < math.min(cost, capacity) then
+                wait = math.max(wait, (math.min(cost, capacity) - level) / rate)
+            end
+        end
+        local result = {wait > 0 and 0 or 1, tostring(wait)}
+        for i, key in ipairs(KEYS) do
+            local capacity = tonumber(ARGV[i * 3 - 1])
+            local rate = tonumber(ARGV[i * 3])
+            local level = levels[i]
+            if wait == 0 then
+                level = math.max(-capacity, level - tonumber(ARGV[i * 3 + 1]))
+                redis.call('HSET', key, 'level', tostring(level), 'at', tostring(now))
+                redis.call('EXPIRE', key, math.ceil((capacity - level) / rate) + 1)
+            end
+            result[#result + 1] = tostring(level)
+        end
+        return result
+    """
+
+    def __init__(
+        self,
+        redis: Optional[RedisClient] = redis_client,
+        enabled: bool = settings.RATE_LIMIT_ENABLED,
+        redis_retry_seconds: float = settings.RATE_LIMIT_REDIS_RETRY_SECONDS,
+        max_local_buckets: int = 100_000,
+    ):
+        self.redis = redis if redis is not None and redis.client is not None else None
+        self.enabled = enabled
+        self.redis_retry_seconds = redis_retry_seconds
+        self.max_local_buckets = max_local_buckets
+        self.limits = {
+            ("user", REQUESTS): settings.RATE_LIMIT_USER_REQUESTS_PER_MINUTE,
+            ("session", REQUESTS): settings.RATE_LIMIT_SESSION_REQUESTS_PER_MINUTE,
+            ("user", TOKENS): settings.RATE_LIMIT_USER_TOKENS_PER_MINUTE,
+            ("session", TOKENS): settings.RATE_LIMIT_SESSION_TOKENS_PER_MINUTE,
+            ("user", TOOL_CALLS): settings.RATE_LIMIT_USER_TOOL_CALLS_PER_MINUTE,
+            ("session", TOOL_CALLS): settings.RATE_LIMIT_SESSION_TOOL_CALLS_PER_MINUTE,
+        }
+        self._script = self.redis.client.register_script(self._SCRIPT) if self.redis is not None else None
+        self._redis_down_until = 0.0
+        self._local: Dict[str, Tuple[float, float, float]] = {}  # key -> (level, monotonic time, refill rate)
+        self.denied = 0
+        self.fallbacks = 0
+
+    def _buckets(self, user_id: str, session_id: str, costs: Dict[str, float]) -> Tuple[List[_Bucket], List[str]]:
+        buckets, names = [], []
+        for budget, cost in costs.items():
+            for scope, owner in (("user", user_id), ("session", session_id)):
+                per_minute = self.limits[(scope, budget)]
+                if per_minute > 0:
+                    buckets.append((f"ratelimit:{scope}:{owner}:{budget}", per_minute, per_minute / 60.0, cost))
+                    names.append(f"{scope} {budget.replace('_', ' ')}")
+        return buckets, names
+
+    def _local_apply(self, buckets: List[_Bucket], take: bool) -> Tuple[bool, float, List[float]]:
+        """The Lua script's logic, on in-process buckets."""
+        now = time.monotonic()
+        levels, wait = [], 0.0
+        for key, capacity, rate, cost in buckets:
+            level, at = self._local.get(key, (capacity, now, rate))[:2]
+            level = min(capacity, level + max(0.0, now - at) * rate)
+            levels.append(level)
+            if take and level < min(cost, capacity):
+                wait = max(wait, (min(cost, capacity) - level) / rate)
+        if wait == 0:
+            for i, (key, capacity, rate, cost) in enumerate(buckets):
+                levels[i] = max(-capacity, levels[i] - cost)
+                self._local[key] = (levels[i], now, rate)
+            if len(self._local) > self.max_local_buckets:
+                self._prune(now)
+        return wait == 0, wait, levels
+
+    def _prune(self, now: float):
+        """Drop buckets that have refilled completely; they equal a missing bucket."""
+        for key, (level, at, rate) in list(self._local.items()):
+            if level + (now - at) * rate >= rate * 60.0:
+                del self._local[key]
+
+    async def _apply(self, buckets: List[_Bucket], take: bool) -> Tuple[bool, float, List[float]]:
+        if self._script is not None and time.monotonic() >= self._redis_down_until:
+            args = ["take" if take else "charge"]
+            for _, capacity, rate, cost in buckets:
+                args += [capacity, rate, cost]
+            try:
+                result = await self._script(keys=[b[0] for b in buckets], args=args)
+                return bool(int(result[0])), float(result[1]), [float(level) for level in result[2:]]
+            except Exception as e:
+                self._redis_down_until = time.monotonic() + self.redis_retry_seconds
+                self.fallbacks += 1
+                logger.error(f"Rate limiter: Redis unavailable, limiting in process for {self.redis_retry_seconds:.0f}s: {e}")
+        return self._local_apply(buckets, take)
+
+    async def _check(self, user_id: str, session_id: str, costs: Dict[str, float], take: bool = True) -> Optional[RateLimitDecision]:
+        if not self.enabled:
+            return None
+        buckets, names = self._buckets(str(user_id), str(session_id), costs)
+        if not buckets:
+            return None
+        allowed, wait, levels = await self._apply(buckets, take)
+        # Report the bucket with the smallest share left
+        i = min(range(len(buckets)), key=lambda n: levels[n] / buckets[n][1])
+        _, capacity, rate, cost = buckets[i]
+        decision = RateLimitDecision(
+            allowed=allowed,
+            budget=names[i],
+            limit=capacity,
+            remaining=levels[i],
+            reset=max(0.0, (capacity - levels[i]) / rate),
+            retry_after=wait,
+        )
+        if not allowed:
+            self.denied += 1
+            logger.warning(f"Rate limit: {decision.budget} exhausted for user {user_id} / session {session_id}")
+        return decision
+
+    async def admit(self, user_id: str, session_id: str, content: str) -> Optional[RateLimitDecision]:
+        """Take one request and the prompt's estimated tokens; None when limiting is off."""
+        return await self._check(user_id, session_id, {REQUESTS: 1, TOKENS: estimate_tokens(content)})
+
+    async def acquire_tool_calls(self, user_id: str, session_id: str, count: int) -> Optional[RateLimitDecision]:
+        """Take ``count`` tool calls at once, or none of them."""
+        return await self._check(user_id, session_id, {TOOL_CALLS: count})
+
+    async def charge_tokens(self, user_id: str, session_id: str, text: str):
+        """Charge the answer's estimated tokens after the fact; never denies, may leave the bucket in debt."""
+        tokens = estimate_tokens(text)
+        if tokens:
+            try:
+                await self._check(user_id, session_id, {TOKENS: tokens}, take=False)
+            except Exception as e:
+                logger.error(f"Rate limiter: could not charge {tokens} tokens: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "backend": "redis" if self._script is not None and time.monotonic() >= self._redis_down_until else "memory",
+            "local_buckets": len(self._local),
+            "denied": self.denied,
+            "redis_fallbacks": self.fallbacks,
+        }
+
+
+def _create_rate_limiter():
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return RateLimiter(redis=None)
+    if settings.RATE_LIMIT_BACKEND != "redis":
+        logger.warning(f"Unknown RATE_LIMIT_BACKEND '{settings.RATE_LIMIT_BACKEND}', using Redis with in-process fallback.")
+    return RateLimiter()
+
+rate_limiter = _create_rate_limiter()
@@ -0,0 +1,181 @@
+"""Readiness of this API replica, for load balancers and orchestrators.
+
+``/ready`` answers whether this replica should get traffic: the graph is
+compiled and the checkpointer, Redis (when a backend lives there), the LLM
+backend (llama-server while the KV slot manager is active, Ollama otherwise)
+and the memory service respond. Each dependency is checked
+concurrently with its own timeout. Results are cached for
+READINESS_CACHE_SECONDS and concurrent probes share one run, so frequent
+probes from several balancers do not load the dependencies. Checks marked
+non-critical (mem0 by default) are reported but do not fail readiness.
+``warm`` tells whether the model is already loaded in the LLM backend.
+
+A draining replica reports not ready. ``POST /admin/drain`` (e.g. from a
+pre-stop hook, ahead of a rolling restart) sets it so balancers move traffic
+away before the process stops; shutdown sets it too. Liveness (``/live``) is separate:
+it only says the process serves requests, so a replica whose dependencies
+are down is taken out of rotation rather than restarted.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from api.core.config import settings
+from api.logic import conversation_graph
+from api.services.circuit_breaker import all_breakers
+from api.services.kv_slots import kv_slots
+from api.services.memory_client import memory_client
+from api.services.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _NotReady(Exception):
+    """A dependency answered, but is not usable."""
+
+
+class ReadinessProbe:
+    """Cached, concurrent dependency checks for ``/ready``."""
+
+    def __init__(
+        self,
+        redis: RedisClient = redis_client,
+        cache_seconds: float = settings.READINESS_CACHE_SECONDS,
+        timeout_seconds: float = settings.READINESS_CHECK_TIMEOUT_SECONDS,
+    ):
+        self.redis = redis
+        self.cache_seconds = cache_seconds
+        self.timeout_seconds = timeout_seconds
+        self.checkpointer = None  # set by the app lifespan
+        self.draining = False
+        self._result: Optional[Dict[str, Any]] = None
+        self._checked_at = 0.0
+        self._checked_wall = 0.0
+        self._running: Optional[asyncio.Task] = None
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _checks(self) -> Dict[str, Tuple[bool, Callable[[], Awaitable[Optional[str]]]]]:
+        """name -> (critical, check); a check raises when the dependency is unusable."""
+        redis_backends = [
+            name for name, backend in (
+                ("sessions", settings.SESSION_BACKEND),
+                ("checkpoints", settings.CHECKPOINT_BACKEND),
+                ("jobs", settings.JOB_BACKEND),
+                ("response_cache", settings.RESPONSE_CACHE_BACKEND),
+            ) if backend == "redis"
+        ]
+        return {
+            "graph": (True, self._check_graph),
+            "checkpointer": (settings.CHECKPOINT_BACKEND != "none", self._check_checkpointer),
+            "redis": (bool(redis_backends), self._check_redis),
+            "llm": (settings.READINESS_REQUIRE_LLM, self._check_llm),
+            "memory": (settings.READINESS_REQUIRE_MEMORY, self._check_memory),
+        }
+
+    async def _check_graph(self) -> Optional[str]:
+        if conversation_graph.app_graph is None:
+            raise _NotReady("conversation graph not compiled")
+        return None
+
+    async def _check_checkpointer(self) -> Optional[str]:
+        if self.checkpointer is None:
+            if settings.CHECKPOINT_BACKEND == "none":
+                return "disabled"
+            raise _NotReady("checkpointer not open")
+        await self.checkpointer.ping()
+        return type(self.checkpointer).__name__
+
+    async def _check_redis(self) -> Optional[str]:
+        if not await self.redis.ping():
+            raise _NotReady("ping failed")
+        return None
+
+    async def _check_llm(self) -> Optional[str]:
+        breaker = all_breakers().get("llm")
+        if breaker is not None and breaker.state == breaker.OPEN:
+            raise _NotReady("circuit breaker open")
+        if self._http is None:
+            self._http = httpx.AsyncClient()
+        if kv_slots.active:
+            # Turns go to llama-server, which serves the one model it loaded at startup
+            response = await self._http.get(f"{kv_slots.base_url.rstrip('/')}/health", timeout=self.timeout_seconds)
+            response.raise_for_status()
+            return "warm"
+        # Loaded models: reachable, and warm when ours is among them
+        response = await self._http.get(f"{settings.OLLAMA_URL.rstrip('/')}/api/ps", timeout=self.timeout_seconds)
+        response.raise_for_status()
+        loaded = set()
+        for model in response.json().get("models", []):
+            loaded.update((model.get("name"), model.get("model")))
+        return "warm" if settings.OLLAMA_MODEL in loaded else "cold"
+
+    async def _check_memory(self) -> Optional[str]:
+        if not memory_client.enabled:
+            raise _NotReady("mem0 not configured")
+        breaker = memory_client.breaker
+        if breaker.state == breaker.OPEN:
+            raise _NotReady("circuit breaker open")
+        return None
+
+    async def _run_check(self, check: Callable[[], Awaitable[Optional[str]]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(check(), self.timeout_seconds)
+            ok = True
+        except asyncio.TimeoutError:
+            ok, detail = False, f"timed out after {self.timeout_seconds:.1f}s"
+        except Exception as e:
+            ok, detail = False, str(e) or type(e).__name__
+        return {"ok": ok, "detail": detail, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+    async def _run(self) -> Dict[str, Any]:
+        checks = self._checks()
+        results = await asyncio.gather(*(self._run_check(check) for _, check in checks.values()))
+        report = {}
+        for (name, (critical, _)), result in zip(checks.items(), results):
+            report[name] = {**result, "critical": critical}
+            if critical and not result["ok"]:
+                logger.warning(f"Readiness: {name} check failed: {result['detail']}")
+        return report
+
+    async def check(self) -> Dict[str, Any]:
+        """Readiness report; dependency results are at most ``cache_seconds`` old."""
+        if self._result is None or time.monotonic() - self._checked_at >= self.cache_seconds:
+            if self._running is None or self._running.done():
+                self._running = asyncio.create_task(self._run())
+            # Probes arriving meanwhile wait for the same run
+            self._result = await asyncio.shield(self._running)
+            self._checked_at, self._checked_wall = time.monotonic(), time.time()
+        checks = self._result
+        ready = not self.draining and all(c["ok"] for c in checks.values() if c["critical"])
+        if self.draining:
+            status = "draining"
+        elif not ready:
+            status = "not_ready"
+        else:
+            status = "ready" if all(c["ok"] for c in checks.values()) else "degraded"
+        return {
+            "status": status,
+            "ready": ready,
+            "warm": checks["llm"]["ok"] and checks["llm"]["detail"] == "warm",
+            "replica": REPLICA_ID,
+            "checked_at": self._checked_wall,
+            "checks": checks,
+        }
+
+    async def close(self):
+        if self._running is not None and not self._running.done():
+            self._running.cancel()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+readiness = ReadinessProbe()
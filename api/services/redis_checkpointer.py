@@ -0,0 +1,408 @@
+"""LangGraph checkpoint saver on Redis, so any API replica can resume any thread.
+
+Per (thread, namespace) the saver keeps, under a ``{thread_id}`` hash tag:
+
+* ``...:index`` - sorted set of checkpoint ids (all score 0; UUIDv6 ids sort
+  lexicographically in creation order);
+* ``...:data`` - hash of checkpoint id -> [parent id, checkpoint, metadata];
+* ``...:refs`` / ``...:msgs`` - with message dedup, the message refs of each
+  checkpoint and every message of the thread, stored once;
+* ``...:writes:<checkpoint id>`` - pending writes of one checkpoint.
+
+Each ``aput`` is one Lua script: it stores the checkpoint and its new
+messages, trims the thread to the newest ``keep_last`` checkpoints and renews
+the TTL of every key of the thread. If the thread's stored messages expired or
+were evicted in the meantime, the script writes nothing and ``aput`` resends
+them all. ``aget_tuple`` loads a checkpoint with its
+pending writes and messages in a single script call (one round trip).
+"""
+import logging
+import random
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import ormsgpack
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, ChannelVersions, Checkpoint, CheckpointMetadata,
+    CheckpointTuple, get_checkpoint_id, get_checkpoint_metadata,
+)
+
+from api.core.config import settings
+from api.services.checkpoint_serde import MESSAGE_KEY_BYTES, MESSAGE_REFS, MessageDeduplicator, default_serde
+from api.services.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class RedisCheckpointSaver(BaseCheckpointSaver[str]):
+    """Async checkpoint saver storing bounded, TTL'd thread history in Redis."""
+
+    # KEYS: index, data, refs, msgs, namespaces
+    # ARGV: ttl, keep_last, checkpoint id, entry, refs ('' without dedup), namespace,
+    #       writes key prefix, '1' if refs point at messages stored earlier, then message key/value pairs
+    # Returns 0 (and writes nothing) when those earlier messages are gone
+    _PUT_SCRIPT = """
+        if ARGV[8] == '1' and redis.call('EXISTS', KEYS[4]) == 0 then return 0 end
+        local id = ARGV[3]
+        redis.call('HSET', KEYS[2], id, ARGV[4])
+        if ARGV[5] ~= '' then redis.call('HSET', KEYS[3], id, ARGV[5]) end
+        for i = 9, #ARGV, 2 do redis.call('HSETNX', KEYS[4], ARGV[i], ARGV[i + 1]) end
+        redis.call('ZADD', KEYS[1], 0, id)
+        redis.call('SADD', KEYS[5], ARGV[6])
+        local keep = tonumber(ARGV[2])
+        if keep > 0 then
+            local excess = redis.call('ZCARD', KEYS[1]) - keep
+            if excess > 0 then
+                local old = redis.call('ZRANGE', KEYS[1], 0, excess - 1)
+                redis.call('ZREMRANGEBYRANK', KEYS[1], 0, excess - 1)
+                for _, old_id in ipairs(old) do
+                    redis.call('HDEL', KEYS[2], old_id)
+                    redis.call('HDEL', KEYS[3], old_id)
+                    redis.call('DEL', ARGV[7] .. old_id)
+                end
+            end
+        end
+        local ttl = tonumber(ARGV[1])
+        if ttl > 0 then
+            for i = 1, 5 do redis.call('EXPIRE', KEYS[i], ttl) end
+            for _, kept in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+                redis.call('EXPIRE', ARGV[7] .. kept, ttl)
+            end
+        end
+        return 1
+    """
+
+    # KEYS: index, data, refs, msgs; ARGV: writes key prefix, checkpoint id ('' = latest)
+    _GET_SCRIPT = """
+        local id = ARGV[2]
+        if id == '' then
+            local top = redis.call('ZREVRANGE', KEYS[1], 0, 0)
+            if #top == 0 then return false end
+            id = top[1]
+        end
+        local entry = redis.call('HGET', KEYS[2], id)
+        if not entry then return false end
+        local writes = redis.call('HVALS', ARGV[1] .. id)
+        local messages = {}
+        local refs = redis.call('HGET', KEYS[3], id)
+        if refs then
+            local keys = {}
+            for i = 1, #refs, %(key_bytes)d do keys[#keys + 1] = string.sub(refs, i, i + %(key_bytes)d - 1) end
+            for first = 1, #keys, 1000 do
+                local values = redis.call('HMGET', KEYS[4], unpack(keys, first, math.min(first + 999, #keys)))
+                for i = 1, #values do messages[#messages + 1] = values[i] end
+            end
+        end
+        return {id, entry, writes, messages}
+    """ % {"key_bytes": MESSAGE_KEY_BYTES}
+
+    # KEYS: namespaces; ARGV: key prefix of the thread
+    _DELETE_SCRIPT = """
+        for _, ns in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+            local base = ARGV[1] .. ns .. ':'
+            for _, id in ipairs(redis.call('ZRANGE', base .. 'index', 0, -1)) do
+                redis.call('DEL', base .. 'writes:' .. id)
+            end
+            redis.call('DEL', base .. 'index', base .. 'data', base .. 'refs', base .. 'msgs')
+        end
+        redis.call('DEL', KEYS[1])
+        return 1
+    """
+
+    def __init__(
+        self,
+        redis: RedisClient = redis_client,
+        *,
+        keep_last: int = settings.CHECKPOINT_KEEP_LAST,
+        ttl_seconds: int = settings.CHECKPOINT_THREAD_TTL_SECONDS,
+        dedup_messages: bool = settings.CHECKPOINT_MESSAGE_DEDUP,
+        serde=None,
+    ):
+        super().__init__(serde=serde or default_serde())
+        if redis.client is None:
+            raise RuntimeError("Redis is not configured; cannot use the Redis checkpointer")
+        self.redis = redis
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+        self.dedup_messages = dedup_messages
+        self.messages = MessageDeduplicator(self.serde)
+        self._put = redis.client.register_script(self._PUT_SCRIPT)
+        self._get = redis.client.register_script(self._GET_SCRIPT)
+        self._delete = redis.client.register_script(self._DELETE_SCRIPT)
+
+    @staticmethod
+    def _prefix(thread_id: str) -> str:
+        # Hash tag keeps every key of a thread in one cluster slot
+        return f"checkpoint:{{{thread_id}}}:"
+
+    def _keys(self, thread_id: str, checkpoint_ns: str) -> List[str]:
+        base = f"{self._prefix(thread_id)}{checkpoint_ns}:"
+        return [base + "index", base + "data", base + "refs", base + "msgs"]
+
+    def _writes_prefix(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{self._prefix(thread_id)}{checkpoint_ns}:writes:"
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        thread = (thread_id, checkpoint_ns)
+
+        keys = [*self._keys(thread_id, checkpoint_ns), f"{self._prefix(thread_id)}namespaces"]
+        metadata = get_checkpoint_metadata(config, metadata)
+        messages = checkpoint.get("channel_values", {}).get("messages")
+        dedup = self.dedup_messages and isinstance(messages, list) and messages
+
+        def script_args():
+            stored, refs, message_args, new_keys = checkpoint, [], [], []
+            if dedup:
+                refs, new_rows = self.messages.split(thread, messages)
+                stored = {
+                    **checkpoint,
+                    "channel_values": {**checkpoint["channel_values"], "messages": {MESSAGE_REFS: refs}},
+                }
+                for key, type_, payload in new_rows:
+                    message_args.extend((key, ormsgpack.packb([type_, payload])))
+                    new_keys.append(key)
+            entry = ormsgpack.packb([
+                config["configurable"].get("checkpoint_id"),
+                *self.serde.dumps_typed(stored),
+                *self.serde.dumps_typed(metadata),
+            ])
+            relies_on_stored = "1" if set(refs) - set(new_keys) else "0"
+            return new_keys, [
+                self.ttl_seconds, self.keep_last, checkpoint["id"], entry, b"".join(refs),
+                checkpoint_ns, self._writes_prefix(thread_id, checkpoint_ns), relies_on_stored, *message_args,
+            ]
+
+        new_keys, args = script_args()
+        if not await self._put(keys=keys, args=args):
+            # The thread expired or was evicted since we last wrote it: resend every message
+            logger.warning(f"Stored messages of thread {thread_id} are gone; rewriting them")
+            self.messages.forget(thread_id)
+            new_keys, args = script_args()
+            await self._put(keys=keys, args=args)
+        self.messages.remember(thread, new_keys)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = self._writes_prefix(thread_id, checkpoint_ns) + str(config["configurable"]["checkpoint_id"])
+        # Same semantics as the SQLite saver: special channels overwrite, others keep the first write
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for idx, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, idx)
+                field = f"{task_id}:{idx}"
+                blob = ormsgpack.packb([task_id, idx, channel, *self.serde.dumps_typed(value)])
+                if replace:
+                    pipe.hset(key, field, blob)
+                else:
+                    pipe.hsetnx(key, field, blob)
+            if self.ttl_seconds > 0:
+                pipe.expire(key, self.ttl_seconds)
+
+    async def _load(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str = "") -> Optional[CheckpointTuple]:
+        result = await self._get(
+            keys=self._keys(thread_id, checkpoint_ns),
+            args=[self._writes_prefix(thread_id, checkpoint_ns), checkpoint_id],
+        )
+        if not result:
+            return None
+        checkpoint_id, entry, raw_writes, raw_messages = result
+        checkpoint_id = checkpoint_id.decode() if isinstance(checkpoint_id, bytes) else checkpoint_id
+        parent_id, type_, blob, metadata_type, metadata_blob = ormsgpack.unpackb(entry)
+        checkpoint = self.serde.loads_typed((type_, blob))
+
+        channel_values = checkpoint.get("channel_values", {})
+        stored = channel_values.get("messages")
+        if isinstance(stored, dict) and MESSAGE_REFS in stored:
+            messages = [self.serde.loads_typed(tuple(ormsgpack.unpackb(raw))) for raw in raw_messages if raw]
+            if len(messages) != len(stored[MESSAGE_REFS]):
+                logger.error(f"Checkpoint {checkpoint_id} of thread {thread_id} references "
+                             f"{len(stored[MESSAGE_REFS]) - len(messages)} missing messages; they are skipped.")
+            channel_values["messages"] = messages
+
+        writes = sorted(ormsgpack.unpackb(raw) for raw in raw_writes)
+        return CheckpointTuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint,
+            self.serde.loads_typed((metadata_type, metadata_blob)),
+            (
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            [(task, channel, self.serde.loads_typed((t, value))) for task, _, channel, t, value in writes],
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._load(
+            str(config["configurable"]["thread_id"]),
+            config["configurable"].get("checkpoint_ns", ""),
+            get_checkpoint_id(config) or "",
+        )
+
+    async def aiter_messages(self, config: RunnableConfig, batch_size: int = 500) -> AsyncIterator[List[Any]]:
+        """Messages of a checkpoint (the latest by default) in batches, without loading them all at once."""
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        index, data, refs_key, msgs = self._keys(thread_id, checkpoint_ns)
+        checkpoint_id = get_checkpoint_id(config)
+        if not checkpoint_id:
+            top = await self.redis.client.zrevrange(index, 0, 0)
+            if not top:
+                return
+            checkpoint_id = top[0]
+        refs_blob = await self.redis.client.hget(refs_key, checkpoint_id)
+        if refs_blob is None:
+            entry = await self.redis.client.hget(data, checkpoint_id)
+            if entry is None:
+                return
+            _, type_, blob, _, _ = ormsgpack.unpackb(entry)
+            messages = self.serde.loads_typed((type_, blob)).get("channel_values", {}).get("messages") or []
+            for start in range(0, len(messages), batch_size):
+                yield messages[start:start + batch_size]
+            return
+        refs = [refs_blob[i:i + MESSAGE_KEY_BYTES] for i in range(0, len(refs_blob), MESSAGE_KEY_BYTES)]
+        for start in range(0, len(refs), batch_size):
+            raw_messages = await self.redis.client.hmget(msgs, refs[start:start + batch_size])
+            yield [self.serde.loads_typed(tuple(ormsgpack.unpackb(raw))) for raw in raw_messages if raw]
+
+    async def _thread_namespaces(self, config: Optional[RunnableConfig]) -> List[Tuple[str, str]]:
+        if config is not None:
+            thread_id = str(config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                return [(thread_id, config["configurable"]["checkpoint_ns"])]
+            members = await self.redis.client.smembers(f"{self._prefix(thread_id)}namespaces")
+            return [(thread_id, ns.decode()) for ns in members]
+        threads = []
+        async for key in self.redis.client.scan_iter(match="checkpoint:{*}:namespaces", count=500):
+            key = key.decode()
+            thread_id = key[len("checkpoint:{"):-len("}:namespaces")]
+            members = await self.redis.client.smembers(key)
+            threads.extend((thread_id, ns.decode()) for ns in members)
+        return threads
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Checkpoints newest first; ``filter`` matches metadata keys exactly."""
+        upper = f"({get_checkpoint_id(before)}" if before and get_checkpoint_id(before) else "+"
+        for thread_id, checkpoint_ns in await self._thread_namespaces(config):
+            index = self._keys(thread_id, checkpoint_ns)[0]
+            if config is not None and get_checkpoint_id(config):
+                ids = [get_checkpoint_id(config)]
+            else:
+                ids = [i.decode() for i in await self.redis.client.zrevrangebylex(index, upper, "-")]
+            for checkpoint_id in ids:
+                item = await self._load(thread_id, checkpoint_ns, checkpoint_id)
+                if item is None:
+                    continue
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                yield item
+                if limit is not None:
+                    limit -= 1
+                    if limit <= 0:
+                        return
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        thread_id = str(thread_id)
+        await self._delete(keys=[f"{self._prefix(thread_id)}namespaces"], args=[self._prefix(thread_id)])
+        self.messages.forget(thread_id)
+
+    async def acopy_thread(
+        self, source_thread_id: str, target_thread_id: str, checkpoint_id: Optional[str] = None
+    ) -> Optional[RunnableConfig]:
+        """Start ``target_thread_id`` from one checkpoint (the latest by default) of ``source_thread_id``.
+
+        The stored checkpoint, its pending writes and the messages it refers
+        to are copied as raw bytes; the source thread is left untouched.
+        Returns the new thread's config, or None if the checkpoint does not exist.
+        """
+        source, target = str(source_thread_id), str(target_thread_id)
+        index, data, refs_key, msgs = self._keys(source, "")
+        if checkpoint_id is None:
+            top = await self.redis.client.zrevrange(index, 0, 0)
+            if not top:
+                return None
+            checkpoint_id = top[0].decode()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hget(data, checkpoint_id)
+            pipe.hget(refs_key, checkpoint_id)
+            pipe.hgetall(self._writes_prefix(source, "") + checkpoint_id)
+        entry, refs_blob, writes = pipe.results
+        if entry is None:
+            return None
+
+        message_args = []
+        if refs_blob:
+            refs = list(dict.fromkeys(
+                refs_blob[i:i + MESSAGE_KEY_BYTES] for i in range(0, len(refs_blob), MESSAGE_KEY_BYTES)
+            ))
+            for start in range(0, len(refs), 1000):
+                chunk = refs[start:start + 1000]
+                for key, value in zip(chunk, await self.redis.client.hmget(msgs, chunk)):
+                    if value is not None:
+                        message_args.extend((key, value))
+        # The fork starts a new history: its first checkpoint has no parent
+        entry = ormsgpack.packb([None, *ormsgpack.unpackb(entry)[1:]])
+        await self._put(
+            keys=[*self._keys(target, ""), f"{self._prefix(target)}namespaces"],
+            args=[
+                self.ttl_seconds, self.keep_last, checkpoint_id, entry, refs_blob or b"",
+                "", self._writes_prefix(target, ""), "0", *message_args,
+            ],
+        )
+        if writes:
+            writes_key = self._writes_prefix(target, "") + checkpoint_id
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(writes_key, mapping=writes)
+                if self.ttl_seconds > 0:
+                    pipe.expire(writes_key, self.ttl_seconds)
+        return {"configurable": {"thread_id": target, "checkpoint_ns": "", "checkpoint_id": checkpoint_id}}
+
+    def start_retention(self, interval_seconds: float = settings.CHECKPOINT_RETENTION_INTERVAL_SECONDS):
+        pass  # history is trimmed on every write and Redis expires idle threads itself
+
+    async def stop_retention(self):
+        pass
+
+    async def ping(self):
+        """Raise unless Redis answers."""
+        await self.redis.client.ping()
+
+    async def close(self):
+        pass  # the shared redis_client is closed by the app lifespan
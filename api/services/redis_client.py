@@ -1,35 +1,266 @@
 import redis.asyncio as redis
 import json
 import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Mapping, Optional
 from api.core.config import settings
 
+try:
+    import orjson  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover
+    orjson = None
+try:
+    import ormsgpack as msgpack  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover
+    try:
+        import msgpack  # type: ignore
+    except ModuleNotFoundError:
+        msgpack = None
+try:
+    import zstandard  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover
+    zstandard = None
+
 logger = logging.getLogger(__name__)
 
+# One header byte in front of every value: format tag, high bit = zstd-compressed.
+# JSON written by the old client starts with a printable character, so it never
+# collides with these and is still readable.
+_TAG_JSON = 0x01
+_TAG_MSGPACK = 0x02
+_FLAG_ZSTD = 0x80
+
+
+class RedisCodec:
+    """Binary value codec for Redis: msgpack or JSON, zstd-compressed above a size threshold.
+
+    Decoding looks at the header byte, so values written with any format (or by
+    the previous plain-JSON client) can always be read back.
+    """
+
+    def __init__(self, format: str = "msgpack", compress_threshold: int = 4096, compression_level: int = 3):
+        if format == "msgpack" and msgpack is None:
+            logger.warning("msgpack not installed; Redis values will be JSON encoded.")
+            format = "json"
+        if format not in ("json", "msgpack"):
+            raise ValueError(f"Unknown Redis codec format: {format}")
+        self.format = format
+        self.compress_threshold = compress_threshold if zstandard is not None else 0
+        self._compressor = zstandard.ZstdCompressor(level=compression_level) if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def encode(self, value: Any) -> bytes:
+        if self.format == "msgpack":
+            tag, payload = _TAG_MSGPACK, msgpack.packb(value)
+        elif orjson is not None:
+            tag, payload = _TAG_JSON, orjson.dumps(value)
+        else:
+            tag, payload = _TAG_JSON, json.dumps(value, separators=(",", ":")).encode()
+        if self.compress_threshold and len(payload) >= self.compress_threshold:
+            tag, payload = tag | _FLAG_ZSTD, self._compressor.compress(payload)
+        return bytes((tag,)) + payload
+
+    @staticmethod
+    def is_encoded(data: bytes) -> bool:
+        """Whether ``data`` starts with a codec header byte (plain text never does)."""
+        return bool(data) and data[0] & ~_FLAG_ZSTD in (_TAG_JSON, _TAG_MSGPACK)
+
+    def decode(self, data: Optional[bytes]) -> Any:
+        if data is None:
+            return None
+        if isinstance(data, str):
+            data = data.encode()
+        if not self.is_encoded(data):
+            return json.loads(data)  # legacy plain-JSON value
+        tag = data[0]
+        payload = data[1:]
+        if tag & _FLAG_ZSTD:
+            if self._decompressor is None:
+                raise ValueError("Value is zstd-compressed but zstandard is not installed")
+            payload = self._decompressor.decompress(payload)
+        if tag & ~_FLAG_ZSTD == _TAG_MSGPACK:
+            if msgpack is None:
+                raise ValueError("Value is msgpack encoded but msgpack is not installed")
+            return msgpack.unpackb(payload)
+        return orjson.loads(payload) if orjson is not None else json.loads(payload)
+
+
+class _OpStats:
+    __slots__ = ("calls", "errors", "keys", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.keys = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "keys": self.keys,
+            "avg_ms": round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
 class RedisClient:
-    def __init__(self, url: str):
+    def __init__(
+        self,
+        url: str,
+        codec: Optional[RedisCodec] = None,
+        max_connections: int = settings.REDIS_MAX_CONNECTIONS,
+        socket_timeout: float = settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+        connect_timeout: float = settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+    ):
+        self.codec = codec or RedisCodec(
+            format=settings.REDIS_CODEC,
+            compress_threshold=settings.REDIS_COMPRESS_THRESHOLD,
+        )
+        self._stats: Dict[str, _OpStats] = {}
         try:
-            self.client = redis.from_url(url, decode_responses=True)
+            self.pool = redis.ConnectionPool.from_url(
+                url,
+                max_connections=max_connections,
+                socket_timeout=socket_timeout,
+                socket_connect_timeout=connect_timeout,
+                health_check_interval=30,
+            )
+            self.client = redis.Redis(connection_pool=self.pool)
             logger.info("Successfully connected to Redis.")
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
+            self.pool = None
             self.client = None
 
+    @asynccontextmanager
+    async def _measure(self, op: str, keys: int = 1):
+        stats = self._stats.get(op)
+        if stats is None:
+            stats = self._stats[op] = _OpStats()
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            stats.calls += 1
+            stats.keys += keys
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-operation call counts, error counts and latency."""
+        return {op: s.as_dict() for op, s in self._stats.items()}
+
+    def encode(self, value: Any) -> bytes:
+        return self.codec.encode(value)
+
+    def decode(self, data: Optional[bytes]) -> Any:
+        return self.codec.decode(data)
+
+    def is_encoded(self, data: bytes) -> bool:
+        return self.codec.is_encoded(data)
+
     async def get(self, key: str):
         if not self.client:
             return None
         try:
-            value = await self.client.get(key)
-            return json.loads(value) if value else None
+            async with self._measure("get"):
+                value = await self.client.get(key)
+            return self.codec.decode(value) if value else None
         except Exception as e:
             logger.error(f"Failed to get key '{key}' from Redis: {e}")
             return None
 
-    async def set(self, key: str, value, ttl_seconds: int):
+    async def set(self, key: str, value, ttl_seconds: Optional[int] = None):
         if not self.client:
             return
         try:
-            await self.client.set(key, json.dumps(value), ex=ttl_seconds)
+            async with self._measure("set"):
+                await self.client.set(key, self.codec.encode(value), ex=ttl_seconds)
         except Exception as e:
             logger.error(f"Failed to set key '{key}' in Redis: {e}")
 
+    async def mget(self, keys: List[str]) -> List[Any]:
+        """Fetch many keys in one round trip; missing or failed keys come back as None."""
+        if not self.client or not keys:
+            return [None] * len(keys)
+        try:
+            async with self._measure("mget", keys=len(keys)):
+                values = await self.client.mget(keys)
+            return [self.codec.decode(v) if v else None for v in values]
+        except Exception as e:
+            logger.error(f"Failed to mget {len(keys)} keys from Redis: {e}")
+            return [None] * len(keys)
+
+    async def mset(self, mapping: Mapping[str, Any], ttl_seconds: Optional[int] = None) -> bool:
+        """Store many keys in one round trip (pipelined SET EX when a TTL is given)."""
+        if not self.client or not mapping:
+            return False
+        try:
+            encoded = {k: self.codec.encode(v) for k, v in mapping.items()}
+            async with self._measure("mset", keys=len(encoded)):
+                if ttl_seconds is None:
+                    await self.client.mset(encoded)
+                else:
+                    async with self.client.pipeline(transaction=False) as pipe:
+                        for key, value in encoded.items():
+                            pipe.set(key, value, ex=ttl_seconds)
+                        await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to mset {len(mapping)} keys in Redis: {e}")
+            return False
+
+    async def delete(self, *keys: str) -> int:
+        if not self.client or not keys:
+            return 0
+        try:
+            async with self._measure("delete", keys=len(keys)):
+                return await self.client.delete(*keys)
+        except Exception as e:
+            logger.error(f"Failed to delete {len(keys)} keys from Redis: {e}")
+            return 0
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False):
+        """Batch raw commands into one round trip.
+
+        Values are not encoded automatically; use ``encode``/``decode`` for
+        anything written through the codec::
+
+            async with redis_client.pipeline() as pipe:
+                pipe.set(key, redis_client.encode(value), ex=60)
+                pipe.expire(other_key, 60)
+            # executed on exit; results in pipe.results
+        """
+        if not self.client:
+            raise RuntimeError("Redis is not configured")
+        async with self.client.pipeline(transaction=transaction) as pipe:
+            yield pipe
+            async with self._measure("pipeline", keys=len(pipe.command_stack)):
+                pipe.results = await pipe.execute()
+
+    async def ping(self) -> bool:
+        if not self.client:
+            return False
+        try:
+            async with self._measure("ping"):
+                return bool(await self.client.ping())
+        except Exception as e:
+            logger.warning(f"Redis ping failed: {e}")
+            return False
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+        if self.pool is not None:
+            await self.pool.disconnect()
+        logger.info("Redis connection pool closed.")
+
 redis_client = RedisClient(url=settings.REDIS_URL)
@@ -0,0 +1,254 @@
+"""Opt-in cache of final answers for repeated prompts.
+
+Both tiers are scoped to a context key: the model, its temperature, the
+system prompt, the session's agent_config, the memories recalled for the
+turn and the conversation so far. An answer is only reused where the model
+would have seen exactly the same thing apart from the prompt.
+
+* exact: the normalized prompt (NFKC, casefolded, whitespace collapsed)
+  within the context. Entries are kept in process, or in Redis with
+  RESPONSE_CACHE_BACKEND=redis so that every replica shares them.
+* semantic: on an exact miss the prompt is embedded (Ollama,
+  RESPONSE_CACHE_EMBED_MODEL) and compared with the earlier prompts of the
+  same context held in this worker; a cosine similarity of at least
+  ``similarity`` reuses that answer.
+
+``policy`` decides per agent_config whether a turn may use the cache: it has
+to opt in with ``response_cache`` and be sampled at a temperature no higher
+than the allowed maximum, so only (near-)deterministic answers are reused.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+from api.core.config import settings
+from api.services.kv_slots import kv_slots
+from api.services.redis_client import RedisClient, redis_client
+
+try:
+    import numpy  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("exact", "semantic")
+_CONFIG_KEYS = ("response_cache", "response_cache_max_temperature")  # cache settings, not part of the context
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", prompt)).strip().casefold()
+
+
+def policy(agent_config: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The tier a turn with this agent_config may use, or None when it must not be cached."""
+    agent_config = agent_config or {}
+    tier = agent_config.get("response_cache")
+    if tier not in TIERS:
+        return None
+    temperature = float(agent_config.get("temperature", settings.LLM_TEMPERATURE))
+    max_temperature = float(agent_config.get("response_cache_max_temperature", settings.RESPONSE_CACHE_MAX_TEMPERATURE))
+    return tier if temperature <= max_temperature else None
+
+
+def context_key(agent_config: Optional[Dict[str, Any]], history: Sequence[Any], context_messages: Sequence[Any]) -> str:
+    """Hash of everything besides the prompt that the answer depends on."""
+    from api.logic.tools import WEB_SEARCH_SYSTEM_PROMPT
+
+    agent_config = {k: v for k, v in (agent_config or {}).items() if k not in _CONFIG_KEYS}
+    context = {
+        # The model actually served; agent_config's is only a request
+        "model": kv_slots.served_model(agent_config.pop("model", None)),
+        "temperature": agent_config.get("temperature", settings.LLM_TEMPERATURE),
+        "system": WEB_SEARCH_SYSTEM_PROMPT,
+        "agent_config": agent_config,
+        "memories": [getattr(m, "content", m) for m in context_messages],
+        "history": list(history),
+    }
+    return hashlib.sha256(orjson.dumps(context, default=str, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _unit(vector: Sequence[float]):
+    if numpy is not None:
+        array = numpy.asarray(vector, dtype=numpy.float32)
+        norm = float(numpy.linalg.norm(array))
+        return array / norm if norm else array
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+def _cosine(a, b) -> float:
+    if numpy is not None:
+        return float(numpy.dot(a, b))
+    return sum(x * y for x, y in zip(a, b))
+
+
+async def _ollama_embed(text: str) -> List[float]:
+    from langchain_ollama import OllamaEmbeddings
+
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = OllamaEmbeddings(model=settings.RESPONSE_CACHE_EMBED_MODEL, base_url=settings.OLLAMA_URL)
+    return await _embeddings.aembed_query(text)
+
+_embeddings = None
+
+
+class CacheLookup:
+    """Outcome of one lookup; ``entry`` is set on a hit."""
+
+    __slots__ = ("tier", "context", "prompt", "entry", "hit", "embedding", "started")
+
+    def __init__(self, tier: str, context: str, prompt: str):
+        self.tier = tier
+        self.context = context
+        self.prompt = prompt
+        self.entry: Optional[Dict[str, Any]] = None
+        self.hit: Optional[str] = None  # tier that answered
+        self.embedding = None
+        self.started = time.perf_counter()
+
+
+class ResponseCache:
+    """Exact and semantic tiers of cached answers, with hit and saved-time counters."""
+
+    def __init__(
+        self,
+        redis: Optional[RedisClient] = None,
+        ttl_seconds: int = settings.RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+        similarity: float = settings.RESPONSE_CACHE_SIMILARITY,
+        embed: Callable[[str], Awaitable[List[float]]] = _ollama_embed,
+        embed_timeout_seconds: float = settings.RESPONSE_CACHE_EMBED_TIMEOUT_SECONDS,
+    ):
+        self.redis = redis  # exact tier in Redis when set
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.embed = embed
+        self.embed_timeout_seconds = embed_timeout_seconds
+        self._exact: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # context -> [(unit embedding, expires_at, entry)] of this worker, contexts in LRU order
+        self._semantic: "OrderedDict[str, List[Tuple[Any, float, Dict[str, Any]]]]" = OrderedDict()
+        self._semantic_count = 0
+        self.counters = {"lookups": 0, "exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _exact_key(context: str, prompt: str) -> str:
+        return "respcache:" + hashlib.sha256(f"{context}\n{normalize_prompt(prompt)}".encode()).hexdigest()
+
+    async def _get_exact(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.redis is not None:
+            return await self.redis.get(key)
+        item = self._exact.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._exact[key]
+            return None
+        self._exact.move_to_end(key)
+        return item[1]
+
+    async def _set_exact(self, key: str, entry: Dict[str, Any]):
+        if self.redis is not None:
+            await self.redis.set(key, entry, ttl_seconds=self.ttl_seconds)
+            return
+        self._exact[key] = (time.monotonic() + self.ttl_seconds, entry)
+        self._exact.move_to_end(key)
+        while len(self._exact) > self.max_entries:
+            self._exact.popitem(last=False)
+
+    async def _embed(self, prompt: str):
+        try:
+            vector = await asyncio.wait_for(self.embed(normalize_prompt(prompt)), self.embed_timeout_seconds)
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"Response cache: embedding the prompt failed, semantic tier skipped ({e})")
+            return None
+        return _unit(vector)
+
+    def _nearest(self, context: str, embedding) -> Optional[Dict[str, Any]]:
+        entries = self._semantic.get(context)
+        if not entries:
+            return None
+        now = time.monotonic()
+        best, best_score = None, self.similarity
+        for vector, expires_at, entry in entries:
+            if expires_at > now:
+                score = _cosine(vector, embedding)
+                if score >= best_score:
+                    best, best_score = entry, score
+        if best is not None:
+            self._semantic.move_to_end(context)
+        return best
+
+    def _remember(self, context: str, embedding, entry: Dict[str, Any]):
+        entries = self._semantic.setdefault(context, [])
+        now = time.monotonic()
+        live = [e for e in entries if e[1] > now]
+        self._semantic_count -= len(entries) - len(live)
+        live.append((embedding, now + self.ttl_seconds, entry))
+        self._semantic[context] = live
+        self._semantic.move_to_end(context)
+        self._semantic_count += 1
+        while self._semantic_count > self.max_entries and self._semantic:
+            _, dropped = self._semantic.popitem(last=False)
+            self._semantic_count -= len(dropped)
+
+    async def lookup(self, tier: str, context: str, prompt: str) -> CacheLookup:
+        lookup = CacheLookup(tier, context, prompt)
+        self.counters["lookups"] += 1
+        lookup.entry = await self._get_exact(self._exact_key(context, prompt))
+        if lookup.entry is not None:
+            lookup.hit = "exact"
+        elif tier == "semantic":
+            lookup.embedding = await self._embed(prompt)
+            if lookup.embedding is not None:
+                lookup.entry = self._nearest(context, lookup.embedding)
+                lookup.hit = "semantic" if lookup.entry is not None else None
+        if lookup.hit:
+            self.counters[f"{lookup.hit}_hits"] += 1
+            elapsed = time.perf_counter() - lookup.started
+            self.saved_seconds += max(0.0, float(lookup.entry.get("thinking_time") or 0.0) - elapsed)
+            logger.info(f"Response cache {lookup.hit} hit ({elapsed * 1000:.1f} ms)")
+        else:
+            self.counters["misses"] += 1
+        return lookup
+
+    async def store(self, lookup: CacheLookup, entry: Dict[str, Any]):
+        """Cache the answer generated after a missed ``lookup``."""
+        entry = {**entry, "prompt": lookup.prompt, "cached_at": time.time()}
+        await self._set_exact(self._exact_key(lookup.context, lookup.prompt), entry)
+        if lookup.tier == "semantic" and lookup.embedding is not None:
+            self._remember(lookup.context, lookup.embedding, entry)
+        self.counters["stores"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+        return {
+            "backend": "redis" if self.redis is not None else "memory",
+            "entries": len(self._exact) if self.redis is None else None,
+            "semantic_entries": self._semantic_count,
+            "hit_rate": round(hits / self.counters["lookups"], 4) if self.counters["lookups"] else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            **self.counters,
+        }
+
+
+def _create_response_cache():
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        return ResponseCache(redis=redis_client)
+    if settings.RESPONSE_CACHE_BACKEND != "memory":
+        logger.warning(f"Unknown RESPONSE_CACHE_BACKEND '{settings.RESPONSE_CACHE_BACKEND}', caching in process.")
+    return ResponseCache()
+
+response_cache = _create_response_cache()
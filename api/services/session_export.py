@@ -0,0 +1,253 @@
+"""Session export from checkpoints, streamed instead of built in memory.
+
+A session export is a header record (session metadata), one record per
+message of the session's latest checkpoint, then one record per turn of the
+session's recent history. Messages are read from the checkpointer in
+batches (``aiter_messages``), so only one batch of a long conversation is
+in memory at a time, whether the records are streamed as NDJSON or written
+to a Parquet file under ``EXPORT_DIR``.
+
+``history_page`` reads the same batches to page through a conversation's
+turns for chat clients, from the latest page back, each page oldest first,
+keeping only one page in memory.
+"""
+import asyncio
+import logging
+import pathlib
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+
+from api.core.config import settings
+from api.logic.turns import is_memory_message
+from api.services.session_manager import session_manager
+
+try:
+    import pyarrow  # type: ignore
+    import pyarrow.parquet  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "parquet")
+
+# Parquet string columns of message and turn records (plus "index"); the header goes into the file metadata
+_COLUMNS = ("record", "role", "content", "name", "tool_call_id", "tool_calls", "message_id", "user", "ai")
+
+
+def message_record(index: int, message: Any) -> Dict[str, Any]:
+    """Flat, JSON-ready record of one LangChain message."""
+    return {
+        "record": "message",
+        "index": index,
+        "role": getattr(message, "type", None),
+        "content": getattr(message, "content", message),
+        "name": getattr(message, "name", None),
+        "tool_call_id": getattr(message, "tool_call_id", None),
+        "tool_calls": getattr(message, "tool_calls", None) or None,
+        "message_id": getattr(message, "id", None),
+    }
+
+
+def header_record(session_id: uuid.UUID, session: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    session = session or {}
+    return {
+        "record": "session",
+        "session_id": str(session_id),
+        "user_id": session.get("user_id"),
+        "mode": session.get("mode"),
+        "created_at": session.get("created_at"),
+        "last_activity": session.get("last_activity"),
+        "message_count": session.get("message_count"),
+        "exported_at": time.time(),
+    }
+
+
+async def iter_messages(checkpointer, thread_id: str, batch_size: int) -> AsyncIterator[List[Any]]:
+    """Message batches of the thread's latest checkpoint."""
+    if checkpointer is None:
+        return
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    if hasattr(checkpointer, "aiter_messages"):
+        async for batch in checkpointer.aiter_messages(config, batch_size):
+            yield batch
+        return
+    # Other savers: the checkpoint is loaded whole, but records are still emitted in batches
+    item = await checkpointer.aget_tuple(config)
+    messages = (item.checkpoint.get("channel_values", {}).get("messages") or []) if item else []
+    for start in range(0, len(messages), batch_size):
+        yield messages[start:start + batch_size]
+
+
+async def iter_session_records(
+    session_id: uuid.UUID,
+    session: Optional[Dict[str, Any]],
+    checkpointer,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Export records of one session, in batches: header, messages, then history turns."""
+    yield [header_record(session_id, session)]
+    index = 0
+    async for batch in iter_messages(checkpointer, str(session_id), batch_size):
+        yield [message_record(index + offset, message) for offset, message in enumerate(batch)]
+        index += len(batch)
+    history = await session_manager.get_history(session_id) if session else []
+    for start in range(0, len(history), batch_size):
+        yield [
+            {"record": "turn", "index": start + offset, "user": turn.get("user"), "ai": turn.get("ai")}
+            for offset, turn in enumerate(history[start:start + batch_size])
+        ]
+
+
+async def _iter_turns(checkpointer, thread_id: str, batch_size: int) -> AsyncIterator[Dict[str, Any]]:
+    """Turns of a conversation: a user message and the last tool-free AI answer after it.
+
+    Recalled memories injected ahead of a user message are not turns.
+    """
+    turn = None
+    async for batch in iter_messages(checkpointer, thread_id, batch_size):
+        for message in batch:
+            kind = getattr(message, "type", None)
+            if is_memory_message(message):
+                continue
+            if kind == "human":
+                if turn is not None:
+                    yield turn
+                turn = {"user": message.content, "ai": ""}
+            elif kind == "ai" and turn is not None and message.content and not getattr(message, "tool_calls", None):
+                turn["ai"] = message.content
+    if turn is not None:
+        yield turn
+
+
+async def _aiter(items: Iterable[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def history_page(
+    session_id: uuid.UUID,
+    checkpointer,
+    before: Optional[int] = None,
+    limit: int = 20,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Up to ``limit`` turns preceding turn ``before`` (the latest ones when None), oldest first, and the turn total.
+
+    Without a checkpointer only the session's recent history is available.
+    """
+    if checkpointer is None:
+        turns = _aiter(await session_manager.get_history(session_id))
+    else:
+        turns = _iter_turns(checkpointer, str(session_id), batch_size)
+    page: deque = deque(maxlen=limit)
+    total = 0
+    async for turn in turns:
+        if before is None or total < before:
+            page.append({"index": total, "user": turn.get("user"), "ai": turn.get("ai")})
+        total += 1
+    return list(page), total
+
+
+def encode_ndjson(records: Iterable[Dict[str, Any]]) -> bytes:
+    return b"".join(orjson.dumps(record, default=str, option=orjson.OPT_APPEND_NEWLINE) for record in records)
+
+
+async def stream_ndjson(session_id: uuid.UUID, session: Optional[Dict[str, Any]], checkpointer) -> AsyncIterator[bytes]:
+    """NDJSON body of a session export, one chunk per record batch."""
+    async for batch in iter_session_records(session_id, session, checkpointer):
+        yield encode_ndjson(batch)
+
+
+def _column_value(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return orjson.dumps(value, default=str).decode()
+
+
+def _arrow_batch(records: List[Dict[str, Any]]):
+    return pyarrow.record_batch(
+        [pyarrow.array([record["index"] for record in records], pyarrow.int64())]
+        + [pyarrow.array([_column_value(record.get(column)) for record in records], pyarrow.string())
+           for column in _COLUMNS],
+        names=["index", *_COLUMNS],
+    )
+
+
+async def write_export(
+    session_id: uuid.UUID,
+    session: Optional[Dict[str, Any]],
+    checkpointer,
+    fmt: str = "ndjson",
+    export_dir: str = settings.EXPORT_DIR,
+) -> Dict[str, Any]:
+    """Write one session export to ``export_dir``; returns its path and record count."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    if fmt == "parquet" and pyarrow is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    directory = pathlib.Path(export_dir)
+    await asyncio.to_thread(directory.mkdir, parents=True, exist_ok=True)
+    path = directory / f"{session_id}.{fmt}"
+    # Written under a temporary name so readers never see a partial export
+    partial = path.with_suffix(f".{fmt}.partial")
+    records = 0
+    try:
+        if fmt == "ndjson":
+            with open(partial, "wb") as out:
+                async for batch in iter_session_records(session_id, session, checkpointer):
+                    await asyncio.to_thread(out.write, encode_ndjson(batch))
+                    records += len(batch)
+        else:
+            batches = iter_session_records(session_id, session, checkpointer)
+            header = (await batches.__anext__())[0]
+            schema = _arrow_batch([]).schema.with_metadata({"session": orjson.dumps(header, default=str)})
+            writer = await asyncio.to_thread(pyarrow.parquet.ParquetWriter, partial, schema, compression="zstd")
+            try:
+                async for batch in batches:
+                    await asyncio.to_thread(writer.write_batch, _arrow_batch(batch))
+                    records += len(batch)
+            finally:
+                await asyncio.to_thread(writer.close)
+        await asyncio.to_thread(partial.replace, path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    logger.info(f"Exported session {session_id} ({records} records) to {path}")
+    return {"session_id": str(session_id), "format": fmt, "path": str(path), "records": records}
+
+
+async def bulk_export(
+    session_ids: List[uuid.UUID],
+    checkpointer,
+    fmt: str = "ndjson",
+    concurrency: int = settings.EXPORT_MAX_CONCURRENCY,
+    export_dir: str = settings.EXPORT_DIR,
+) -> List[Dict[str, Any]]:
+    """Export many sessions to files, at most ``concurrency`` at a time.
+
+    Sessions whose metadata has expired are still exported from their
+    checkpoints; ones with neither are reported as not found. A failed
+    session is reported in its result instead of failing the whole run.
+    """
+    gate = asyncio.Semaphore(max(1, concurrency))
+
+    async def export_one(session_id: uuid.UUID) -> Dict[str, Any]:
+        async with gate:
+            try:
+                session = await session_manager.get_session(session_id)
+                if session is None and (checkpointer is None or await checkpointer.aget_tuple(
+                    {"configurable": {"thread_id": str(session_id), "checkpoint_ns": ""}}
+                ) is None):
+                    return {"session_id": str(session_id), "format": fmt, "status": "not_found",
+                            "error": "Session not found"}
+                return await write_export(session_id, session, checkpointer, fmt, export_dir)
+            except Exception as e:
+                logger.error(f"Export of session {session_id} failed: {e}", exc_info=True)
+                return {"session_id": str(session_id), "format": fmt, "error": str(e)}
+
+    return list(await asyncio.gather(*(export_one(session_id) for session_id in session_ids)))
@@ -1,29 +1,445 @@
+import asyncio
+import logging
+import sys
+import time
 import uuid
-from typing import Dict, Any
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Tuple
+from api.core.config import settings
+from api.services.redis_client import RedisClient, redis_client
+
+logger = logging.getLogger(__name__)
+
+
+def _new_session(session_id: uuid.UUID, user_id: str, mode: str, agent_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    now = int(time.time())
+    return {
+        "user_id": user_id,
+        "mode": mode,
+        "agent_config": agent_config or {},
+        # Each session has its own graph thread
+        "graph_config": {"configurable": {"thread_id": str(session_id)}},
+        "created_at": now,
+        "last_activity": now,
+        "message_count": 0,
+    }
+
+
+def _approx_bytes(value: Any) -> int:
+    """Rough deep size of plain data (str/bytes/numbers/dicts/lists/tuples)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approx_bytes(k) + _approx_bytes(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, deque)):
+        size += sum(_approx_bytes(v) for v in value)
+    return size
+
+
+class _SessionRecord:
+    """Compact in-memory session. Turns are kept as (user, ai) tuples in a bounded ring buffer."""
+
+    __slots__ = (
+        "user_id", "mode", "agent_config", "created_at", "last_activity",
+        "touched_at", "message_count", "history", "extra", "nbytes",
+    )
+
+    def __init__(self, user_id: str, mode: str, agent_config: Dict[str, Any], history_turns: int):
+        now = time.time()
+        self.user_id = user_id
+        self.mode = mode
+        self.agent_config = agent_config
+        self.created_at = int(now)
+        self.last_activity = int(now)
+        self.touched_at = time.monotonic()
+        self.message_count = 0
+        self.history: deque = deque(maxlen=history_turns)
+        self.extra: Optional[Dict[str, Any]] = None
+        self.nbytes = 0
+
+    def touch(self):
+        self.last_activity = int(time.time())
+        self.touched_at = time.monotonic()
+
+    def to_dict(self, session_id: uuid.UUID) -> Dict[str, Any]:
+        session = {
+            "user_id": self.user_id,
+            "mode": self.mode,
+            "agent_config": self.agent_config,
+            # Derived on read instead of stored per session
+            "graph_config": {"configurable": {"thread_id": str(session_id)}},
+            "created_at": self.created_at,
+            "last_activity": self.last_activity,
+            "message_count": self.message_count,
+        }
+        if self.extra:
+            session.update(self.extra)
+        return session
+
 
 class SessionManager:
-    def __init__(self):
-        self.sessions: Dict[uuid.UUID, Dict[str, Any]] = {}
+    """In-process session store (single worker only).
+
+    ``get_session`` returns the session's metadata; the turn history is read
+    separately with ``get_history`` and only the last ``history_turns`` turns
+    are kept (the checkpointer holds the full conversation). Sessions idle for
+    longer than ``ttl_seconds`` expire, and the least recently used ones are
+    evicted once ``max_sessions`` or ``max_bytes`` is exceeded. ``start_sweeper``
+    runs the eviction periodically in the background.
+    """
+
+    _SLOT_FIELDS = ("user_id", "mode", "agent_config", "created_at", "last_activity", "message_count")
 
-    def create_session(self, user_id: str, mode: str) -> uuid.UUID:
+    def __init__(
+        self,
+        ttl_seconds: int = settings.SESSION_TTL_SECONDS,
+        history_turns: int = settings.SESSION_HISTORY_TURNS,
+        max_sessions: int = settings.SESSION_MAX_COUNT,
+        max_bytes: int = settings.SESSION_MAX_BYTES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.history_turns = history_turns
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # Ordered least -> most recently used
+        self.sessions: "OrderedDict[uuid.UUID, _SessionRecord]" = OrderedDict()
+        self.total_bytes = 0
+        self.expired_count = 0
+        self.evicted_count = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _resize(self, record: _SessionRecord, nbytes: int):
+        self.total_bytes += nbytes - record.nbytes
+        record.nbytes = nbytes
+
+    def _record_size(self, record: _SessionRecord) -> int:
+        size = sys.getsizeof(record) + _approx_bytes(record.user_id) + _approx_bytes(record.mode)
+        size += _approx_bytes(record.agent_config) + _approx_bytes(record.history)
+        if record.extra:
+            size += _approx_bytes(record.extra)
+        return size
+
+    def _drop(self, session_id: uuid.UUID):
+        record = self.sessions.pop(session_id, None)
+        if record is not None:
+            self.total_bytes -= record.nbytes
+
+    def _live(self, session_id: uuid.UUID) -> _SessionRecord | None:
+        record = self.sessions.get(session_id)
+        if record is None:
+            return None
+        if time.monotonic() - record.touched_at > self.ttl_seconds:
+            self._drop(session_id)
+            self.expired_count += 1
+            return None
+        self.sessions.move_to_end(session_id)
+        return record
+
+    def evict(self) -> int:
+        """Drop idle-expired sessions, then LRU sessions until under the count and memory caps."""
+        removed = 0
+        cutoff = time.monotonic() - self.ttl_seconds
+        for session_id in [sid for sid, r in self.sessions.items() if r.touched_at < cutoff]:
+            self._drop(session_id)
+            self.expired_count += 1
+            removed += 1
+        while self.sessions and (len(self.sessions) > self.max_sessions or self.total_bytes > self.max_bytes):
+            session_id, record = self.sessions.popitem(last=False)
+            self.total_bytes -= record.nbytes
+            self.evicted_count += 1
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} session(s); {len(self.sessions)} live, ~{self.total_bytes} bytes")
+        return removed
+
+    async def create_session(self, user_id: str, mode: str, agent_config: Optional[Dict[str, Any]] = None) -> uuid.UUID:
         session_id = uuid.uuid4()
-        self.sessions[session_id] = {
-            "user_id": user_id,
-            "mode": mode,
-            "history": []
-        }
+        record = _SessionRecord(user_id, mode, agent_config or {}, self.history_turns)
+        self.sessions[session_id] = record
+        self._resize(record, self._record_size(record))
+        if len(self.sessions) > self.max_sessions or self.total_bytes > self.max_bytes:
+            self.evict()
         return session_id
 
-    def get_session(self, session_id: uuid.UUID) -> Dict[str, Any] | None:
-        return self.sessions.get(session_id)
+    async def fork_session(self, session_id: uuid.UUID, copy_history: bool = True, **fields) -> uuid.UUID | None:
+        """New session with the metadata of ``session_id`` (and its recent turns with ``copy_history``)."""
+        source = self._live(session_id)
+        if source is None:
+            return None
+        fork_id = uuid.uuid4()
+        record = _SessionRecord(source.user_id, source.mode, source.agent_config, self.history_turns)
+        if copy_history:
+            record.history.extend(source.history)
+            record.message_count = source.message_count
+        record.extra = {**(source.extra or {}), **fields} or None
+        self.sessions[fork_id] = record
+        self._resize(record, self._record_size(record))
+        if len(self.sessions) > self.max_sessions or self.total_bytes > self.max_bytes:
+            self.evict()
+        return fork_id
 
-    def update_session(self, session_id: uuid.UUID, updates: Dict[str, Any]):
+    async def get_session(self, session_id: uuid.UUID) -> Dict[str, Any] | None:
+        record = self._live(session_id)
+        return record.to_dict(session_id) if record else None
+
+    async def update_session(self, session_id: uuid.UUID, updates: Dict[str, Any]):
         """Update session data with the provided updates."""
-        if session := self.get_session(session_id):
-            session.update(updates)
+        if record := self._live(session_id):
+            for field, value in updates.items():
+                if field in self._SLOT_FIELDS:
+                    setattr(record, field, value)
+                elif field != "graph_config":
+                    record.extra = {**(record.extra or {}), field: value}
+            record.touch()
+            self._resize(record, self._record_size(record))
+
+    async def update_history(self, session_id: uuid.UUID, user_message: str, ai_message: str):
+        """Append one turn (dropping the oldest beyond ``history_turns``) and bump message_count / last_activity."""
+        if record := self._live(session_id):
+            turn = (user_message, ai_message)
+            delta = _approx_bytes(turn)
+            if len(record.history) == record.history.maxlen:
+                delta -= _approx_bytes(record.history[0])
+            record.history.append(turn)
+            record.message_count += 1
+            record.touch()
+            self._resize(record, record.nbytes + delta)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    async def get_history(self, session_id: uuid.UUID) -> List[Dict[str, str]]:
+        record = self._live(session_id)
+        return [{"user": user, "ai": ai} for user, ai in record.history] if record else []
+
+    async def delete_session(self, session_id: uuid.UUID):
+        self._drop(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "live_sessions": len(self.sessions),
+            "approx_bytes": self.total_bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "expired": self.expired_count,
+            "evicted": self.evicted_count,
+        }
+
+    async def _sweep_forever(self, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                self.evict()
+            except Exception as e:
+                logger.error(f"Session sweeper failed: {e}", exc_info=True)
+
+    def start_sweeper(self, interval_seconds: float = settings.SESSION_SWEEP_INTERVAL_SECONDS):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_forever(interval_seconds))
+
+    async def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+
+class RedisSessionManager:
+    """Session store shared by every API worker and replica through Redis.
+
+    Metadata lives in the hash ``session:{id}`` and the turns in the list
+    ``session:{id}:history`` (trimmed to the last ``history_turns``). Every
+    write renews both keys' TTL, so sessions expire after ``ttl_seconds`` of
+    inactivity. Reads go through a small per-worker near-cache whose entries
+    live ``near_cache_seconds``.
+    """
+
+    # Both scripts only touch sessions that still exist, so a late write can't
+    # resurrect an expired session as a partial record.
+    _UPDATE_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+        redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+        redis.call('EXPIRE', KEYS[2], ARGV[1])
+        return 1
+    """
+    _APPEND_SCRIPT = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+        redis.call('RPUSH', KEYS[2], ARGV[2])
+        redis.call('LTRIM', KEYS[2], -tonumber(ARGV[4]), -1)
+        redis.call('HINCRBY', KEYS[1], 'message_count', 1)
+        redis.call('HSET', KEYS[1], 'last_activity', ARGV[3])
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+        redis.call('EXPIRE', KEYS[2], ARGV[1])
+        return 1
+    """
+
+    _INT_FIELDS = ("created_at", "last_activity", "message_count")
+    _ENCODED_FIELDS = ("agent_config", "graph_config")
+
+    def __init__(
+        self,
+        redis: RedisClient = redis_client,
+        ttl_seconds: int = settings.SESSION_TTL_SECONDS,
+        history_turns: int = settings.SESSION_HISTORY_TURNS,
+        near_cache_seconds: float = settings.SESSION_NEAR_CACHE_SECONDS,
+        near_cache_size: int = 1024,
+    ):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.history_turns = history_turns
+        self.near_cache_seconds = near_cache_seconds
+        self.near_cache_size = near_cache_size
+        self._near_cache: "OrderedDict[uuid.UUID, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._update = redis.client.register_script(self._UPDATE_SCRIPT) if redis.client else None
+        self._append = redis.client.register_script(self._APPEND_SCRIPT) if redis.client else None
+
+    @staticmethod
+    def _key(session_id: uuid.UUID) -> str:
+        return f"session:{session_id}"
+
+    @staticmethod
+    def _history_key(session_id: uuid.UUID) -> str:
+        return f"session:{session_id}:history"
+
+    def _encode_fields(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        encoded = {}
+        for field, value in data.items():
+            if field in self._ENCODED_FIELDS or isinstance(value, (dict, list)):
+                encoded[field] = self.redis.encode(value)
+            else:
+                encoded[field] = value
+        return encoded
+
+    def _decode_fields(self, raw: Dict[bytes, bytes]) -> Dict[str, Any]:
+        session = {}
+        for field, value in raw.items():
+            field = field.decode()
+            if field in self._ENCODED_FIELDS or self.redis.is_encoded(value):
+                session[field] = self.redis.decode(value)
+            elif field in self._INT_FIELDS:
+                session[field] = int(value)
+            else:
+                session[field] = value.decode()
+        return session
+
+    def _cache_put(self, session_id: uuid.UUID, session: Dict[str, Any]):
+        if self.near_cache_seconds <= 0:
+            return
+        self._near_cache[session_id] = (time.monotonic() + self.near_cache_seconds, session)
+        self._near_cache.move_to_end(session_id)
+        while len(self._near_cache) > self.near_cache_size:
+            self._near_cache.popitem(last=False)
+
+    def _cache_get(self, session_id: uuid.UUID) -> Dict[str, Any] | None:
+        entry = self._near_cache.get(session_id)
+        if entry is None:
+            return None
+        expires_at, session = entry
+        if time.monotonic() >= expires_at:
+            del self._near_cache[session_id]
+            return None
+        return dict(session)
+
+    async def create_session(self, user_id: str, mode: str, agent_config: Optional[Dict[str, Any]] = None) -> uuid.UUID:
+        session_id = uuid.uuid4()
+        session = _new_session(session_id, user_id, mode, agent_config)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(session_id), mapping=self._encode_fields(session))
+            pipe.expire(self._key(session_id), self.ttl_seconds)
+        self._cache_put(session_id, session)
+        return session_id
+
+    async def fork_session(self, session_id: uuid.UUID, copy_history: bool = True, **fields) -> uuid.UUID | None:
+        """New session with the metadata of ``session_id`` (and its recent turns with ``copy_history``)."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._key(session_id))
+            pipe.lrange(self._history_key(session_id), 0, -1)
+        raw, history = pipe.results
+        if not raw:
+            return None
+        source = self._decode_fields(raw)
+        fork_id = uuid.uuid4()
+        session = {
+            **source,
+            **_new_session(fork_id, source["user_id"], source["mode"], source.get("agent_config")),
+            **fields,
+        }
+        if copy_history:
+            session["message_count"] = source.get("message_count", 0)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(fork_id), mapping=self._encode_fields(session))
+            pipe.expire(self._key(fork_id), self.ttl_seconds)
+            if copy_history and history:
+                pipe.rpush(self._history_key(fork_id), *history)
+                pipe.expire(self._history_key(fork_id), self.ttl_seconds)
+        self._cache_put(fork_id, session)
+        return fork_id
+
+    async def get_session(self, session_id: uuid.UUID) -> Dict[str, Any] | None:
+        cached = self._cache_get(session_id)
+        if cached is not None:
+            return cached
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(self._key(session_id))
+            pipe.expire(self._key(session_id), self.ttl_seconds)
+            pipe.expire(self._history_key(session_id), self.ttl_seconds)
+        raw = pipe.results[0]
+        if not raw:
+            return None
+        session = self._decode_fields(raw)
+        self._cache_put(session_id, session)
+        return dict(session)
+
+    async def update_session(self, session_id: uuid.UUID, updates: Dict[str, Any]):
+        """Update session data with the provided updates (no-op for unknown sessions)."""
+        fields = self._encode_fields({**updates, "last_activity": int(time.time())})
+        args = [self.ttl_seconds]
+        for field, value in fields.items():
+            args.extend((field, value))
+        await self._update(keys=[self._key(session_id), self._history_key(session_id)], args=args)
+        self._near_cache.pop(session_id, None)
+
+    async def update_history(self, session_id: uuid.UUID, user_message: str, ai_message: str):
+        """Atomically append one turn (trimming old ones), bump message_count and renew the TTL."""
+        await self._append(
+            keys=[self._key(session_id), self._history_key(session_id)],
+            args=[
+                self.ttl_seconds,
+                self.redis.encode({"user": user_message, "ai": ai_message}),
+                int(time.time()),
+                self.history_turns,
+            ],
+        )
+        self._near_cache.pop(session_id, None)
+
+    async def get_history(self, session_id: uuid.UUID) -> List[Dict[str, str]]:
+        items = await self.redis.client.lrange(self._history_key(session_id), 0, -1)
+        return [self.redis.decode(item) for item in items]
+
+    async def delete_session(self, session_id: uuid.UUID):
+        await self.redis.delete(self._key(session_id), self._history_key(session_id))
+        self._near_cache.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        # Expiry is Redis' job; only the worker-local near-cache is reported here
+        return {"backend": "redis", "near_cache_entries": len(self._near_cache)}
+
+    def start_sweeper(self, interval_seconds: float = settings.SESSION_SWEEP_INTERVAL_SECONDS):
+        pass  # Redis expires idle sessions itself
+
+    async def stop_sweeper(self):
+        pass
+
 
-    def update_history(self, session_id: uuid.UUID, user_message: str, ai_message: str):
-        if session := self.get_session(session_id):
-            session["history"].append({"user": user_message, "ai": ai_message})
+def _create_session_manager():
+    if settings.SESSION_BACKEND == "redis":
+        logger.info("Using Redis-backed session store.")
+        return RedisSessionManager()
+    if settings.SESSION_BACKEND != "memory":
+        logger.warning(f"Unknown SESSION_BACKEND '{settings.SESSION_BACKEND}', using in-memory sessions.")
+    return SessionManager()
 
-session_manager = SessionManager()
+session_manager = _create_session_manager()
@@ -0,0 +1,213 @@
+"""Server-sent events for streamed turns: framing, coalescing, heartbeats, resume.
+
+Every event is one SSE frame: ``id: <stream>:<seq>``, ``event: <type>`` and a
+JSON ``data:`` line, so newlines in model output never break the framing.
+An ``EventStream`` buffers the frames of one turn. The turn runs as its own
+task and appends to the buffer, merging consecutive tokens until
+``coalesce_chars`` characters or ``coalesce_seconds`` have built up, so a
+client gets one write per flush instead of one per token. Readers get every
+frame after their last event id, plus a keep-alive comment every
+``heartbeat_seconds`` while nothing happens (e.g. during a long tool call).
+A client that drops can reconnect with ``Last-Event-ID`` until the buffer
+expires, ``resume_ttl_seconds`` after the turn ends. Buffers live in the
+worker that ran the turn.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import orjson
+
+from api.core.config import settings
+from api.logic.turn_events import TOKEN
+
+logger = logging.getLogger(__name__)
+
+KEEP_ALIVE = b": keep-alive\n\n"
+
+
+class StreamGone(Exception):
+    """The requested events were already dropped from the stream's buffer."""
+
+
+def encode_event(event_id: str, event: Dict[str, Any]) -> bytes:
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+        event_id.encode(), str(event.get("type", "message")).encode(), orjson.dumps(event, default=str)
+    )
+
+
+def parse_event_id(event_id: str) -> Tuple[str, int]:
+    """``"<stream>:<seq>"`` -> (stream id, seq); ValueError when malformed."""
+    stream_id, _, seq = event_id.strip().rpartition(":")
+    if not stream_id:
+        raise ValueError(f"Malformed event id '{event_id}'")
+    return stream_id, int(seq)
+
+
+async def coalesce_tokens(
+    events: AsyncIterator[Dict[str, Any]],
+    chars: int = settings.SSE_COALESCE_CHARS,
+    seconds: float = settings.SSE_COALESCE_SECONDS,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Merge consecutive token events until ``chars`` characters or ``seconds`` have built up.
+
+    The first token after a pause is passed on at once. Other events flush
+    the pending text and pass through unchanged; an error raised by
+    ``events`` is raised after the text that came before it.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def read():
+        try:
+            async for event in events:
+                queue.put_nowait(event)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(None)
+
+    loop = asyncio.get_running_loop()
+    pending: List[str] = []
+    pending_chars, flush_at, last_flush = 0, None, float("-inf")
+
+    def take() -> Optional[Dict[str, Any]]:
+        nonlocal pending, pending_chars, flush_at, last_flush
+        merged = {"type": TOKEN, "content": "".join(pending)} if pending else None
+        if merged:
+            last_flush = loop.time()
+        pending, pending_chars, flush_at = [], 0, None
+        return merged
+
+    reader = asyncio.create_task(read())
+    try:
+        while True:
+            try:
+                timeout = None if flush_at is None else max(0.0, flush_at - loop.time())
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                merged = take()
+                if merged:
+                    yield merged
+                continue
+            if isinstance(item, dict) and item.get("type") == TOKEN:
+                pending.append(item["content"])
+                pending_chars += len(item["content"])
+                if flush_at is None:
+                    flush_at = max(loop.time(), last_flush + seconds)
+                if pending_chars >= chars or flush_at <= loop.time():
+                    yield take()
+                continue
+            merged = take()
+            if merged:
+                yield merged
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        reader.cancel()
+
+
+class EventStream:
+    """Frame buffer of one streamed turn."""
+
+    def __init__(self, stream_id: str, owner: str, max_events: int, coalesce_chars: int, coalesce_seconds: float):
+        self.id = stream_id
+        self.owner = owner  # session the turn belongs to
+        self.coalesce_chars = coalesce_chars
+        self.coalesce_seconds = coalesce_seconds
+        self.frames: Deque[Tuple[int, bytes]] = deque(maxlen=max_events)
+        self.seq = 0
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, event: Dict[str, Any]):
+        self.seq += 1
+        self.frames.append((self.seq, encode_event(f"{self.id}:{self.seq}", event)))
+        self._notify()
+
+    def finish(self):
+        if not self.finished:
+            self.finished_at = time.monotonic()
+            self._notify()
+
+    async def run(self, events: AsyncIterator[Dict[str, Any]]):
+        """Append ``events`` to the buffer, coalescing tokens, then mark the stream finished."""
+        try:
+            async for event in coalesce_tokens(events, self.coalesce_chars, self.coalesce_seconds):
+                self.append(event)
+        except Exception as e:
+            logger.error(f"Event stream {self.id} failed: {e}", exc_info=True)
+        finally:
+            self.finish()
+
+    def frames_after(self, seq: int) -> List[Tuple[int, bytes]]:
+        if self.frames and self.frames[0][0] > seq + 1:
+            raise StreamGone(f"Events after {self.id}:{seq} are no longer buffered")
+        return [frame for frame in self.frames if frame[0] > seq]
+
+    async def follow(self, after: int = 0, heartbeat_seconds: float = settings.SSE_HEARTBEAT_SECONDS) -> AsyncIterator[bytes]:
+        """Frames after event ``after`` as they arrive, batched per write, with keep-alives while idle."""
+        while True:
+            changed = self._changed
+            frames = self.frames_after(after)
+            if frames:
+                after = frames[-1][0]
+                yield b"".join(frame for _, frame in frames)
+                continue
+            if self.finished:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield KEEP_ALIVE
+
+
+class EventStreams:
+    """Registry of the worker's event streams, kept for resume until they expire."""
+
+    def __init__(
+        self,
+        max_events: int = settings.SSE_BUFFER_MAX_EVENTS,
+        coalesce_chars: int = settings.SSE_COALESCE_CHARS,
+        coalesce_seconds: float = settings.SSE_COALESCE_SECONDS,
+        resume_ttl_seconds: float = settings.SSE_RESUME_TTL_SECONDS,
+    ):
+        self.max_events = max_events
+        self.coalesce_chars = coalesce_chars
+        self.coalesce_seconds = coalesce_seconds
+        self.resume_ttl_seconds = resume_ttl_seconds
+        self._streams: Dict[str, EventStream] = {}
+
+    def start(self, owner: str, events: AsyncIterator[Dict[str, Any]]) -> EventStream:
+        """Run ``events`` into a new stream; it keeps running if its client disconnects."""
+        self._expire()
+        stream = EventStream(uuid.uuid4().hex, owner, self.max_events, self.coalesce_chars, self.coalesce_seconds)
+        stream.task = asyncio.create_task(stream.run(events))
+        self._streams[stream.id] = stream
+        return stream
+
+    def get(self, stream_id: str) -> Optional[EventStream]:
+        self._expire()
+        return self._streams.get(stream_id)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.resume_ttl_seconds
+        for stream_id in [s.id for s in self._streams.values() if s.finished and s.finished_at <= cutoff]:
+            del self._streams[stream_id]
+
+
+sse_streams = EventStreams()
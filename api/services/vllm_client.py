@@ -1,17 +1,53 @@
 import httpx
 import logging
 import time
+from typing import Optional
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 from api.core.config import settings
+from api.core.deadline import stage_budget
+from api.services.circuit_breaker import CircuitOpenError, get_breaker, is_dependency_failure
+from api.services.kv_slots import kv_slots
+
+try:
+    from ollama import ResponseError as OllamaResponseError
+except ModuleNotFoundError:  # pragma: no cover
+    OllamaResponseError = None
 
 logger = logging.getLogger(__name__)
 
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Client errors (4xx) and exhausted request deadlines are the caller's; they don't count against the LLM breaker."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    if OllamaResponseError is not None and isinstance(exc, OllamaResponseError):
+        # ChatOllama's errors; status_code is -1 when Ollama gave none
+        return not 0 <= exc.status_code < 500
+    return is_dependency_failure(exc)
+
+
+llm_breaker = get_breaker("llm", is_failure=is_backend_failure)
+
 class OllamaClient:
     def __init__(self, base_url: str):
         self.base_url = base_url
         self.client = httpx.AsyncClient(base_url=self.base_url, timeout=300.0)
 
-    async def generate(self, prompt: str, max_tokens: int = 1024, temperature: float = 0.7, stream: bool = False):
+    async def _post(self, path: str, payload: dict) -> httpx.Response:
+        with stage_budget(settings.LLM_TIMEOUT_SECONDS, timeouts=(httpx.TimeoutException,)) as timeout:
+            response = await self.client.post(path, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response
+
+    async def generate(
+        self,
+        prompt: str,
+        max_tokens: int = 1024,
+        temperature: float = 0.7,
+        stream: bool = False,
+        session_id: Optional[str] = None,
+        prefix_session_id: Optional[str] = None,
+    ):
         # Ollama's OpenAI-compatible endpoint uses a 'messages' list
         messages = [{"role": "user", "content": prompt}]
         request_payload = {
@@ -22,9 +58,12 @@ class OllamaClient:
             "stream": stream,
         }
         try:
-            # Using the OpenAI-compatible chat completions endpoint
-            response = await self.client.post("/v1/chat/completions", json=request_payload)
-            response.raise_for_status()
+            # On llama-server, pin the session to the slot holding (or restored with) its KV cache
+            async with kv_slots.session_slot(session_id, prefix_session_id) as slot_id:
+                if slot_id is not None:
+                    request_payload.update(id_slot=slot_id, cache_prompt=True)
+                # Using the OpenAI-compatible chat completions endpoint
+                response = await llm_breaker.call(self._post, "/v1/chat/completions", request_payload)
 
             if stream:
                 raise NotImplementedError("Streaming not yet implemented")
@@ -35,6 +74,9 @@ class OllamaClient:
                     "tokens_used": data["usage"]["total_tokens"]
                 }
 
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping Ollama call: {e}")
+            return None
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error from Ollama: {e.response.status_code} - {e.response.text}")
             return None
@@ -43,20 +85,30 @@ class OllamaClient:
             return None
 
 @retry(
-    stop=stop_after_attempt(10),
-    wait=wait_fixed(3),
+    stop=stop_after_attempt(3),
+    wait=wait_fixed(1),
     retry=retry_if_exception_type(httpx.ConnectError),
     before_sleep=lambda retry_state: logger.info(f"Retrying Ollama connection, attempt {retry_state.attempt_number}...")
 )
 def get_ollama_client() -> OllamaClient:
+    # Fail fast (no retries) while the LLM breaker is open
+    if not llm_breaker.allow_request():
+        raise CircuitOpenError(llm_breaker.name, llm_breaker.retry_after())
     try:
         # A simple synchronous check to see if the server is up
         httpx.get(f"{settings.VLLM_URL}/api/tags")
+        llm_breaker.record_success()
         logger.info("Ollama server is up. Initializing client.")
         return OllamaClient(base_url=settings.VLLM_URL)
     except httpx.ConnectError as e:
+        llm_breaker.record_failure()
         logger.error(f"Ollama connection failed: {e}. Retrying...")
         raise
+    except Exception as e:
+        # Any other error still settles the call slot taken above (a half-open trial included)
+        llm_breaker.record_failure()
+        logger.error(f"Ollama health check failed: {e}")
+        raise
 
 # --- Lazy singleton with fallback -------------------------------------------------
 
@@ -1,7 +1,10 @@
+import asyncio
 import logging
 from duckduckgo_search import DDGS
 import httpx
 from api.core.config import settings
+from api.core.deadline import budget_allows, stage_budget
+from api.services.circuit_breaker import CircuitOpenError, get_breaker
 from api.services.redis_client import redis_client
 
 logger = logging.getLogger(__name__)
@@ -14,6 +17,9 @@ logger = logging.getLogger(__name__)
 class WebSearchService:
     def __init__(self):
         self.ddgs = DDGS()
+        # Register breakers up front so they show in the admin view before first use
+        for name in ("duckduckgo", "searxng", "brave"):
+            get_breaker(f"search.{name}")
 
     async def search(self, query: str, max_results: int = 5):
         cache_key = f"web_search:{query}:{max_results}"
@@ -31,49 +37,61 @@ class WebSearchService:
         return results
 
     async def _perform_live_search(self, query: str, max_results: int = 5):
-        # 1. Primary: DuckDuckGo
-        try:
-            logger.info(f"Searching with DuckDuckGo for: {query}")
-            results = self.ddgs.text(query, max_results=max_results)
-            if results:
-                return [{"snippet": r['body'], "link": r['href']} for r in results]
-        except Exception as e:
-            logger.warning(f"DuckDuckGo search failed: {e}. Falling back.")
-
-        # 2. Secondary: SearxNG
-        try:
-            logger.info(f"Searching with SearxNG for: {query}")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    settings.SEARXNG_URL,
-                    params={"q": query, "format": "json"}
-                )
-                response.raise_for_status()
-                results = response.json().get("results", [])
-                if results:
-                    return [{"snippet": r.get('content', ''), "link": r.get('url', '')} for r in results[:max_results]]
-        except Exception as e:
-            logger.warning(f"SearxNG search failed: {e}. Falling back.")
-
-        # 3. Tertiary: Brave Search API
+        # Providers in order of preference; a provider whose circuit is open is
+        # skipped immediately instead of being tried (and timing out) again.
+        providers = [("duckduckgo", self._search_duckduckgo), ("searxng", self._search_searxng)]
         if settings.BRAVE_API_KEY:
+            providers.append(("brave", self._search_brave))
+
+        for name, search in providers:
+            if not budget_allows(0.5):
+                logger.warning(f"Request deadline reached; not trying {name} or later search providers")
+                break
+            breaker = get_breaker(f"search.{name}")
             try:
-                logger.info(f"Searching with Brave for: {query}")
-                headers = {"X-Subscription-Token": settings.BRAVE_API_KEY}
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(
-                        f"https://api.search.brave.com/res/v1/web/search?q={query}",
-                        headers=headers
-                    )
-                    response.raise_for_status()
-                    results = response.json().get('web', {}).get('results', [])
-                    if results:
-                        return [{"snippet": r.get('description', ''), "link": r.get('url', '')} for r in results[:max_results]]
+                logger.info(f"Searching with {name} for: {query}")
+                results = await breaker.call(search, query, max_results)
+                if results:
+                    return results
+            except CircuitOpenError as e:
+                logger.info(f"Skipping {name}: {e}")
             except Exception as e:
-                logger.error(f"Brave Search failed: {e}")
+                logger.warning(f"{name} search failed: {e}. Falling back.")
 
         logger.error(f"All web search providers failed for query: {query}")
         return []
 
+    async def _search_duckduckgo(self, query: str, max_results: int):
+        # DDGS is synchronous; keep it off the event loop
+        with stage_budget(settings.SEARCH_PROVIDER_TIMEOUT_SECONDS) as timeout:
+            results = await asyncio.wait_for(
+                asyncio.to_thread(self.ddgs.text, query, max_results=max_results), timeout=timeout
+            )
+        return [{"snippet": r['body'], "link": r['href']} for r in results or []]
+
+    async def _search_searxng(self, query: str, max_results: int):
+        with stage_budget(settings.SEARCH_PROVIDER_TIMEOUT_SECONDS, timeouts=(httpx.TimeoutException,)) as timeout:
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                response = await client.get(
+                    settings.SEARXNG_URL,
+                    params={"q": query, "format": "json"}
+                )
+            response.raise_for_status()
+            results = response.json().get("results", [])
+            return [{"snippet": r.get('content', ''), "link": r.get('url', '')} for r in results[:max_results]]
+
+    async def _search_brave(self, query: str, max_results: int):
+        headers = {"X-Subscription-Token": settings.BRAVE_API_KEY}
+        with stage_budget(settings.SEARCH_PROVIDER_TIMEOUT_SECONDS, timeouts=(httpx.TimeoutException,)) as timeout:
+            async with httpx.AsyncClient(timeout=timeout) as client:
+                response = await client.get(
+                    "https://api.search.brave.com/res/v1/web/search",
+                    params={"q": query},
+                    headers=headers
+                )
+            response.raise_for_status()
+            results = response.json().get('web', {}).get('results', [])
+            return [{"snippet": r.get('description', ''), "link": r.get('url', '')} for r in results[:max_results]]
+
 web_search_service = WebSearchService()
 
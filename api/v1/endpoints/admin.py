@@ -1,5 +1,20 @@
-from fastapi import APIRouter, HTTPException
-from api.v1.schemas.admin import ModelLoadRequest, ModelLoadResponse
+from fastapi import APIRouter, HTTPException, Request
+from api.v1.schemas.admin import (
+    ModelLoadRequest, ModelLoadResponse,
+    CircuitBreakerStatus, CircuitBreakerListResponse,
+    RedisStatsResponse, SessionStoreStats,
+    CheckpointStoreStats, CheckpointRetentionRun, KVSlotStats,
+    ResponseCacheStats, RateLimiterStats, GraphCacheStats
+)
+from api.logic.conversation_graph import graph_cache
+from api.services.circuit_breaker import all_breakers
+from api.services.kv_slots import kv_slots
+from api.services.rate_limiter import rate_limiter
+from api.services.readiness import readiness
+from api.services.redis_client import redis_client
+from api.services.response_cache import response_cache
+from api.services.session_manager import session_manager
+from api.core.config import settings
 
 router = APIRouter()
 
@@ -24,3 +39,75 @@ async def load_model(request: ModelLoadRequest):
         vram_usage=0.85,  # Simulated value
         load_time=45.0    # Simulated value
     )
+
+@router.get("/breakers", response_model=CircuitBreakerListResponse)
+async def list_breakers():
+    """Current state of the circuit breaker guarding each outbound dependency."""
+    return CircuitBreakerListResponse(
+        breakers=[CircuitBreakerStatus(**b.snapshot()) for b in all_breakers().values()]
+    )
+
+@router.post("/breakers/{name}/reset", response_model=CircuitBreakerStatus)
+async def reset_breaker(name: str):
+    """Force a breaker back to closed, e.g. after a dependency has been fixed."""
+    breaker = all_breakers().get(name)
+    if breaker is None:
+        raise HTTPException(status_code=404, detail=f"Circuit breaker '{name}' not found")
+    breaker.reset()
+    return CircuitBreakerStatus(**breaker.snapshot())
+
+@router.get("/redis", response_model=RedisStatsResponse)
+async def redis_stats():
+    """Latency and error counts per Redis operation type since startup."""
+    return RedisStatsResponse(
+        codec=redis_client.codec.format,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        operations=redis_client.stats()
+    )
+
+@router.get("/sessions", response_model=SessionStoreStats)
+async def session_stats():
+    """Live session count and approximate memory held by the session store."""
+    return SessionStoreStats(**session_manager.stats())
+
+def _checkpointer(request: Request):
+    checkpointer = getattr(request.app.state, "checkpointer", None)
+    if checkpointer is None or not hasattr(checkpointer, "prune"):
+        raise HTTPException(status_code=404, detail="Checkpoint stats are only available for the SQLite checkpointer")
+    return checkpointer
+
+@router.get("/checkpoints", response_model=CheckpointStoreStats)
+async def checkpoint_stats(request: Request):
+    """Size of the checkpoint DB and the outcome of the last retention run."""
+    return CheckpointStoreStats(**await _checkpointer(request).stats())
+
+@router.post("/checkpoints/prune", response_model=CheckpointRetentionRun)
+async def prune_checkpoints(request: Request):
+    """Run checkpoint retention now instead of waiting for the background job."""
+    return CheckpointRetentionRun(**await _checkpointer(request).prune())
+
+@router.get("/kv-slots", response_model=KVSlotStats)
+async def kv_slot_stats():
+    """Which session each llama.cpp slot holds, and saved KV cache usage."""
+    return KVSlotStats(**kv_slots.stats())
+
+@router.get("/response-cache", response_model=ResponseCacheStats)
+async def response_cache_stats():
+    """Hit rate and time saved by the response cache since startup."""
+    return ResponseCacheStats(**response_cache.stats())
+
+@router.get("/rate-limits", response_model=RateLimiterStats)
+async def rate_limiter_stats():
+    """Where rate limits are enforced from and how many requests they denied."""
+    return RateLimiterStats(**rate_limiter.stats())
+
+@router.get("/graph-cache", response_model=GraphCacheStats)
+async def graph_cache_stats():
+    """Compiled graph variants for per-session agent_config, with hit rate and compile times."""
+    return GraphCacheStats(**graph_cache.stats())
+
+@router.post("/drain")
+async def drain(resume: bool = False):
+    """Report this replica not ready so balancers stop routing to it (``resume=true`` undoes it)."""
+    readiness.draining = not resume
+    return {"draining": readiness.draining}
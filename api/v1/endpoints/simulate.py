@@ -1,23 +1,41 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Header, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessage
+from typing import AsyncIterator, List, Dict, Any, Literal, Optional
 from api.v1.schemas.simulate import (
     SimulateStartRequest, SimulateStartResponse,
     SimulateMessageRequest, SimulateMessageResponse,
     SimulateStatusResponse,
+    SimulateForkRequest, SimulateForkResponse, SimulateHistoryResponse,
+    SessionExportResponse, BulkExportRequest, BulkExportResponse,
+    JobSubmitResponse, JobStatusResponse,
     # Updated and new Memory Schemas
     MemoryAddRequest, MemoryAddResponse,
     MemoryResponse, MemoryListResponse,
     MemoryUpdateRequest, MemoryUpdateResponse,
-    MemoryDeleteResponse, MemoryHistoryResponse, MemoryMessage
+    MemoryDeleteResponse, MemoryHistoryResponse
 )
+import asyncio
+import orjson
+import re
 import uuid
 import time
-from api.services.vllm_client import vllm_client
 from api.services.memory_client import memory_client
 from api.services.session_manager import session_manager
-from api.logic import conversation_graph
-from langchain_core.messages import HumanMessage
+from api.services import session_export
+from api.services.sse import KEEP_ALIVE, EventStream, StreamGone, encode_event, parse_event_id, sse_streams
+from api.services.job_queue import job_queue, new_job
+from api.services.idempotency import (
+    IdempotencyConflict, IdempotencyInProgress, idempotency_store, request_fingerprint
+)
+from api.services.circuit_breaker import CircuitOpenError
+from api.services.rate_limiter import rate_limiter
+from api.services import response_cache as response_caching
+from api.services.response_cache import response_cache
+from api.logic import conversation_graph, turn_events, turns
 from api.core.config import settings
+from api.core.responses import trusted_response
+from api.core.deadline import Deadline, deadline_scope
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,15 +45,20 @@ router = APIRouter()
 @router.post("/simulate/start", response_model=SimulateStartResponse)
 async def start_simulation(request: SimulateStartRequest):
     try:
-        session_id = session_manager.create_session(user_id=request.user_id, mode=request.mode)
-        # Each session has a unique graph config
-        config = {"configurable": {"thread_id": str(session_id)}}
-        session_manager.get_session(session_id)['graph_config'] = config
+        # Tools and model pick the session's compiled graph variant; reject unknown ones up front
+        conversation_graph.graph_spec(request.agent_config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        # Each session gets its own graph thread (graph_config) from the session manager
+        session_id = await session_manager.create_session(
+            user_id=request.user_id, mode=request.mode, agent_config=request.agent_config
+        )
 
         return SimulateStartResponse(
             session_id=session_id,
             status="initialized",
-            model_loaded=settings.OLLAMA_MODEL
+            model_loaded=conversation_graph.model_name(request.agent_config)
         )
     except Exception as e:
         logger.error(f"Error in start_simulation: {e}", exc_info=True)
@@ -45,180 +68,186 @@ async def start_simulation(request: SimulateStartRequest):
 async def post_message(
     session_id: uuid.UUID, 
     request: SimulateMessageRequest,
-    stream: bool = False
+    response: Response,
+    stream: bool = False,
+    x_request_timeout: Optional[float] = Header(
+        default=None, description="Total latency budget for this request, in seconds."
+    ),
+    idempotency_key: Optional[str] = Header(
+        default=None, max_length=255,
+        description="Retries with the same key get the original response instead of a new generation "
+                    "(non-streaming requests)."
+    )
+):
+    session = await session_manager.get_session(session_id)
+    deadline = turns.request_deadline(x_request_timeout, session)
+    limit_headers = {}
+    with deadline_scope(deadline):
+        if idempotency_key and not stream:
+            # Admitted only if this request runs the turn; retries replay or attach free of charge
+            result = await _handle_idempotent(session_id, session, request, deadline, idempotency_key, response)
+        else:
+            limit_headers = await _admit(session_id, session, request.content)
+            response.headers.update(limit_headers)
+            result = await _handle_message(session_id, session, request, stream, deadline)
+    if isinstance(result, SimulateMessageResponse):
+        return trusted_response(result, headers=response.headers)
+    result.headers.update(limit_headers)
+    return result
+
+
+async def _admit(session_id: uuid.UUID, session: Optional[Dict[str, Any]], content: str) -> Dict[str, str]:
+    """Take the message from the user's and session's rate limits; RateLimit-* headers, or 429."""
+    if not session:
+        return {}
+    decision = await rate_limiter.admit(session['user_id'], str(session_id), content)
+    if decision is None:
+        return {}
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=429, detail=f"Rate limit exceeded: {decision.budget}", headers=decision.headers()
+        )
+    return decision.headers()
+
+
+async def _handle_idempotent(
+    session_id: uuid.UUID,
+    session: Optional[Dict[str, Any]],
+    request: SimulateMessageRequest,
+    deadline: Deadline,
+    idempotency_key: str,
+    response: Response
+):
+    """Run the turn once per Idempotency-Key; retries attach to the running turn or get its stored response."""
+    async def compute():
+        response.headers.update(await _admit(session_id, session, request.content))
+        result = await _handle_message(session_id, session, request, False, deadline)
+        return result.model_dump()
+
+    try:
+        body, replayed = await idempotency_store.run_once(
+            idempotency_store.key(str(session_id), idempotency_key),
+            request_fingerprint(request.content, request.attachments),
+            compute,
+            wait_seconds=deadline.remaining()
+        )
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    except IdempotencyInProgress as e:
+        raise HTTPException(
+            status_code=409, detail=str(e), headers={"Retry-After": str(max(1, int(e.retry_after)))}
+        )
+    if replayed:
+        logger.info(f"Idempotency-Key {idempotency_key} for session {session_id}: returning the original response")
+        response.headers["Idempotent-Replayed"] = "true"
+    return SimulateMessageResponse(**body)
+
+
+async def _handle_message(
+    session_id: uuid.UUID,
+    session: Optional[Dict[str, Any]],
+    request: SimulateMessageRequest,
+    stream: bool,
+    deadline: Deadline
 ):
     try:
-        session = session_manager.get_session(session_id)
         if not session or 'graph_config' not in session:
             logger.error(f"Session {session_id} not found or not initialized")
             raise HTTPException(status_code=404, detail="Session not found or not initialized")
 
-        # Get the app_graph dynamically to avoid import timing issues
+        # The session's graph variant (the global graph unless agent_config picks tools or a model)
         logger.info("Getting app_graph from conversation_graph module...")
-        app_graph = conversation_graph.get_compiled_graph()
+        app_graph = await conversation_graph.get_session_graph(session.get('agent_config'))
         logger.info(f"app_graph retrieved: {app_graph}")
         
         if app_graph is None:
             logger.error("CRITICAL: Conversation graph not initialized - app_graph is None")
             raise HTTPException(status_code=500, detail="Conversation graph not initialized")
 
+        if stream:
+            # The turn runs into a resumable event stream; memory search happens inside it
+            event_stream = sse_streams.start(
+                str(session_id), _sse_turn(session_id, session, app_graph, request.content, deadline)
+            )
+            return _sse_response(event_stream)
+
         start_time = time.time()
 
-        # 1. Search for relevant memories
-        logger.info(f"Searching for memories for user_id: {session['user_id']}")
-        try:
-            relevant_memories = await memory_client.search_memory(user_id=session['user_id'], query=request.content)
-            logger.info(f"Found {len(relevant_memories) if relevant_memories else 0} relevant memories")
-        except Exception as e:
-            logger.error(f"Memory search failed: {e}", exc_info=True)
-            relevant_memories = []  # Continue without memories if search fails
-        
-        # 2. Construct the initial messages for the graph
-        logger.info("Constructing graph input messages...")
-        graph_input_messages = []
-        if relevant_memories:
-            memory_str = "You have the following relevant memories:\n"
-            for mem in relevant_memories:
-                memory_content = mem.get('text', '') if isinstance(mem, dict) else getattr(mem, 'text', '')
-                if memory_content:
-                    memory_str += f"- {memory_content}\n"
-            if len(memory_str) > len("You have the following relevant memories:\n"):
-                 graph_input_messages.append(HumanMessage(content=memory_str))
-        
-        graph_input_messages.append(HumanMessage(content=request.content))
-        logger.info(f"Created {len(graph_input_messages)} input messages for graph")
+        # 1-2. Relevant memories (when the budget allows) and the user's message
+        graph_input_messages = await turns.graph_input_messages(session, request.content, deadline)
 
-        # 3. Prepare the state with streaming flag
-        state = {
+        # Opt-in response cache: a hit answers without running the model
+        cache_lookup = await _cache_lookup(session_id, session, request.content, graph_input_messages)
+        if cache_lookup is not None and cache_lookup.hit:
+            return await _cached_response(session_id, session, app_graph, request.content, graph_input_messages, cache_lookup, deadline)
+
+        # 3. Invoke the graph
+        logger.info("Preparing to invoke graph...")
+        inputs = {
             "messages": graph_input_messages,
-            "streaming": stream
+            "user_id": session['user_id'],
+            "agent_config": session.get('agent_config', {})
         }
-
-        # For streaming responses
-        if stream:
-            from fastapi.responses import StreamingResponse
-            
-            async def stream_response():
-                try:
-                    # Invoke the graph
-                    logger.info("Invoking graph with streaming enabled")
-                    result = await app_graph.ainvoke(state, config=session['graph_config'])
-                    
-                    if "stream_generator" in result:
-                        full_response = ""
-                        async for chunk in result["stream_generator"]:
-                            if chunk["type"] == "chunk":
-                                content = chunk["content"]
-                                full_response += content
-                                yield f"data: {content}\n\n"
-                            elif chunk["type"] == "final":
-                                # Store the conversation in memory
-                                try:
-                                    conversation_to_log = [
-                                        MemoryMessage(role="user", content=request.content).model_dump(),
-                                        MemoryMessage(role="assistant", content=full_response).model_dump()
-                                    ]
-                                    await memory_client.add_memory(
-                                        user_id=session['user_id'], 
-                                        messages=conversation_to_log
-                                    )
-                                    logger.info("Memory stored successfully")
-                                except Exception as e:
-                                    logger.error(f"Memory storage failed: {e}", exc_info=True)
-                                
-                                # Update session with the new message exchange
-                                try:
-                                    session_manager.update_history(session_id, request.content, full_response)
-                                    await session_manager.update_session(session_id, {
-                                        'last_activity': int(time.time()),
-                                        'message_count': session.get('message_count', 0) + 1
-                                    })
-                                    logger.info("Session updated successfully")
-                                except Exception as e:
-                                    logger.error(f"Session update failed: {e}", exc_info=True)
-                                
-                                break
-                        
-                        logger.info("Streaming completed successfully")
-                except Exception as e:
-                    logger.error(f"Error in streaming response: {e}", exc_info=True)
-                    yield f"data: [ERROR] {str(e)}\n\n"
-            
-            return StreamingResponse(
-                stream_response(),
-                media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "X-Accel-Buffering": "no"
-                }
+        logger.info(f"Graph inputs: {inputs}")
+        logger.info(f"Session graph config: {session['graph_config']}")
+        
+        try:
+            logger.info("Calling app_graph.ainvoke...")
+            graph_result = await asyncio.wait_for(
+                app_graph.ainvoke(inputs, config=turns.run_config(session)),
+                timeout=deadline.remaining()
+            )
+            logger.info(f"Graph invocation completed successfully: {type(graph_result)}")
+        except asyncio.TimeoutError:
+            logger.error(f"Graph invocation exceeded the request deadline ({deadline.timeout_seconds:.1f}s)")
+            raise HTTPException(status_code=504, detail="Request deadline exceeded while generating a response")
+        except CircuitOpenError as e:
+            logger.warning(f"Graph invocation rejected: {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="Language model backend is unavailable, try again later",
+                headers={"Retry-After": str(max(1, int(e.retry_after)))}
             )
+        except Exception as e:
+            logger.error(f"Graph invocation failed: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Graph invocation failed: {str(e)}")
         
-        # For non-streaming responses
-        else:
-            # 3. Invoke the graph
-            logger.info("Preparing to invoke graph...")
-            inputs = {"messages": graph_input_messages, "streaming": False}
-            logger.info(f"Graph inputs: {inputs}")
-            logger.info(f"Session graph config: {session['graph_config']}")
-            
-            try:
-                logger.info("Calling app_graph.ainvoke...")
-                graph_result = await app_graph.ainvoke(inputs, config=session['graph_config'])
-                logger.info(f"Graph invocation completed successfully: {type(graph_result)}")
-            except Exception as e:
-                logger.error(f"Graph invocation failed: {e}", exc_info=True)
-                raise HTTPException(status_code=500, detail=f"Graph invocation failed: {str(e)}")
-            
-            # 4. Extract AI response
-            logger.info("Extracting AI response from graph result...")
-            try:
-                ai_response_message = graph_result['messages'][-1]
-                ai_response_content = ai_response_message.content if hasattr(ai_response_message, 'content') else str(ai_response_message)
-                logger.info(f"AI response extracted: {ai_response_content[:100]}...")
-            except Exception as e:
-                logger.error(f"Failed to extract AI response: {e}", exc_info=True)
-                raise HTTPException(status_code=500, detail=f"Failed to extract AI response: {str(e)}")
+        # 4. Extract AI response
+        logger.info("Extracting AI response from graph result...")
+        try:
+            ai_response_message = graph_result['messages'][-1]
+            ai_response_content = ai_response_message.content if hasattr(ai_response_message, 'content') else str(ai_response_message)
+            logger.info(f"AI response extracted: {ai_response_content[:100]}...")
+        except Exception as e:
+            logger.error(f"Failed to extract AI response: {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"Failed to extract AI response: {str(e)}")
 
-            # 5. Store the conversation in memory
-            logger.info("Storing conversation in memory...")
-            try:
-                conversation_to_log = [
-                    MemoryMessage(role="user", content=request.content).model_dump(),
-                    MemoryMessage(role="assistant", content=ai_response_content).model_dump()
-                ]
-                await memory_client.add_memory(
-                    user_id=session['user_id'], 
-                    messages=conversation_to_log
-                )
-                logger.info("Memory stored successfully")
-            except Exception as e:
-                logger.error(f"Memory storage failed: {e}", exc_info=True)
-                # Continue even if memory storage fails
+        # 5-6. Store the conversation in memory and update the session history
+        await turns.record_turn(session_id, session, request.content, ai_response_content, deadline)
 
-            # 6. Update session with the new message exchange
-            logger.info("Updating session...")
+        # 7. Prepare response
+        logger.info("Preparing response...")
+        thinking_time = time.time() - start_time
+        iteration_latencies = graph_result.get('iteration_latencies') or []
+        logger.info(
+            f"Turn finished in {graph_result.get('iterations', 0)} agent iteration(s), "
+            f"per-iteration latency: {iteration_latencies}"
+        )
+        
+        if cache_lookup is not None:
             try:
-                session_manager.update_history(session_id, request.content, ai_response_content)
-                await session_manager.update_session(session_id, {
-                    'last_activity': int(time.time()),
-                    'message_count': session.get('message_count', 0) + 1
-                })
-                logger.info("Session updated successfully")
+                await response_cache.store(cache_lookup, {"response": ai_response_content, "thinking_time": thinking_time})
             except Exception as e:
-                logger.error(f"Session update failed: {e}", exc_info=True)
-                # Continue even if session update fails
-
-            # 7. Prepare response
-            logger.info("Preparing response...")
-            thinking_time = time.time() - start_time
-            
-            return SimulateMessageResponse(
-                response=ai_response_content,
-                thinking_time=thinking_time,
-                tokens_used=0,  # TODO: Track token usage
-                model=settings.OLLAMA_MODEL
-            )
+                logger.error(f"Response cache store failed: {e}")
+
+        return SimulateMessageResponse(
+            response=ai_response_content,
+            thinking_time=thinking_time,
+            tokens_used=0,  # TODO: Track token usage
+            model=conversation_graph.model_name(session.get('agent_config')),
+            iterations=graph_result.get('iterations'),
+            iteration_latencies=iteration_latencies
+        )
 
     except HTTPException:
         # Re-raise HTTP exceptions as-is
@@ -227,17 +256,332 @@ async def post_message(
         logger.error(f"Unexpected error in post_message: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+
+async def _cache_lookup(session_id: uuid.UUID, session: Dict[str, Any], content: str, graph_input_messages: List[Any]):
+    """Response cache lookup for this turn, or None when the session's agent_config does not allow caching."""
+    tier = response_caching.policy(session.get('agent_config'))
+    if tier is None:
+        return None
+    try:
+        history = await session_manager.get_history(session_id)
+        context = response_caching.context_key(
+            session.get('agent_config'), [session.get('message_count', 0), *history], graph_input_messages[:-1]
+        )
+        return await response_cache.lookup(tier, context, content)
+    except Exception as e:
+        logger.error(f"Response cache lookup failed: {e}")
+        return None
+
+
+async def _cached_response(
+    session_id: uuid.UUID,
+    session: Dict[str, Any],
+    app_graph,
+    content: str,
+    graph_input_messages: List[Any],
+    cache_lookup,
+    deadline: Deadline
+) -> SimulateMessageResponse:
+    """Record a cached answer as this turn, in the graph thread and the session, and return it."""
+    started = cache_lookup.started
+    answer = cache_lookup.entry["response"]
+    try:
+        await app_graph.aupdate_state(
+            session['graph_config'], {"messages": [*graph_input_messages, AIMessage(content=answer)]}, as_node="agent"
+        )
+    except Exception as e:
+        logger.error(f"Recording the cached answer in the graph thread failed: {e}", exc_info=True)
+    await turns.record_turn(session_id, session, content, answer, deadline, generated=False)
+    return SimulateMessageResponse(
+        response=answer,
+        thinking_time=time.perf_counter() - started,
+        tokens_used=0,
+        model=conversation_graph.model_name(session.get('agent_config')),
+        iterations=0,
+        cached=cache_lookup.hit
+    )
+
+
+class _ClientTooSlow(Exception):
+    """The WebSocket client stopped reading and the send queue stayed full."""
+
+
+def _ws_sender(websocket: WebSocket, outbox: asyncio.Queue):
+    """Frame writer for one WebSocket; returns (send coroutine, writer task)."""
+    async def send(event: Dict[str, Any]):
+        try:
+            await asyncio.wait_for(outbox.put(event), settings.WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise _ClientTooSlow()
+
+    async def write():
+        while True:
+            event = await outbox.get()
+            try:
+                await asyncio.wait_for(
+                    websocket.send_text(orjson.dumps(event, default=str).decode()), settings.WS_SEND_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                logger.warning("WebSocket client stopped reading; closing the connection")
+                code, reason = 1008, "Client too slow"
+            except Exception as e:
+                logger.warning(f"WebSocket send failed, closing the connection: {e}")
+                code, reason = 1011, "Send failed"
+            else:
+                continue
+            try:
+                await websocket.close(code=code, reason=reason)
+            except Exception:
+                pass  # already closed or disconnected
+            return
+
+    return send, asyncio.create_task(write())
+
+
+async def _sse_turn(
+    session_id: uuid.UUID, session: Dict[str, Any], app_graph, content: str, deadline: Deadline
+) -> AsyncIterator[Dict[str, Any]]:
+    # Runs as the event stream's own task, which inherited the request's deadline scope
+    try:
+        async with asyncio.timeout(deadline.remaining()):
+            async for event in turns.stream_events(session_id, session, app_graph, content, deadline):
+                yield event
+    except Exception as e:
+        yield turns.error_event(e, deadline)
+
+
+def _sse_response(event_stream: EventStream, after: int = 0) -> StreamingResponse:
+    return StreamingResponse(
+        event_stream.follow(after),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "X-Stream-ID": event_stream.id
+        }
+    )
+
+
+@router.get("/simulate/{session_id}/stream")
+async def resume_stream(
+    session_id: uuid.UUID,
+    last_event_id: str = Header(description="Id of the last event received, as sent in the stream's id: lines.")
+):
+    """Resume a streamed turn after the event in Last-Event-ID (while the stream is still buffered)."""
+    try:
+        stream_id, seq = parse_event_id(last_event_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed Last-Event-ID")
+    event_stream = sse_streams.get(stream_id)
+    if event_stream is None or event_stream.owner != str(session_id):
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    try:
+        event_stream.frames_after(seq)
+    except StreamGone as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    return _sse_response(event_stream, after=seq)
+
+
+async def _ws_turn(session_id: uuid.UUID, session: Dict[str, Any], app_graph, content: str, send):
+    """Run one turn for the WebSocket and send its events; errors become error frames."""
+    deadline = turns.request_deadline(None, session)
+    with deadline_scope(deadline):
+        try:
+            async with asyncio.timeout(deadline.remaining()):
+                async for event in turns.stream_events(session_id, session, app_graph, content, deadline):
+                    await send(event)
+        except _ClientTooSlow:
+            raise
+        except Exception as e:
+            await send(turns.error_event(e, deadline))
+
+
+async def _ws_rate_limited(session_id: uuid.UUID, session: Dict[str, Any], content: str) -> Optional[Dict[str, Any]]:
+    """The 429 error frame when the message is over the rate limits, else None."""
+    try:
+        await _admit(session_id, session, content)
+    except HTTPException as e:
+        return {"type": "error", "status": e.status_code, "detail": e.detail,
+                "retry_after": int(e.headers["Retry-After"])}
+    return None
+
+
+@router.websocket("/simulate/{session_id}/ws")
+async def chat_socket(websocket: WebSocket, session_id: uuid.UUID):
+    """Persistent chat connection for one session.
+
+    Client frames (JSON): ``{"type": "message", "content": ...}``, ``{"type": "stop"}``
+    to cancel the running turn, ``{"type": "ping"}``. Server frames: ``ready``,
+    ``token``, ``tool_start``, ``tool_end``, ``usage``, ``done``, ``stopped``, ``pong``
+    and ``error``. The session and graph are looked up once per connection.
+    Frames go through a bounded queue, so a client that reads slowly slows the
+    turn down instead of growing a buffer; one that stops reading for
+    WS_SEND_TIMEOUT_SECONDS is disconnected.
+    """
+    await websocket.accept()
+    session = await session_manager.get_session(session_id)
+    if not session or 'graph_config' not in session:
+        await websocket.close(code=1008, reason="Session not found or not initialized")
+        return
+    app_graph = await conversation_graph.get_session_graph(session.get('agent_config'))
+    if app_graph is None:
+        await websocket.close(code=1011, reason="Conversation graph not initialized")
+        return
+
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+    send, writer = _ws_sender(websocket, outbox)
+    turn: Optional[asyncio.Task] = None
+    receive: Optional[asyncio.Task] = None
+    try:
+        await send({"type": "ready", "session_id": str(session_id)})
+        while True:
+            # Wait for the next frame, but stop as soon as the writer or the running turn fails
+            if receive is None:
+                receive = asyncio.create_task(websocket.receive_text())
+            watched = {receive, writer} | ({turn} if turn is not None and not turn.done() else set())
+            await asyncio.wait(watched, return_when=asyncio.FIRST_COMPLETED)
+            if writer.done():
+                logger.warning(f"WebSocket for session {session_id} closed: sending to the client failed")
+                break
+            if turn is not None and turn.done() and not turn.cancelled() and turn.exception() is not None:
+                raise turn.exception()
+            if not receive.done():
+                continue
+            text, receive = receive.result(), None
+            try:
+                frame = orjson.loads(text)
+            except orjson.JSONDecodeError:
+                await send({"type": "error", "status": 400, "detail": "Frames must be JSON objects"})
+                continue
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == "message":
+                content = frame.get("content")
+                if turn is not None and not turn.done():
+                    await send({"type": "error", "status": 409, "detail": "A turn is already running; send stop first"})
+                elif not isinstance(content, str) or not content.strip():
+                    await send({"type": "error", "status": 400, "detail": "Message content must be a non-empty string"})
+                elif (limited := await _ws_rate_limited(session_id, session, content)) is not None:
+                    await send(limited)
+                else:
+                    turn = asyncio.create_task(_ws_turn(session_id, session, app_graph, content, send))
+            elif kind == "stop":
+                if turn is not None and not turn.done():
+                    turn.cancel()
+                    await asyncio.wait([turn])
+                    await send({"type": "stopped"})
+            elif kind == "ping":
+                await send({"type": "pong"})
+            else:
+                await send({"type": "error", "status": 400, "detail": f"Unknown frame type: {kind}"})
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket for session {session_id} disconnected")
+    except _ClientTooSlow:
+        logger.warning(f"WebSocket for session {session_id} closed: client not reading")
+    finally:
+        tasks = [task for task in (receive, turn, writer) if task is not None]
+        for task in tasks:
+            task.cancel()
+        # Let the turn unwind before the handler returns
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.post("/simulate/{session_id}/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(
+    session_id: uuid.UUID,
+    request: SimulateMessageRequest,
+    response: Response,
+    x_request_timeout: Optional[float] = Header(
+        default=None, description="Latency budget for the turn once a worker starts it, in seconds."
+    )
+):
+    """Queue a message to be answered by a job worker; poll the status URL or stream the events URL."""
+    session = await session_manager.get_session(session_id)
+    if not session or 'graph_config' not in session:
+        raise HTTPException(status_code=404, detail="Session not found or not initialized")
+    response.headers.update(await _admit(session_id, session, request.content))
+    job = new_job(session_id, request.content, turns.request_deadline(x_request_timeout, session).timeout_seconds)
+    try:
+        await job_queue.submit(job)
+    except Exception as e:
+        logger.error(f"Could not queue job for session {session_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="Job queue unavailable, try again later")
+    base = f"{settings.API_V1_STR}/simulate/{session_id}/jobs/{job['job_id']}"
+    return JobSubmitResponse(
+        job_id=job["job_id"], session_id=session_id, status=job["status"], status_url=base, events_url=f"{base}/events"
+    )
+
+
+async def _get_job(session_id: uuid.UUID, job_id: uuid.UUID) -> Dict[str, Any]:
+    try:
+        job = await job_queue.get(str(job_id))
+    except Exception as e:
+        logger.error(f"Could not read job {job_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="Job queue unavailable, try again later")
+    if job is None or job["session_id"] != str(session_id):
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.get("/simulate/{session_id}/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(session_id: uuid.UUID, job_id: uuid.UUID):
+    return JobStatusResponse(**await _get_job(session_id, job_id))
+
+
+_JOB_EVENT_ID = re.compile(r"^\d+(-\d+)?$")
+
+
+@router.get("/simulate/{session_id}/jobs/{job_id}/events")
+async def stream_job_events(
+    session_id: uuid.UUID,
+    job_id: uuid.UUID,
+    last_event_id: Optional[str] = Header(default=None, description="Resume after this event id.")
+):
+    """The job's events as SSE, from the start or after Last-Event-ID, until done or error."""
+    await _get_job(session_id, job_id)
+    after = (last_event_id or "0").strip()
+    if not _JOB_EVENT_ID.match(after):
+        raise HTTPException(status_code=400, detail="Malformed Last-Event-ID")
+
+    async def frames():
+        nonlocal after
+        last_write = time.monotonic()
+        while True:
+            try:
+                events = await job_queue.read_events(str(job_id), after, settings.JOB_BLOCK_SECONDS)
+                if not events and await job_queue.get(str(job_id)) is None:
+                    return  # expired
+            except Exception as e:
+                logger.error(f"Reading events of job {job_id} failed: {e}")
+                return  # the client resumes with Last-Event-ID
+            if not events:
+                if time.monotonic() - last_write >= settings.SSE_HEARTBEAT_SECONDS:
+                    last_write = time.monotonic()
+                    yield KEEP_ALIVE
+                continue
+            last_write, after = time.monotonic(), events[-1][0]
+            yield b"".join(encode_event(event_id, event) for event_id, event in events)
+            if any(event["type"] in (turn_events.DONE, turn_events.ERROR) for _, event in events):
+                return
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/simulate/{session_id}/status", response_model=SimulateStatusResponse)
 async def get_status(session_id: uuid.UUID):
     """Return real-time stats for a running simulation session."""
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
 
         # Iterations = number of message exchanges so far (user -> assistant)
-        iterations: int = session.get("message_count", len(session.get("history", [])))
+        iterations: int = session.get("message_count", 0)
 
         # Total memories stored for this user
         memory_size: int = 0
@@ -250,12 +594,12 @@ async def get_status(session_id: uuid.UUID):
         # GPU memory usage – Ollama does not expose this directly; return 0 for now.
         gpu_memory_used: float = 0.0
 
-        return {
-            "status": "active",
-            "iterations": iterations,
-            "memory_size": memory_size,
-            "gpu_memory_used": gpu_memory_used,
-        }
+        return trusted_response(SimulateStatusResponse(
+            status="active",
+            iterations=iterations,
+            memory_size=memory_size,
+            gpu_memory_used=gpu_memory_used,
+        ))
     except HTTPException:
         raise
     except Exception as e:
@@ -265,7 +609,7 @@ async def get_status(session_id: uuid.UUID):
 @router.post("/simulate/{session_id}/memory", response_model=MemoryAddResponse)  # Corrected path
 async def add_memory_endpoint(session_id: uuid.UUID, request: MemoryAddRequest):
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
@@ -299,22 +643,124 @@ async def add_memory_endpoint(session_id: uuid.UUID, request: MemoryAddRequest):
         logger.error(f"Unexpected error in add_memory_endpoint: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/simulate/{session_id}/fork", response_model=SimulateForkResponse)
+async def fork_session(session_id: uuid.UUID, request: Optional[SimulateForkRequest] = None):
+    """Start a new session from a checkpoint of this one, without replaying the conversation.
+
+    The fork gets a copy of the checkpoint in its own thread, so both sessions
+    continue independently. Forking from the latest checkpoint also copies
+    the recent turn history.
+    """
+    checkpoint_id = request.checkpoint_id if request else None
+    session = await session_manager.get_session(session_id)
+    if not session:
+        logger.error(f"Session {session_id} not found")
+        raise HTTPException(status_code=404, detail="Session not found")
+    checkpointer = conversation_graph.get_checkpointer()
+    if not hasattr(checkpointer, "acopy_thread"):
+        raise HTTPException(status_code=501, detail="Forking requires the SQLite or Redis checkpointer")
+
+    started = time.perf_counter()
+    affinity_key = session.get("affinity_key") or str(session_id)
+    fork_id = await session_manager.fork_session(
+        session_id, copy_history=checkpoint_id is None, forked_from=str(session_id), affinity_key=affinity_key
+    )
+    if fork_id is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        config = await checkpointer.acopy_thread(str(session_id), str(fork_id), checkpoint_id)
+    except Exception as e:
+        await session_manager.delete_session(fork_id)
+        logger.error(f"Error in fork_session: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    if config is None:
+        await session_manager.delete_session(fork_id)
+        raise HTTPException(status_code=404, detail="Checkpoint not found")
+    fork_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Forked session {session_id} at checkpoint {config['configurable']['checkpoint_id']} "
+                f"into {fork_id} in {fork_ms:.1f} ms")
+    return SimulateForkResponse(
+        session_id=fork_id,
+        forked_from=session_id,
+        checkpoint_id=config["configurable"]["checkpoint_id"],
+        affinity_key=affinity_key,
+        fork_ms=fork_ms
+    )
+
+@router.get("/simulate/{session_id}/history", response_model=SimulateHistoryResponse)
+async def get_history_page(
+    session_id: uuid.UUID,
+    before: Optional[int] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """Page through a session's turns from its checkpoints, newest page first.
+
+    Without ``before`` the latest ``limit`` turns are returned; pass the
+    response's ``next_before`` to fetch the page preceding it.
+    """
+    session = await session_manager.get_session(session_id)
+    if not session:
+        logger.error(f"Session {session_id} not found")
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        page_turns, total = await session_export.history_page(
+            session_id, conversation_graph.get_checkpointer(), before, limit
+        )
+    except Exception as e:
+        logger.error(f"Error in get_history_page: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    next_before = page_turns[0]["index"] if page_turns and page_turns[0]["index"] > 0 else None
+    return trusted_response(SimulateHistoryResponse(turns=page_turns, total=total, next_before=next_before))
+
 @router.get("/simulate/{session_id}/export")
-def export_session(session_id: uuid.UUID):
+async def export_session(session_id: uuid.UUID, format: Literal["ndjson", "parquet", "stream"] = "stream"):
+    """Export a session from its checkpoints.
+
+    ``stream`` (default) streams NDJSON records as they are read; ``ndjson``
+    and ``parquet`` write a file under EXPORT_DIR and return its path.
+    """
+    session = await session_manager.get_session(session_id)
+    if not session:
+        logger.error(f"Session {session_id} not found")
+        raise HTTPException(status_code=404, detail="Session not found")
+    checkpointer = conversation_graph.get_checkpointer()
+    if format == "stream":
+        return StreamingResponse(
+            session_export.stream_ndjson(session_id, session, checkpointer),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{session_id}.ndjson"'}
+        )
     try:
-        return {
-            "session_id": str(session_id),
-            "status": "exported",
-            "path": f"/path/to/export/{session_id}.json" # Placeholder
-        }
+        result = await session_export.write_export(session_id, session, checkpointer, format)
+        return SessionExportResponse(status="exported", **result)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
         logger.error(f"Error in export_session: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/simulate/export", response_model=BulkExportResponse)
+async def bulk_export_sessions(request: BulkExportRequest):
+    """Export many sessions to files under EXPORT_DIR with bounded concurrency."""
+    if request.format == "parquet" and session_export.pyarrow is None:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    results = await session_export.bulk_export(
+        request.session_ids,
+        conversation_graph.get_checkpointer(),
+        request.format,
+        request.concurrency or settings.EXPORT_MAX_CONCURRENCY
+    )
+    exports = [
+        SessionExportResponse(**{"status": "failed" if "error" in result else "exported", **result})
+        for result in results
+    ]
+    failed = sum(1 for export in exports if export.error)
+    return BulkExportResponse(exports=exports, succeeded=len(exports) - failed, failed=failed)
+
 @router.get("/simulate/{session_id}/memory/{memory_id}", response_model=Optional[MemoryResponse])
 async def get_memory(session_id: uuid.UUID, memory_id: str):
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
@@ -322,7 +768,7 @@ async def get_memory(session_id: uuid.UUID, memory_id: str):
         if not memory_data:
             logger.error(f"Memory {memory_id} not found")
             raise HTTPException(status_code=404, detail="Memory not found")
-        return MemoryResponse(**memory_data) if isinstance(memory_data, dict) else memory_data 
+        return trusted_response(MemoryResponse.model_validate(memory_data))
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
@@ -333,14 +779,14 @@ async def get_memory(session_id: uuid.UUID, memory_id: str):
 @router.get("/simulate/{session_id}/memory", response_model=MemoryListResponse)
 async def get_all_user_memories(session_id: uuid.UUID):
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
         
         memories_data = await memory_client.get_all_memories(user_id=session['user_id'])
-        transformed_memories = [MemoryResponse(**mem) if isinstance(mem, dict) else mem for mem in memories_data]
-        return MemoryListResponse(memories=transformed_memories)
+        # One validation pass over the whole list, then pydantic-core writes the JSON
+        return trusted_response(MemoryListResponse.model_validate({"memories": memories_data}))
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
@@ -351,7 +797,7 @@ async def get_all_user_memories(session_id: uuid.UUID):
 @router.put("/simulate/{session_id}/memory/{memory_id}", response_model=MemoryUpdateResponse)
 async def update_memory(session_id: uuid.UUID, memory_id: str, request: MemoryUpdateRequest):
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
@@ -370,7 +816,7 @@ async def update_memory(session_id: uuid.UUID, memory_id: str, request: MemoryUp
 @router.delete("/simulate/{session_id}/memory/{memory_id}", response_model=MemoryDeleteResponse)
 async def delete_memory(session_id: uuid.UUID, memory_id: str):
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
@@ -389,7 +835,7 @@ async def delete_memory(session_id: uuid.UUID, memory_id: str):
 @router.delete("/simulate/{session_id}/memory", response_model=MemoryDeleteResponse)
 async def delete_all_session_user_memories(session_id: uuid.UUID):
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
@@ -408,7 +854,7 @@ async def delete_all_session_user_memories(session_id: uuid.UUID):
 @router.get("/simulate/{session_id}/memory/{memory_id}/history", response_model=Optional[MemoryHistoryResponse])
 async def get_memory_history(session_id: uuid.UUID, memory_id: str):
     try:
-        session = session_manager.get_session(session_id)
+        session = await session_manager.get_session(session_id)
         if not session:
             logger.error(f"Session {session_id} not found")
             raise HTTPException(status_code=404, detail="Session not found")
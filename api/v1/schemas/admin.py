@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 
 class ModelLoadRequest(BaseModel):
     model_name: str = Field(..., description="The HuggingFace model identifier.")
@@ -8,3 +9,109 @@ class ModelLoadResponse(BaseModel):
     loaded: bool
     vram_usage: float = Field(..., description="Estimated VRAM usage as a fraction (0.0 to 1.0).")
     load_time: float = Field(..., description="Time taken to load the model in seconds.")
+
+class CircuitBreakerStatus(BaseModel):
+    name: str
+    state: str = Field(..., description="'closed', 'open' or 'half_open'.")
+    failure_rate: float = Field(..., description="Failure rate over the current window (0.0 to 1.0).")
+    calls_in_window: int
+    retry_after: float = Field(..., description="Seconds until an open breaker lets a trial call through.")
+    total_calls: int
+    total_failures: int
+    total_rejected: int = Field(..., description="Calls failed fast while the breaker was open.")
+
+class CircuitBreakerListResponse(BaseModel):
+    breakers: List[CircuitBreakerStatus]
+
+class RedisOpStats(BaseModel):
+    calls: int
+    errors: int
+    keys: int = Field(..., description="Total keys touched (bulk operations count every key).")
+    avg_ms: float
+    max_ms: float
+
+class RedisStatsResponse(BaseModel):
+    codec: str
+    max_connections: int
+    operations: Dict[str, RedisOpStats]
+
+class SessionStoreStats(BaseModel):
+    backend: str = Field(..., description="'memory' or 'redis'.")
+    live_sessions: Optional[int] = None
+    approx_bytes: Optional[int] = Field(default=None, description="Approximate memory held by in-process sessions.")
+    max_sessions: Optional[int] = None
+    max_bytes: Optional[int] = None
+    expired: Optional[int] = Field(default=None, description="Sessions dropped after the idle TTL.")
+    evicted: Optional[int] = Field(default=None, description="Sessions dropped by the LRU caps.")
+    near_cache_entries: Optional[int] = None
+
+class CheckpointRetentionRun(BaseModel):
+    threads_dropped: int
+    checkpoints_removed: int
+    writes_removed: int
+    duration_ms: float
+    finished_at: int
+
+class CheckpointStoreStats(BaseModel):
+    threads: int
+    checkpoints: int
+    writes: int
+    messages: int = Field(..., description="Messages stored once per thread and referenced by checkpoints.")
+    db_bytes: int
+    free_bytes: int = Field(..., description="Pages freed by retention but not yet vacuumed.")
+    journal_mode: str
+    keep_last: int = Field(..., description="Checkpoints kept per thread.")
+    thread_ttl_seconds: int = Field(..., description="Threads idle for longer than this are dropped.")
+    last_retention: Optional[CheckpointRetentionRun] = None
+
+class KVSlotState(BaseModel):
+    id: int
+    session: Optional[str] = Field(default=None, description="Session whose KV cache the slot holds.")
+    busy: bool
+
+class KVSlotStats(BaseModel):
+    active: bool = Field(..., description="False unless KV_SLOTS_ENABLED and the backend exposes llama.cpp slots.")
+    slots: List[KVSlotState]
+    saved_sessions: int
+    saved_bytes: int
+    hits: int = Field(..., description="Turns whose session was still resident in its slot.")
+    misses: int
+    saves: int
+    restores: int
+    evictions: int = Field(..., description="Saved caches dropped by the LRU caps.")
+    errors: int
+
+class ResponseCacheStats(BaseModel):
+    backend: str = Field(..., description="Where exact entries live: 'memory' or 'redis'.")
+    entries: Optional[int] = Field(default=None, description="Exact entries in process (None with Redis).")
+    semantic_entries: int = Field(..., description="Prompt embeddings indexed by this worker.")
+    hit_rate: float
+    saved_seconds: float = Field(..., description="Generation time of the reused answers, less the lookup time.")
+    lookups: int
+    exact_hits: int
+    semantic_hits: int
+    misses: int
+    stores: int
+    errors: int = Field(..., description="Failed prompt embeddings; those lookups skipped the semantic tier.")
+
+class RateLimiterStats(BaseModel):
+    enabled: bool
+    backend: str = Field(..., description="'redis', or 'memory' while Redis is unavailable or not configured.")
+    local_buckets: int = Field(..., description="In-process buckets held by this replica.")
+    denied: int
+    redis_fallbacks: int = Field(..., description="Times Redis failed and this replica limited in process.")
+
+class GraphCacheStats(BaseModel):
+    variants: int = Field(..., description="Compiled graph variants held besides the global graph.")
+    max_variants: int
+    compiling: int = Field(..., description="Variants being compiled right now.")
+    default_lookups: int = Field(..., description="Lookups of the global graph; not part of hit_rate.")
+    hits: int
+    misses: int
+    coalesced: int = Field(..., description="Requests that waited for a compilation already in flight.")
+    hit_rate: float = Field(..., description="Share of variant lookups served from the cache.")
+    compiles: int
+    compile_errors: int
+    evictions: int
+    avg_compile_ms: float
+    max_compile_ms: float
@@ -1,7 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 import uuid
 
+from api.core.config import settings
+
 class SimulateStartRequest(BaseModel):
     mode: str
     agent_config: Dict[str, Any]
@@ -21,6 +23,9 @@ class SimulateMessageResponse(BaseModel):
     thinking_time: float
     tokens_used: int
     model: str
+    iterations: Optional[int] = None  # Agent loop iterations used for this turn
+    iteration_latencies: List[float] = Field(default_factory=list)  # Seconds per model call
+    cached: Optional[str] = None  # Response cache tier ("exact" or "semantic") that answered, if any
 
 class SimulateStatusResponse(BaseModel):
     status: str
@@ -28,6 +33,62 @@ class SimulateStatusResponse(BaseModel):
     memory_size: int
     gpu_memory_used: float
 
+class SimulateForkRequest(BaseModel):
+    checkpoint_id: Optional[str] = None  # defaults to the latest checkpoint
+
+class SimulateForkResponse(BaseModel):
+    session_id: uuid.UUID
+    forked_from: uuid.UUID
+    checkpoint_id: str
+    affinity_key: str  # root session of the fork tree; forks share it to reuse the cached prompt prefix
+    fork_ms: float
+
+class HistoryTurn(BaseModel):
+    index: int  # position of the turn in the conversation, from 0
+    user: str
+    ai: str
+
+class SimulateHistoryResponse(BaseModel):
+    turns: List[HistoryTurn]  # oldest first
+    total: int  # turns in the conversation
+    next_before: Optional[int] = None  # pass as ``before`` for the preceding page; None at the start
+
+class SessionExportResponse(BaseModel):
+    session_id: str
+    status: str
+    format: str
+    path: Optional[str] = None
+    records: int = 0
+    error: Optional[str] = None
+
+class BulkExportRequest(BaseModel):
+    session_ids: List[uuid.UUID] = Field(min_length=1, max_length=settings.EXPORT_MAX_SESSIONS)
+    format: Literal["ndjson", "parquet"] = "ndjson"
+    # Defaults to, and is capped at, EXPORT_MAX_CONCURRENCY
+    concurrency: Optional[int] = Field(default=None, ge=1, le=settings.EXPORT_MAX_CONCURRENCY)
+
+class BulkExportResponse(BaseModel):
+    exports: List[SessionExportResponse]
+    succeeded: int
+    failed: int
+
+class JobSubmitResponse(BaseModel):
+    job_id: uuid.UUID
+    session_id: uuid.UUID
+    status: str
+    status_url: str
+    events_url: str  # SSE stream of the job's events; resumable with Last-Event-ID
+
+class JobStatusResponse(BaseModel):
+    job_id: uuid.UUID
+    session_id: uuid.UUID
+    status: Literal["queued", "running", "done", "failed"]
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[SimulateMessageResponse] = None
+    error: Optional[str] = None
+
 class MemoryMessage(BaseModel):
     role: str
     content: str
@@ -0,0 +1,57 @@
+"""Job worker process: runs message jobs queued in Redis by the API.
+
+    JOB_BACKEND=redis python -m api.worker
+
+Each process runs JOB_WORKER_CONCURRENCY jobs at a time; scale the number
+of processes with LLM capacity, independently of the API replicas. Workers
+read the sessions and checkpoints the API writes, so SESSION_BACKEND and
+CHECKPOINT_BACKEND have to be shared (redis) too. SIGTERM stops claiming
+and gives running jobs JOB_SHUTDOWN_GRACE_SECONDS to finish.
+"""
+import asyncio
+import logging
+import signal
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+from api.core.config import settings
+from api.logic.conversation_graph import compile_global_graph, open_checkpointer
+from api.logic.jobs import JobWorkers
+from api.services.job_queue import job_queue
+from api.services.kv_slots import kv_slots
+from api.services.page_fetcher import page_fetcher
+from api.services.redis_client import redis_client
+
+
+async def main():
+    if job_queue.backend != "redis":
+        logger.warning("JOB_BACKEND is not redis: this worker only sees jobs queued in its own process")
+    if settings.SESSION_BACKEND != "redis" or settings.CHECKPOINT_BACKEND != "redis":
+        logger.warning("Sessions or checkpoints are not in Redis; workers will not see the API's sessions")
+
+    checkpointer = await open_checkpointer()
+    workers = JobWorkers(job_queue)
+    try:
+        if settings.KV_SLOTS_ENABLED:
+            await kv_slots.start()
+        compile_global_graph(checkpointer)  # type: ignore[arg-type]
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        workers.start()
+        await stop.wait()
+        logger.info("Shutting down job worker...")
+    finally:
+        await workers.stop()
+        if checkpointer is not None:
+            await checkpointer.close()
+        await kv_slots.close()
+        await page_fetcher.close()
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
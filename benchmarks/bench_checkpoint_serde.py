@@ -0,0 +1,107 @@
+"""Checkpoint storage per turn and load time for long conversations.
+
+Usage:
+    python -m benchmarks.bench_checkpoint_serde [--sessions 5] [--turns 200]
+
+Every turn appends a human message, an AI tool call, a tool result and the
+AI answer to ``messages``, as the agent graph does, and saves a checkpoint.
+Compares the stock saver/serializer with the compact serializer, with and
+without per-thread message dedup. Retention is disabled so all checkpoints
+are kept.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import aiosqlite
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from api.services.checkpoint_serde import CompactCheckpointSerializer
+from api.services.checkpoint_store import TunedSqliteSaver
+
+# Random words rather than repeated filler, so compression ratios resemble real text
+_rng = random.Random(42)
+_VOCABULARY = ["".join(_rng.choices("abcdefghijklmnopqrstuvwxyz", k=_rng.randint(2, 10))) for _ in range(5000)]
+
+
+def text(words: int) -> str:
+    return " ".join(_rng.choices(_VOCABULARY, k=words))
+
+
+def turn_messages(session: int, turn: int):
+    call_id = f"call-{session}-{turn}"
+    return [
+        HumanMessage(f"Question {turn}: what changed in release {turn}?", id=f"h-{session}-{turn}"),
+        AIMessage("", id=f"a1-{session}-{turn}", tool_calls=[
+            {"name": "web_search", "args": {"query": f"release {turn} changes"}, "id": call_id}]),
+        ToolMessage("\n".join(f"{i}. {text(40)} https://example.com/{turn}/{i}" for i in range(1, 6)),
+                    tool_call_id=call_id, id=f"t-{session}-{turn}", name="web_search"),
+        AIMessage(text(120), id=f"a2-{session}-{turn}", response_metadata={
+            "model": "llama3", "done": True, "total_duration": 1234567890, "eval_count": 256}),
+    ]
+
+
+async def run(label, saver, sessions: int, turns: int, path: str):
+    write_ms = []
+    for session in range(sessions):
+        config = {"configurable": {"thread_id": f"s{session}", "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        messages = []
+        for turn in range(turns):
+            messages = messages + turn_messages(session, turn)
+            checkpoint = create_checkpoint(checkpoint, None, turn)
+            checkpoint["channel_values"] = {"messages": messages, "iterations": 1, "user_id": "bench"}
+            started = time.perf_counter()
+            config = await saver.aput(config, checkpoint, {"step": turn}, {})
+            write_ms.append((time.perf_counter() - started) * 1000)
+
+    load_ms = []
+    for _ in range(10):
+        for session in range(sessions):
+            started = time.perf_counter()
+            loaded = await saver.aget_tuple({"configurable": {"thread_id": f"s{session}"}})
+            load_ms.append((time.perf_counter() - started) * 1000)
+    assert len(loaded.checkpoint["channel_values"]["messages"]) == turns * 4
+
+    await saver.conn.commit()
+    async with saver.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cursor:
+        await cursor.fetchall()
+    size = os.path.getsize(path)
+    print(f"{label:<36} {size / (sessions * turns) / 1024:9.1f} KiB/turn {size / 1e6:9.1f} MB   "
+          f"write p50 {statistics.median(write_ms):6.2f} ms   load p50 {statistics.median(load_ms):6.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    print(f"{args.sessions} sessions x {args.turns} turns (4 messages per turn), latest checkpoint load time")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stock.sqlite")
+        conn = await aiosqlite.connect(path)
+        await run("stock (JsonPlusSerializer)", AsyncSqliteSaver(conn), args.sessions, args.turns, path)
+        await conn.close()
+
+        variants = [
+            ("compact serializer", dict(dedup_messages=False)),
+            ("compact serializer + message dedup", dict(dedup_messages=True)),
+        ]
+        for label, options in variants:
+            path = os.path.join(tmp, f"{label}.sqlite")
+            saver = await TunedSqliteSaver.open(
+                path, keep_last=0, thread_ttl_seconds=0, serde=CompactCheckpointSerializer(), **options
+            )
+            await run(label, saver, args.sessions, args.turns, path)
+            await saver.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""Checkpoint write/read latency: default AsyncSqliteSaver vs TunedSqliteSaver vs Redis.
+
+Usage:
+    python -m benchmarks.bench_checkpointer [--threads 200] [--turns 30] [--concurrency 16]
+        [--redis-url redis://localhost:6379 | --fakeredis]
+
+Each simulated thread grows a conversation turn by turn, so checkpoints get
+larger as the run goes on, like real sessions. Reads are issued concurrently
+with writes to show the effect of the separate reader connection. The tuned
+store then runs one retention pass and reports the DB size before and after.
+The Redis checkpointer is included when ``--redis-url`` or ``--fakeredis`` is
+given (fakeredis only checks the harness; it has no network round trip).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import aiosqlite
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from api.services.checkpoint_store import TunedSqliteSaver
+from api.services.redis_checkpointer import RedisCheckpointSaver
+from api.services.redis_client import RedisClient
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def report(label, samples):
+    print(f"  {label:<8} n={len(samples):<6} p50 {statistics.median(samples):7.2f} ms   "
+          f"p95 {percentile(samples, 0.95):7.2f} ms   p99 {percentile(samples, 0.99):7.2f} ms")
+
+
+async def run(saver, threads: int, turns: int, concurrency: int):
+    writes, reads = [], []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def conversation(n: int):
+        config = {"configurable": {"thread_id": f"bench-{n}", "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        messages = []
+        for turn in range(turns):
+            messages = messages + [f"user turn {turn} " + "x" * 200, f"assistant turn {turn} " + "y" * 600]
+            checkpoint = create_checkpoint(checkpoint, None, turn)
+            checkpoint["channel_values"] = {"messages": messages}
+            async with gate:
+                started = time.perf_counter()
+                config = await saver.aput(config, checkpoint, {"step": turn}, {})
+                writes.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                await saver.aget_tuple({"configurable": {"thread_id": f"bench-{n}"}})
+                reads.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(conversation(n) for n in range(threads)))
+    elapsed = time.perf_counter() - started
+    report("write", writes)
+    report("read", reads)
+    print(f"  {threads * turns / elapsed:,.0f} checkpoints/s overall")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--keep-last", type=int, default=5)
+    parser.add_argument("--redis-url")
+    parser.add_argument("--fakeredis", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.threads} threads x {args.turns} turns, {args.concurrency} concurrent")
+
+        print("AsyncSqliteSaver (single connection, default pragmas)")
+        conn = await aiosqlite.connect(os.path.join(tmp, "default.sqlite"))
+        await run(AsyncSqliteSaver(conn), args.threads, args.turns, args.concurrency)
+        await conn.close()
+
+        print("TunedSqliteSaver (WAL, synchronous=NORMAL, reader + writer connections)")
+        path = os.path.join(tmp, "tuned.sqlite")
+        saver = await TunedSqliteSaver.open(path, keep_last=args.keep_last)
+        await run(saver, args.threads, args.turns, args.concurrency)
+
+        before = await saver.stats()
+        result = await saver.prune()
+        after = await saver.stats()
+        print(f"  retention (keep_last={args.keep_last}): removed {result['checkpoints_removed']} checkpoints "
+              f"in {result['duration_ms']:.0f} ms; DB {before['db_bytes'] / 1e6:.1f} MB -> "
+              f"{after['db_bytes'] / 1e6:.1f} MB ({after['free_bytes'] / 1e6:.1f} MB still free)")
+        await saver.close()
+
+    if args.redis_url or args.fakeredis:
+        client = RedisClient(url=args.redis_url or "redis://localhost:6379")
+        if args.fakeredis:
+            import fakeredis
+            client.client = fakeredis.FakeAsyncRedis()
+        print(f"RedisCheckpointSaver (keep_last={args.keep_last}, trimmed on write)")
+        saver = RedisCheckpointSaver(client, keep_last=args.keep_last, ttl_seconds=3600)
+        await run(saver, args.threads, args.turns, args.concurrency)
+        for n in range(args.threads):
+            await saver.adelete_thread(f"bench-{n}")
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
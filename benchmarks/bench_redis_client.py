@@ -0,0 +1,93 @@
+"""Compare the old Redis path (stdlib json, one round trip per key) with RedisClient.
+
+Usage:
+    python -m benchmarks.bench_redis_client [--url redis://localhost:6379] [--keys 1000]
+
+Pass ``--fakeredis`` to run against an in-process fakeredis server (checks the
+harness works; numbers are not representative of a real network round trip).
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import redis.asyncio as redis
+
+from api.core.config import settings
+from api.services.redis_client import RedisClient, RedisCodec
+
+
+def search_payload(i: int):
+    # Shaped like a cached web_search result
+    return [
+        {"snippet": f"Result {i}-{j}: " + "lorem ipsum dolor sit amet " * 12, "link": f"https://example.com/{i}/{j}"}
+        for j in range(5)
+    ]
+
+
+async def timed(label, coro_factory, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - started) * 1000)
+    print(f"  {label:<34} median {statistics.median(samples):8.2f} ms   best {min(samples):8.2f} ms")
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=settings.REDIS_URL)
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--fakeredis", action="store_true")
+    args = parser.parse_args()
+
+    keys = [f"bench:redis:{i}" for i in range(args.keys)]
+    values = {k: search_payload(i) for i, k in enumerate(keys)}
+
+    if args.fakeredis:
+        import fakeredis
+        server = fakeredis.FakeServer()
+        legacy = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        clients = {}
+        for fmt in ("json", "msgpack"):
+            client = RedisClient(url=args.url, codec=RedisCodec(format=fmt))
+            client.client = fakeredis.FakeAsyncRedis(server=server)
+            clients[fmt] = client
+    else:
+        legacy = redis.from_url(args.url, decode_responses=True)
+        clients = {fmt: RedisClient(url=args.url, codec=RedisCodec(format=fmt)) for fmt in ("json", "msgpack")}
+
+    print(f"{args.keys} keys, {len(json.dumps(values[keys[0]]))} bytes of JSON per value")
+
+    async def legacy_set():
+        for k, v in values.items():
+            await legacy.set(k, json.dumps(v), ex=300)
+
+    async def legacy_get():
+        for k in keys:
+            value = await legacy.get(k)
+            json.loads(value) if value else None
+
+    print("legacy (json + one command per key)")
+    base_set = await timed("set", legacy_set, args.rounds)
+    base_get = await timed("get", legacy_get, args.rounds)
+    legacy_bytes = len(json.dumps(values[keys[0]]).encode())
+
+    for fmt, client in clients.items():
+        print(f"RedisClient codec={fmt} (zstd >= {client.codec.compress_threshold} bytes)")
+        new_set = await timed("mset (pipelined SET EX)", lambda: client.mset(values, ttl_seconds=300), args.rounds)
+        new_get = await timed("mget", lambda: client.mget(keys), args.rounds)
+        encoded_bytes = len(client.encode(values[keys[0]]))
+        print(f"  speedup: set x{base_set / new_set:.1f}, get x{base_get / new_get:.1f}; "
+              f"value size {encoded_bytes} vs {legacy_bytes} bytes")
+        await client.delete(*keys)
+        await client.close()
+
+    await legacy.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""Request CPU time with FastAPI's default encoding vs the orjson/trusted response layer.
+
+Usage:
+    python -m benchmarks.bench_responses [--memories 1000] [--requests 200]
+
+Runs the API in-process with a stand-in chat model that answers at once and
+a stand-in mem0 returning ``--memories`` memories. "default" serves the same
+handlers the old way: a model per memory, re-validation against
+``response_model`` and ``JSONResponse``; "fast" is the app as shipped. CPU
+time per request (process time, client included) is reported for the
+message and memory list endpoints, then the memory list size per encoding.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+from langchain_core.messages import AIMessage
+
+from api.v1.schemas.simulate import MemoryListResponse, MemoryResponse, SimulateMessageRequest, SimulateMessageResponse
+
+
+class FakeChatModel:
+    def __init__(self, **_):
+        pass
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        return AIMessage(content="answer " + "lorem ipsum " * 60)
+
+
+def fake_memories(count: int):
+    return [
+        {"id": str(uuid.uuid4()), "text": f"The user mentioned preference {n}: " + "lorem ipsum dolor " * 6,
+         "user_id": "bench", "timestamp": "2024-05-01T12:00:00Z", "metadata": {"source": "chat", "turn": n}}
+        for n in range(count)
+    ]
+
+
+def default_app() -> FastAPI:
+    """The same handlers served through FastAPI's default encoding, as before the response layer."""
+    from api.core.deadline import deadline_scope
+    from api.logic import turns
+    from api.services.memory_client import memory_client
+    from api.services.session_manager import session_manager
+    from api.v1.endpoints import simulate
+
+    app = FastAPI()
+
+    @app.post("/api/v1/simulate/{session_id}/message", response_model=SimulateMessageResponse)
+    async def post_message(session_id: uuid.UUID, request: SimulateMessageRequest):
+        session = await session_manager.get_session(session_id)
+        deadline = turns.request_deadline(None, session)
+        with deadline_scope(deadline):
+            return await simulate._handle_message(session_id, session, request, False, deadline)
+
+    @app.get("/api/v1/simulate/{session_id}/memory", response_model=MemoryListResponse)
+    async def get_all_user_memories(session_id: uuid.UUID):
+        session = await session_manager.get_session(session_id)
+        memories_data = await memory_client.get_all_memories(user_id=session['user_id'])
+        return MemoryListResponse(memories=[MemoryResponse(**mem) for mem in memories_data])
+
+    return app
+
+
+async def cpu_per_request(client, method, url, requests, **kwargs):
+    samples = []
+    for _ in range(requests):
+        started = time.process_time()
+        response = await client.request(method, url, **kwargs)
+        response.raise_for_status()
+        samples.append((time.process_time() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--memories", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(CHECKPOINT_BACKEND="sqlite", CHECKPOINT_DB_PATH=os.path.join(tmp, "cp.sqlite"),
+                      SESSION_BACKEND="memory")
+    from api.logic import graph_nodes
+    from api.main import app
+    from api.services.memory_client import memory_client
+    graph_nodes.ChatOllama = FakeChatModel
+    memories = fake_memories(args.memories)
+
+    async def get_all_memories(user_id):
+        return memories
+
+    memory_client.get_all_memories = get_all_memories
+
+    apps = {"default": default_app(), "fast": app}
+    async with app.router.lifespan_context(app):
+        clients = {
+            name: httpx.AsyncClient(transport=httpx.ASGITransport(app=served), base_url="http://bench", timeout=None)
+            for name, served in apps.items()
+        }
+        identity = {"Accept-Encoding": "identity"}
+        print(f"CPU ms per request (median of {args.requests}), {args.memories} memories")
+        for name, client in clients.items():
+            # A session per variant, so both see conversations of the same length
+            start = await clients["fast"].post("/api/v1/simulate/start", json={"user_id": "bench", "mode": "bench", "agent_config": {}})
+            session_id = start.json()["session_id"]
+            message = await cpu_per_request(client, "POST", f"/api/v1/simulate/{session_id}/message",
+                                            args.requests, json={"content": "hello"}, headers=identity)
+            listed = await cpu_per_request(client, "GET", f"/api/v1/simulate/{session_id}/memory",
+                                           args.requests, headers=identity)
+            print(f"  {name:<8} message {message:8.2f} ms   memory list {listed:8.2f} ms")
+
+        print("Memory list body size")
+        for encoding in ("identity", "gzip", "br"):
+            response = await clients["fast"].get(f"/api/v1/simulate/{session_id}/memory", headers={"Accept-Encoding": encoding})
+            sent = int(response.headers["content-length"])
+            used = response.headers.get("content-encoding", "identity")
+            print(f"  {encoding:<8} {sent:>10,} bytes  (sent as {used})")
+        for client in clients.values():
+            await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""Forking a session from its checkpoint vs replaying the conversation.
+
+Usage:
+    python -m benchmarks.bench_session_fork [--turns 50] [--llm-ms 200] [--prefill-chars-per-s 20000]
+
+Runs the API in-process with the SQLite checkpointer and a stand-in chat
+model whose latency is ``--llm-ms`` plus prompt evaluation of the whole
+conversation at ``--prefill-chars-per-s`` (a llama.cpp server without a
+warm prompt cache). A session of ``--turns`` turns is built once. A
+variant is then created twice: by replaying every turn into a new session,
+and with ``POST /simulate/{id}/fork``. The first new turn is timed on both.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from langchain_core.messages import AIMessage
+
+
+class FakeChatModel:
+    llm_ms = 200.0
+    prefill_chars_per_s = 20000.0
+
+    def __init__(self, **_):
+        pass
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        await asyncio.sleep(self.llm_ms / 1000 + prompt_chars / self.prefill_chars_per_s)
+        return AIMessage(content="answer " + "lorem ipsum " * 40)
+
+
+async def post_turn(client, session_id, turn):
+    started = time.perf_counter()
+    response = await client.post(f"/api/v1/simulate/{session_id}/message", json={"content": f"question {turn} " * 20})
+    response.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def new_session(client):
+    response = await client.post("/api/v1/simulate/start", json={"user_id": "bench", "mode": "bench", "agent_config": {}})
+    return response.json()["session_id"]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--llm-ms", type=float, default=200)
+    parser.add_argument("--prefill-chars-per-s", type=float, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(CHECKPOINT_BACKEND="sqlite", CHECKPOINT_DB_PATH=os.path.join(tmp, "cp.sqlite"),
+                      SESSION_BACKEND="memory")
+    from api.logic import graph_nodes
+    from api.main import app
+    FakeChatModel.llm_ms, FakeChatModel.prefill_chars_per_s = args.llm_ms, args.prefill_chars_per_s
+    graph_nodes.ChatOllama = FakeChatModel
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+            source = await new_session(client)
+            for turn in range(args.turns):
+                await post_turn(client, source, turn)
+            print(f"{args.turns}-turn source session, LLM {args.llm_ms:.0f} ms + prompt eval "
+                  f"at {args.prefill_chars_per_s:,.0f} chars/s")
+
+            replay_ms, replay_first, fork_ms, fork_first = [], [], [], []
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                replayed = await new_session(client)
+                for turn in range(args.turns):
+                    await post_turn(client, replayed, turn)
+                replay_ms.append((time.perf_counter() - started) * 1000)
+                replay_first.append(await post_turn(client, replayed, "next"))
+
+                started = time.perf_counter()
+                response = await client.post(f"/api/v1/simulate/{source}/fork")
+                response.raise_for_status()
+                fork_ms.append((time.perf_counter() - started) * 1000)
+                fork_first.append(await post_turn(client, response.json()["session_id"], "next"))
+
+    print(f"  {'replay':<6} create {statistics.median(replay_ms):10.1f} ms   first turn {statistics.median(replay_first):8.1f} ms")
+    print(f"  {'fork':<6} create {statistics.median(fork_ms):10.1f} ms   first turn {statistics.median(fork_first):8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -16,8 +16,6 @@ from pathlib import Path
 import pytest
 
 
-
-
 PROJECT_ROOT = Path(__file__).resolve().parent
 
 def _start_server() -> subprocess.Popen:
@@ -73,3 +71,14 @@ def fastapi_server():
         proc.wait(timeout=5)
     except subprocess.TimeoutExpired:
         proc.kill()
+
+
+@pytest.fixture
+def fake_redis():
+    """A RedisClient whose connection is an in-process fakeredis server."""
+    fakeredis = pytest.importorskip("fakeredis")
+    from api.services.redis_client import RedisClient
+
+    client = RedisClient(url="redis://localhost:6379")
+    client.client = fakeredis.FakeAsyncRedis()
+    return client
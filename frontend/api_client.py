@@ -1,37 +1,121 @@
+import os
+from typing import Any, Dict, Iterator, Optional, Tuple
+
 import httpx
+import orjson
 import streamlit as st
 
-# The backend URL is determined by the Docker Compose service name
-BACKEND_URL = "http://api:8001"
+# The backend URL defaults to the Docker Compose service name; set BACKEND_URL to go through nginx
+BACKEND_URL = os.getenv("BACKEND_URL", "http://api:8001")
+
+# Total latency budget per chat turn; the backend fits every stage into it
+REQUEST_TIMEOUT_SECONDS = 120
+# Older turns are fetched from the backend in pages of this many turns
+HISTORY_PAGE_TURNS = 10
+# A dropped stream is resumed from its last event this many times (the turn keeps running server-side)
+STREAM_RESUMES = 2
+
+
+@st.cache_resource
+def get_client() -> httpx.Client:
+    """One HTTP client for the whole app: its connection pool survives reruns and is shared by sessions."""
+    # Reads wait past the backend's own deadline, so it can report a 504 itself
+    return httpx.Client(
+        base_url=BACKEND_URL,
+        timeout=httpx.Timeout(10.0, read=REQUEST_TIMEOUT_SECONDS + 10),
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+    )
 
-async def start_simulation(user_id: str, mode: str = "human-ai"):
+
+def start_simulation(user_id: str, mode: str = "human-ai") -> Optional[Dict[str, Any]]:
     """Calls the backend to start a new simulation session."""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{BACKEND_URL}/api/v1/simulate/start",
-                json={"user_id": user_id, "mode": mode, "agent_config": {}},
-            )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            st.error(f"HTTP error starting simulation: {e.response.status_code} - {e.response.text}")
-        except httpx.RequestError as e:
-            st.error(f"Error connecting to backend: {e}")
-        return None
-
-async def post_message(session_id: str, message: str):
-    """Sends a message to the backend and gets the AI's response."""
-    async with httpx.AsyncClient(timeout=300.0) as client:
+    try:
+        response = get_client().post(
+            "/api/v1/simulate/start",
+            json={"user_id": user_id, "mode": mode, "agent_config": {}},
+        )
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        st.error(f"HTTP error starting simulation: {e.response.status_code} - {e.response.text}")
+    except httpx.RequestError as e:
+        st.error(f"Error connecting to backend: {e}")
+    return None
+
+
+@st.cache_data(ttl=600, max_entries=200, show_spinner=False)
+def _history_page(session_id: str, before: int, limit: int) -> Dict[str, Any]:
+    # Turns before a given index never change, so pages are cached across reruns and sessions
+    response = get_client().get(
+        f"/api/v1/simulate/{session_id}/history",
+        params={"before": before, "limit": limit},
+        headers={"X-Session-ID": session_id},
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def get_history_page(session_id: str, before: int, limit: int = HISTORY_PAGE_TURNS) -> Optional[Dict[str, Any]]:
+    """Up to ``limit`` turns preceding turn ``before``, oldest first (``turns``, ``total``, ``next_before``)."""
+    try:
+        return _history_page(session_id, before, limit)
+    except httpx.HTTPStatusError as e:
+        st.error(f"HTTP error loading history: {e.response.status_code} - {e.response.text}")
+    except httpx.RequestError as e:
+        st.error(f"Error connecting to backend: {e}")
+    return None
+
+
+def _sse_events(response: httpx.Response) -> Iterator[Tuple[Optional[str], Dict[str, Any]]]:
+    """Parse a text/event-stream body into (event id, event) pairs."""
+    event_id, data = None, []
+    for line in response.iter_lines():
+        if not line:
+            if data:
+                yield event_id, orjson.loads("\n".join(data))
+            event_id, data = None, []
+        elif line.startswith(":"):
+            continue  # keep-alive comment
+        elif line.startswith("id:"):
+            event_id = line[3:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+
+def stream_message(session_id: str, message: str) -> Iterator[Dict[str, Any]]:
+    """Send a message and yield the turn's events (``token``, ``tool_start``, ..., ``done`` or ``error``).
+
+    If the connection drops mid-turn, the stream is resumed from the last
+    event received instead of sending the message again.
+    """
+    client = get_client()
+    headers = {"X-Request-Timeout": str(REQUEST_TIMEOUT_SECONDS), "X-Session-ID": session_id}
+    last_id = None
+    for attempt in range(1 + STREAM_RESUMES):
         try:
-            response = await client.post(
-                f"{BACKEND_URL}/api/v1/simulate/{session_id}/message",
-                json={"content": message},
-            )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            st.error(f"HTTP error sending message: {e.response.status_code} - {e.response.text}")
-        except httpx.RequestError as e:
-            st.error(f"Error connecting to backend: {e}")
-        return None
+            if last_id is None:
+                request = client.stream(
+                    "POST", f"/api/v1/simulate/{session_id}/message",
+                    params={"stream": "true"}, json={"content": message}, headers=headers,
+                )
+            else:
+                request = client.stream(
+                    "GET", f"/api/v1/simulate/{session_id}/stream",
+                    headers={**headers, "Last-Event-ID": last_id},
+                )
+            with request as response:
+                if response.status_code >= 400:
+                    response.read()
+                    yield {"type": "error", "status": response.status_code, "detail": response.text}
+                    return
+                for event_id, event in _sse_events(response):
+                    last_id = event_id or last_id
+                    yield event
+                    if event["type"] in ("done", "error"):
+                        return
+        except (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError) as e:
+            # Nothing received yet: the message may not have arrived, and resending could answer it twice
+            if last_id is None or attempt == STREAM_RESUMES:
+                yield {"type": "error", "status": 0, "detail": f"Error connecting to backend: {e}"}
+                return
+    yield {"type": "error", "status": 0, "detail": "The stream ended before the answer was complete"}
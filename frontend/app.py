@@ -1,6 +1,10 @@
+import time
+
 import streamlit as st
-import asyncio
-from api_client import start_simulation, post_message
+from api_client import HISTORY_PAGE_TURNS, get_history_page, start_simulation, stream_message
+
+# Turns kept in session state and rendered in full; older ones are paged from the backend
+RECENT_TURNS = 10
 
 st.set_page_config(page_title="Local LLM Simulator", layout="wide")
 
@@ -13,6 +17,8 @@ user_id = st.sidebar.text_input("Enter your User ID", value="default-user")
 if st.sidebar.button("Clear Conversation"):
     st.session_state.messages = []
     st.session_state.session_id = None
+    st.session_state.first_turn = 0
+    st.session_state.older_pages = 0
 
 # --- Main Chat Interface ---
 
@@ -21,11 +27,62 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "session_id" not in st.session_state:
     st.session_state.session_id = None
+if "first_turn" not in st.session_state:
+    st.session_state.first_turn = 0  # conversation index of the oldest turn in messages
+if "older_pages" not in st.session_state:
+    st.session_state.older_pages = 0  # pages of older turns the user asked for
+
+
+def latency_caption(message):
+    """Time to first token and total latency of an assistant reply."""
+    ttft = message.get("ttft")
+    first = f"first token {ttft:.2f}s" if ttft is not None else "no tokens streamed"
+    return f"⏱ {first} · total {message['total']:.2f}s"
+
+
+@st.cache_data(max_entries=200, show_spinner=False)
+def turns_markdown(session_id, before, limit, _page):
+    """One markdown block for a page of older turns, built once per page (``_page`` is not hashed)."""
+    return "\n\n---\n\n".join(
+        f"**You:** {turn['user']}\n\n**Assistant:** {turn['ai']}" for turn in _page["turns"]
+    )
 
-# Display chat messages from history
+
+def trim_messages():
+    """Keep only the last RECENT_TURNS turns in session state."""
+    messages = st.session_state.messages
+    while sum(message["role"] == "user" for message in messages) > RECENT_TURNS:
+        messages.pop(0)
+        while messages and messages[0]["role"] != "user":
+            messages.pop(0)
+        st.session_state.first_turn += 1
+
+
+# Older turns: loaded a page at a time on request, each page collapsed into one expander
+end = st.session_state.first_turn
+if end and st.session_state.session_id:
+    pages = []
+    for _ in range(st.session_state.older_pages):
+        start = max(0, end - HISTORY_PAGE_TURNS)
+        pages.append((start, end))
+        end = start
+        if not end:
+            break
+    if end and st.button(f"Load earlier turns ({end} more)"):
+        st.session_state.older_pages += 1
+        st.rerun()
+    for start, stop in reversed(pages):
+        with st.expander(f"Turns {start + 1}–{stop}"):
+            page = get_history_page(st.session_state.session_id, stop, stop - start)
+            if page is not None:
+                st.markdown(turns_markdown(st.session_state.session_id, stop, stop - start, page))
+
+# Display the recent turns in full
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if "total" in message:
+            st.caption(latency_caption(message))
 
 # Accept user input
 if prompt := st.chat_input("What would you like to discuss?"):
@@ -37,28 +94,47 @@ if prompt := st.chat_input("What would you like to discuss?"):
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Get AI response
+        # Stream the AI response
         with st.chat_message("assistant"):
             message_placeholder = st.empty()
+            status_placeholder = st.empty()
             message_placeholder.markdown("Thinking...")
 
-            async def get_ai_response():
-                # Start a new session if one doesn't exist
-                if not st.session_state.session_id:
-                    sim_start_response = await start_simulation(user_id)
-                    if sim_start_response:
-                        st.session_state.session_id = sim_start_response.get("session_id")
-                    else:
-                        message_placeholder.error("Failed to start a new simulation session.")
-                        return
-
-                # Post the message to the backend
-                ai_response = await post_message(st.session_state.session_id, prompt)
-                if ai_response:
-                    message_placeholder.markdown(ai_response.get("response"))
-                    st.session_state.messages.append({"role": "assistant", "content": ai_response.get("response")})
-                else:
-                    message_placeholder.error("Failed to get a response from the backend.")
-
-            # Run the async function
-            asyncio.run(get_ai_response())
+            # Start a new session if one doesn't exist
+            if not st.session_state.session_id:
+                sim_start_response = start_simulation(user_id)
+                if sim_start_response:
+                    st.session_state.session_id = sim_start_response.get("session_id")
+
+            if not st.session_state.session_id:
+                message_placeholder.error("Failed to start a new simulation session.")
+            else:
+                started = time.perf_counter()
+                ttft = None
+                text = ""
+                reply = None
+                for event in stream_message(st.session_state.session_id, prompt):
+                    kind = event.get("type")
+                    if kind == "token":
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        text += event.get("content", "")
+                        message_placeholder.markdown(text + "▌")
+                    elif kind == "tool_start":
+                        status_placeholder.caption(f"🔧 Running {event.get('name')}...")
+                    elif kind == "tool_end":
+                        status_placeholder.empty()
+                    elif kind == "done":
+                        # The final answer is authoritative; streamed tokens may include tool-call turns
+                        reply = event.get("response") or text
+                    elif kind == "error":
+                        status_placeholder.empty()
+                        message_placeholder.error(f"Backend error ({event.get('status')}): {event.get('detail')}")
+
+                if reply is not None:
+                    message = {"role": "assistant", "content": reply, "ttft": ttft,
+                               "total": time.perf_counter() - started}
+                    message_placeholder.markdown(reply)
+                    status_placeholder.caption(latency_caption(message))
+                    st.session_state.messages.append(message)
+                    trim_messages()
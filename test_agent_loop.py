@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from api.logic import conversation_graph, graph_nodes
+
+
+class ScriptedModel:
+    """Chat model double: asks for tools while they are bound, then answers."""
+
+    def __init__(self, tools_per_call=2):
+        self.tools_per_call = tools_per_call
+        self.calls = []
+
+    def bind_tools(self, tools, **_):
+        bound = ScriptedModel(self.tools_per_call)
+        bound.calls = self.calls
+        bound.with_tools = True
+        return bound
+
+    async def ainvoke(self, messages):
+        with_tools = getattr(self, "with_tools", False)
+        self.calls.append(with_tools)
+        if with_tools:
+            return AIMessage(content="", tool_calls=[
+                {"name": "slow_tool", "args": {"query": f"q{len(self.calls)}-{i}"}, "id": f"call-{len(self.calls)}-{i}"}
+                for i in range(self.tools_per_call)
+            ])
+        return AIMessage(content="final answer")
+
+
+@tool
+async def slow_tool(query: str):
+    """Sleeps briefly and echoes the query."""
+    await asyncio.sleep(0.2)
+    return [{"snippet": f"result for {query}", "link": f"https://example.com/{query}"}]
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    calls = []
+
+    def factory(**_):
+        model = ScriptedModel()
+        model.calls = calls
+        return model
+
+    monkeypatch.setattr(graph_nodes, "ChatOllama", factory)
+    monkeypatch.setattr(graph_nodes, "tools", [slow_tool])
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_loop_runs_tools_then_answers_without_them(scripted):
+    graph = conversation_graph.workflow.compile()
+    result = await graph.ainvoke({
+        "messages": [HumanMessage(content="hi")],
+        "agent_config": {"max_tool_iterations": 2},
+    })
+
+    assert scripted == [True, True, False]
+    assert result["messages"][-1].content == "final answer"
+    assert result["iterations"] == 3
+    assert len(result["iteration_latencies"]) == 3
+    assert sum(isinstance(m, ToolMessage) for m in result["messages"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_concurrently(scripted):
+    message = await ScriptedModel(tools_per_call=5).bind_tools([]).ainvoke([])
+    state = {"messages": [message], "iterations": 1, "agent_config": {}}
+
+    started = asyncio.get_running_loop().time()
+    result = await graph_nodes.call_tool(state)
+    elapsed = asyncio.get_running_loop().time() - started
+
+    assert len(result["messages"]) == 5
+    assert elapsed < 0.8  # five 0.2s tools in parallel, not in sequence
+
+
+@pytest.mark.asyncio
+async def test_wall_time_budget_skips_tools(scripted):
+    message = await ScriptedModel().bind_tools([]).ainvoke([])
+    state = {
+        "messages": [message],
+        "iterations": 1,
+        "turn_started_at": 0.0,  # long ago
+        "agent_config": {"max_turn_seconds": 5},
+    }
+    result = await graph_nodes.call_tool(state)
+    assert all("budget" in m.content for m in result["messages"])
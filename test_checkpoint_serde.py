@@ -0,0 +1,40 @@
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from api.services.checkpoint_serde import TYPE_COMPACT, TYPE_COMPACT_ZSTD, CompactCheckpointSerializer
+
+MESSAGES = [
+    SystemMessage("You are helpful."),
+    HumanMessage("Find the release notes", id="h1"),
+    AIMessage("", id="a1", tool_calls=[{"name": "web_search", "args": {"query": "notes"}, "id": "c1"}]),
+    ToolMessage("1. result https://example.com", tool_call_id="c1", id="t1", name="web_search"),
+    AIMessage("Here they are.", id="a2", response_metadata={"model": "llama3", "eval_count": 12}),
+    RemoveMessage(id="h0"),
+]
+
+
+def test_round_trip_is_smaller_than_jsonplus():
+    serde = CompactCheckpointSerializer(compress_threshold=0)
+    value = {"channel_values": {"messages": MESSAGES, "iterations": 2, "seen": {"a", "b"}}}
+    type_, payload = serde.dumps_typed(value)
+
+    assert type_ == TYPE_COMPACT
+    assert serde.loads_typed((type_, payload)) == value
+    assert len(payload) < len(JsonPlusSerializer().dumps_typed(value)[1]) / 2
+
+
+def test_large_blobs_are_compressed():
+    serde = CompactCheckpointSerializer(compress_threshold=1024)
+    value = {"messages": [AIMessage("word " * 2000, id="big")]}
+    type_, payload = serde.dumps_typed(value)
+    assert type_ == TYPE_COMPACT_ZSTD
+    assert len(payload) < 1024
+    assert serde.loads_typed((type_, payload)) == value
+
+
+def test_reads_blobs_written_by_the_stock_serializer():
+    value = {"messages": MESSAGES}
+    assert CompactCheckpointSerializer().loads_typed(JsonPlusSerializer().dumps_typed(value)) == value
+    # compact=False keeps writing the stock format
+    stock = CompactCheckpointSerializer(compact=False)
+    assert JsonPlusSerializer().loads_typed(stock.dumps_typed(value)) == value
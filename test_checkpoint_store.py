@@ -0,0 +1,246 @@
+"""Checkpoint saver behaviour, run against the SQLite and the Redis backends.
+
+The Redis saver runs on the ``fake_redis`` fixture (conftest.py).
+"""
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("aiosqlite")
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+from api.services.checkpoint_store import TunedSqliteSaver, checkpoint_timestamp
+from api.services.redis_checkpointer import RedisCheckpointSaver
+
+
+@pytest_asyncio.fixture(params=["sqlite", "redis"])
+async def make_saver(request, tmp_path):
+    client = request.getfixturevalue("fake_redis") if request.param == "redis" else None
+    opened = []
+
+    async def factory(**kwargs):
+        if client is None:
+            saver = await TunedSqliteSaver.open(tmp_path / "cp.sqlite", **kwargs)
+        else:
+            kwargs.setdefault("ttl_seconds", 60)
+            saver = RedisCheckpointSaver(client, **kwargs)
+        opened.append(saver)
+        return saver
+
+    yield factory
+    for saver in opened:
+        await saver.close()
+
+
+async def apply_retention(saver):
+    # SQLite trims in a background job; Redis trims on every write
+    if isinstance(saver, TunedSqliteSaver):
+        await saver.prune()
+
+
+async def stored_message_count(saver, thread_id):
+    if isinstance(saver, TunedSqliteSaver):
+        async with saver.conn.execute(
+            "SELECT COUNT(*) FROM checkpoint_messages WHERE thread_id = ?", (thread_id,)
+        ) as cur:
+            return (await cur.fetchone())[0]
+    return await saver.redis.client.hlen(saver._keys(thread_id, "")[3])
+
+
+async def put_checkpoints(saver, thread_id, count):
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+    for step in range(count):
+        checkpoint = create_checkpoint(checkpoint, {"messages": [f"{thread_id}-{step}"]}, step)
+        checkpoint["channel_values"] = {"messages": [f"{thread_id}-{step}"]}
+        config = await saver.aput(config, checkpoint, {"step": step}, {})
+        await saver.aput_writes(config, [("messages", f"pending-{step}")], task_id="task")
+    return config
+
+
+@pytest.mark.asyncio
+async def test_read_path(make_saver):
+    saver = await make_saver()
+    config = await put_checkpoints(saver, "t1", 3)
+    await put_checkpoints(saver, "t2", 1)
+
+    latest = await saver.aget_tuple({"configurable": {"thread_id": "t1"}})
+    assert latest.config["configurable"]["checkpoint_id"] == config["configurable"]["checkpoint_id"]
+    assert latest.checkpoint["channel_values"] == {"messages": ["t1-2"]}
+    assert latest.metadata["step"] == 2
+    assert latest.parent_config["configurable"]["checkpoint_id"] is not None
+    assert [w[2] for w in latest.pending_writes] == ["pending-2"]
+
+    history = [c async for c in saver.alist({"configurable": {"thread_id": "t1"}})]
+    assert [c.metadata["step"] for c in history] == [2, 1, 0]
+    older = [c async for c in saver.alist({"configurable": {"thread_id": "t1"}}, before=history[0].config, limit=1)]
+    assert [c.metadata["step"] for c in older] == [1]
+    by_id = await saver.aget_tuple(history[2].config)
+    assert by_id.checkpoint["channel_values"] == {"messages": ["t1-0"]}
+    assert await saver.aget_tuple({"configurable": {"thread_id": "missing"}}) is None
+
+    await saver.adelete_thread("t1")
+    assert await saver.aget_tuple({"configurable": {"thread_id": "t1"}}) is None
+    assert await saver.aget_tuple({"configurable": {"thread_id": "t2"}}) is not None
+
+
+@pytest.mark.asyncio
+async def test_history_is_bounded(make_saver):
+    saver = await make_saver(keep_last=2)
+    await put_checkpoints(saver, "t1", 5)
+    await apply_retention(saver)
+    history = [c async for c in saver.alist({"configurable": {"thread_id": "t1"}})]
+    assert [c.checkpoint["channel_values"]["messages"] for c in history] == [["t1-4"], ["t1-3"]]
+    assert [w[2] for w in history[1].pending_writes] == ["pending-3"]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_tuning(tmp_path):
+    saver = await TunedSqliteSaver.open(tmp_path / "cp.sqlite")
+    try:
+        async with saver.conn.execute("PRAGMA journal_mode") as cur:
+            assert (await cur.fetchone())[0] == "wal"
+        async with saver.conn.execute("PRAGMA auto_vacuum") as cur:
+            assert (await cur.fetchone())[0] == 2  # incremental
+        config = await put_checkpoints(saver, "t1", 1)
+        assert checkpoint_timestamp(config["configurable"]["checkpoint_id"]) == pytest.approx(time.time(), abs=60)
+
+        # The reader connection cannot write
+        with pytest.raises(Exception):
+            await saver.reader_conn.execute("DELETE FROM checkpoints")
+    finally:
+        await saver.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_retention_keeps_last_n_and_drops_idle_threads(tmp_path):
+    saver = await TunedSqliteSaver.open(tmp_path / "cp.sqlite", keep_last=2, thread_ttl_seconds=0)
+    try:
+        await put_checkpoints(saver, "idle", 2)
+        await asyncio.sleep(1.2)
+        await put_checkpoints(saver, "active", 5)
+
+        result = await saver.prune(thread_ttl_seconds=1)
+        assert result["threads_dropped"] == 1
+        assert result["checkpoints_removed"] == 3
+        assert result["writes_removed"] == 3
+
+        stats = await saver.stats()
+        assert stats["threads"] == 1 and stats["checkpoints"] == 2 and stats["writes"] == 2
+        assert stats["last_retention"] == result
+        remaining = [c.checkpoint["channel_values"]["messages"][0]
+                     async for c in saver.alist({"configurable": {"thread_id": "active"}})]
+        assert remaining == ["active-4", "active-3"]
+    finally:
+        await saver.close()
+
+
+@pytest.mark.asyncio
+async def test_messages_are_stored_once_per_thread(make_saver):
+    saver = await make_saver(dedup_messages=True)
+    config = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+    checkpoint, messages = empty_checkpoint(), []
+    for turn in range(10):
+        messages = messages + [HumanMessage(f"q{turn}", id=f"h{turn}"), AIMessage(f"a{turn}", id=f"a{turn}")]
+        checkpoint = create_checkpoint(checkpoint, None, turn)
+        checkpoint["channel_values"] = {"messages": messages, "iterations": turn}
+        config = await saver.aput(config, checkpoint, {"step": turn}, {})
+
+    assert await stored_message_count(saver, "t1") == 20
+
+    latest = await saver.aget_tuple({"configurable": {"thread_id": "t1"}})
+    assert latest.checkpoint["channel_values"] == {"messages": messages, "iterations": 9}
+    history = [c async for c in saver.alist({"configurable": {"thread_id": "t1"}}, limit=3)]
+    assert [len(c.checkpoint["channel_values"]["messages"]) for c in history] == [20, 18, 16]
+
+    await saver.adelete_thread("t1")
+    assert await stored_message_count(saver, "t1") == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_thread_keys_share_the_ttl(make_saver):
+    saver = await make_saver(dedup_messages=True)
+    if not isinstance(saver, RedisCheckpointSaver):
+        pytest.skip("SQLite drops idle threads in the retention job")
+    saver.ttl_seconds = 300
+    config = await put_checkpoints(saver, "t1", 2)
+    keys = [*saver._keys("t1", ""), "checkpoint:{t1}:namespaces",
+            saver._writes_prefix("t1", "") + config["configurable"]["checkpoint_id"]]
+    for key in keys:
+        assert 0 < await saver.redis.client.ttl(key) <= 300, key
+
+
+@pytest.mark.asyncio
+async def test_redis_rewrites_messages_after_the_thread_expired(make_saver):
+    saver = await make_saver(dedup_messages=True)
+    if not isinstance(saver, RedisCheckpointSaver):
+        pytest.skip("Redis expiry and eviction only")
+    system = SystemMessage("sys", id="s")
+    config = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+    checkpoint = create_checkpoint(empty_checkpoint(), None, 0)
+    checkpoint["channel_values"] = {"messages": [system, HumanMessage("q1", id="q1")]}
+    await saver.aput(config, checkpoint, {"step": 0}, {})
+
+    # Redis drops the thread (TTL or eviction) behind the saver's back
+    await saver.redis.client.delete(*saver._keys("t1", ""), "checkpoint:{t1}:namespaces")
+    checkpoint = create_checkpoint(checkpoint, None, 1)
+    checkpoint["channel_values"] = {"messages": [system, HumanMessage("q2", id="q2")]}
+    await saver.aput(config, checkpoint, {"step": 1}, {})
+
+    latest = await saver.aget_tuple({"configurable": {"thread_id": "t1"}})
+    assert [m.content for m in latest.checkpoint["channel_values"]["messages"]] == ["sys", "q2"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("dedup", [True, False])
+async def test_messages_read_in_batches(make_saver, dedup):
+    saver = await make_saver(dedup_messages=dedup)
+    messages = [HumanMessage(f"message {i}", id=f"m{i}") for i in range(7)]
+    checkpoint = create_checkpoint(empty_checkpoint(), None, 0)
+    checkpoint["channel_values"] = {"messages": messages}
+    await saver.aput({"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}, checkpoint, {"step": 0}, {})
+
+    config = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+    batches = [batch async for batch in saver.aiter_messages(config, batch_size=3)]
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert [m.id for batch in batches for m in batch] == [m.id for m in messages]
+    missing = {"configurable": {"thread_id": "nope", "checkpoint_ns": ""}}
+    assert [batch async for batch in saver.aiter_messages(missing)] == []
+
+
+@pytest.mark.asyncio
+async def test_copy_thread(make_saver):
+    saver = await make_saver()
+    config = {"configurable": {"thread_id": "src", "checkpoint_ns": ""}}
+    checkpoint, messages, ids = empty_checkpoint(), [], []
+    for step in range(3):
+        messages = messages + [HumanMessage(f"q{step}", id=f"h{step}"), AIMessage(f"a{step}", id=f"a{step}")]
+        checkpoint = create_checkpoint(checkpoint, None, step)
+        checkpoint["channel_values"] = {"messages": messages}
+        config = await saver.aput(config, checkpoint, {"step": step}, {})
+        ids.append(config["configurable"]["checkpoint_id"])
+    await saver.aput_writes(config, [("messages", "pending")], task_id="task")
+
+    forked = await saver.acopy_thread("src", "fork")
+    assert forked["configurable"]["checkpoint_id"] == ids[-1]
+    item = await saver.aget_tuple({"configurable": {"thread_id": "fork"}})
+    assert [m.id for m in item.checkpoint["channel_values"]["messages"]] == [m.id for m in messages]
+    assert item.parent_config is None
+    assert item.pending_writes == [("task", "messages", "pending")]
+
+    await saver.acopy_thread("src", "early", ids[0])
+    item = await saver.aget_tuple({"configurable": {"thread_id": "early"}})
+    assert [m.content for m in item.checkpoint["channel_values"]["messages"]] == ["q0", "a0"]
+
+    # Writing to the fork leaves the source untouched
+    checkpoint = create_checkpoint(checkpoint, None, 3)
+    checkpoint["channel_values"] = {"messages": messages + [HumanMessage("fork only", id="f")]}
+    await saver.aput(forked, checkpoint, {"step": 3}, {})
+    await saver.adelete_thread("fork")
+    item = await saver.aget_tuple({"configurable": {"thread_id": "src"}})
+    assert len(item.checkpoint["channel_values"]["messages"]) == 6
+    assert await saver.acopy_thread("src", "x", "missing") is None
+    assert await saver.acopy_thread("nope", "x") is None
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from api.core.deadline import Deadline, DeadlineExceeded, deadline_scope, stage_budget
+from api.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from api.services.vllm_client import is_backend_failure
+
+
+async def ok():
+    return "ok"
+
+
+async def boom():
+    raise ConnectionError("down")
+
+
+def make_breaker(**kwargs):
+    options = dict(failure_rate_threshold=0.5, window_size=4, minimum_calls=4, reset_timeout_seconds=60)
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+
+async def fail_times(breaker, n):
+    for _ in range(n):
+        with pytest.raises(ConnectionError):
+            await breaker.call(boom)
+
+
+@pytest.mark.asyncio
+async def test_opens_once_failure_rate_reached():
+    breaker = make_breaker()
+    await breaker.call(ok)
+    await fail_times(breaker, 2)
+    assert breaker.state == CircuitBreaker.CLOSED  # below minimum_calls
+    await fail_times(breaker, 1)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(ok)
+    assert await breaker.call(ok, fallback=[]) == []
+    assert breaker.snapshot()["total_rejected"] == 2
+
+
+@pytest.mark.asyncio
+async def test_half_open_trial_closes_or_reopens(monkeypatch):
+    breaker = make_breaker(reset_timeout_seconds=0)
+    await fail_times(breaker, 4)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    await fail_times(breaker, 1)
+    breaker.reset_timeout_seconds = 60
+    assert breaker.state == CircuitBreaker.OPEN
+
+    breaker.reset_timeout_seconds = 0
+    assert await breaker.call(ok) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["calls_in_window"] == 0
+
+
+@pytest.mark.asyncio
+async def test_half_open_limits_trial_calls():
+    breaker = make_breaker(reset_timeout_seconds=0)
+    await fail_times(breaker, 4)
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+@pytest.mark.asyncio
+async def test_ignored_errors_do_not_count():
+    breaker = make_breaker(is_failure=lambda exc: not isinstance(exc, ValueError))
+
+    async def bad_request():
+        raise ValueError("client error")
+
+    for _ in range(6):
+        with pytest.raises(ValueError):
+            await breaker.call(bad_request)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+async def slow_stage(cap):
+    with stage_budget(cap) as timeout:
+        await asyncio.wait_for(asyncio.sleep(1), timeout=timeout)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("is_failure", [None, is_backend_failure])
+async def test_deadline_shortened_timeouts_leave_breaker_closed(is_failure):
+    breaker = make_breaker(is_failure=is_failure)
+    with deadline_scope(Deadline(0.02)):
+        for _ in range(6):
+            with pytest.raises(DeadlineExceeded):
+                await breaker.call(slow_stage, 5.0)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.snapshot()["total_failures"] == 0
+
+    # A stage hitting its own cap is still the dependency's fault
+    await asyncio.gather(*(fail_on_cap(breaker) for _ in range(4)))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+async def fail_on_cap(breaker):
+    with pytest.raises(asyncio.TimeoutError) as excinfo:
+        await breaker.call(slow_stage, 0.02)
+    assert not isinstance(excinfo.value, DeadlineExceeded)
+
+
+def test_ollama_probe_errors_settle_the_half_open_trial(monkeypatch):
+    import httpx
+    from api.services import vllm_client
+
+    breaker = make_breaker(minimum_calls=1, reset_timeout_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    monkeypatch.setattr(vllm_client, "llm_breaker", breaker)
+
+    def read_timeout(*args, **kwargs):
+        raise httpx.ReadTimeout("slow")
+
+    monkeypatch.setattr(vllm_client.httpx, "get", read_timeout)
+    with pytest.raises(httpx.ReadTimeout):
+        vllm_client.get_ollama_client()
+    # The trial failed and was recorded; once the reset timeout passes, a new trial is allowed
+    assert breaker.snapshot()["total_failures"] == 2
+    assert breaker.allow_request()
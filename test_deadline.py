@@ -0,0 +1,78 @@
+"""Request deadlines: where the budget comes from, optional work skipped on a tight one, and the 504."""
+import asyncio
+
+import httpx
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessage
+
+from api.core.config import settings
+from api.core.deadline import Deadline
+from api.logic import graph_nodes, turns
+
+
+def test_request_deadline_precedence_and_clamping(monkeypatch):
+    monkeypatch.setattr(settings, "REQUEST_TIMEOUT_SECONDS", 120.0)
+    monkeypatch.setattr(settings, "MAX_REQUEST_TIMEOUT_SECONDS", 600.0)
+    session = {"agent_config": {"request_timeout_seconds": 30}}
+
+    assert turns.request_deadline(None, None).timeout_seconds == 120.0
+    assert turns.request_deadline(None, {"agent_config": None}).timeout_seconds == 120.0
+    assert turns.request_deadline(None, session).timeout_seconds == 30.0
+    assert turns.request_deadline(5.0, session).timeout_seconds == 5.0  # the header wins
+    assert turns.request_deadline(0.01, None).timeout_seconds == 1.0
+    assert turns.request_deadline(None, {"agent_config": {"request_timeout_seconds": 3600}}).timeout_seconds == 600.0
+
+
+@pytest.mark.asyncio
+async def test_memory_search_is_skipped_on_a_tight_budget(monkeypatch):
+    searches = []
+
+    async def search_memory(user_id, query):
+        searches.append(query)
+        return [{"text": "likes tea"}]
+
+    monkeypatch.setattr(turns.memory_client, "search_memory", search_memory)
+    session = {"user_id": "u1"}
+
+    roomy = await turns.graph_input_messages(session, "hi", Deadline(settings.DEADLINE_MEMORY_MIN_SECONDS + 30))
+    assert searches == ["hi"] and "likes tea" in roomy[0].content and roomy[-1].content == "hi"
+
+    tight = await turns.graph_input_messages(session, "hi", Deadline(settings.DEADLINE_MEMORY_MIN_SECONDS / 2))
+    assert searches == ["hi"] and [m.content for m in tight] == ["hi"]
+
+
+class StuckModel:
+    """Never answers within any reasonable budget."""
+
+    def __init__(self, **_):
+        pass
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(30)
+        return AIMessage(content="too late")
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(graph_nodes, "ChatOllama", StuckModel)
+    from api.main import app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+
+@pytest.mark.asyncio
+async def test_graph_overrunning_the_deadline_is_a_504(client):
+    response = await client.post("/api/v1/simulate/start", json={"user_id": "d1", "mode": "chat", "agent_config": {}})
+    url = f"/api/v1/simulate/{response.json()['session_id']}/message"
+
+    response = await client.post(url, json={"content": "hi"}, headers={"X-Request-Timeout": "1"})
+    assert response.status_code == 504
+    assert "deadline" in response.json()["detail"]
+    # The caller's budget ran out, not the backend: the breaker stays closed
+    assert graph_nodes.llm_breaker.state == graph_nodes.llm_breaker.CLOSED
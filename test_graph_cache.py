@@ -0,0 +1,131 @@
+"""Compiled graph variants per agent_config: canonical keys, single-flight compiles, LRU and API use."""
+import asyncio
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessage
+
+from api.logic import conversation_graph, graph_nodes
+from api.logic.conversation_graph import GraphCache, graph_spec, spec_key
+
+
+def test_spec_is_canonical():
+    assert spec_key(graph_spec({"tools": ["fetch_pages", "web_search"]})) == spec_key(graph_spec({}))
+    assert graph_spec({"tools": ["web_search", "web_search"], "temperature": 0}) == {"tools": ["web_search"], "model": None}
+    assert graph_spec({"model": conversation_graph.settings.OLLAMA_MODEL}) == graph_spec(None)
+    with pytest.raises(ValueError, match="nope"):
+        graph_spec({"tools": ["nope"]})
+    with pytest.raises(ValueError, match="not allowed"):
+        graph_spec({"model": "typo"})
+
+
+@pytest.fixture(autouse=True)
+def allowed_models(monkeypatch):
+    monkeypatch.setattr(conversation_graph.settings, "AGENT_ALLOWED_MODELS", "other, small")
+
+
+@pytest.mark.asyncio
+async def test_single_flight_and_lru(monkeypatch):
+    build = conversation_graph.build_workflow
+
+    def slow_build(*args):
+        time.sleep(0.05)
+        return build(*args)
+
+    monkeypatch.setattr(conversation_graph, "build_workflow", slow_build)
+    cache = GraphCache(max_variants=2)
+    graphs = await asyncio.gather(*(cache.get({"tools": ["web_search"]}) for _ in range(5)))
+    assert all(graph is graphs[0] for graph in graphs)
+    stats = cache.stats()
+    assert stats["compiles"] == 1 and stats["misses"] == 1 and stats["coalesced"] == 4
+
+    assert await cache.get({"tools": ["web_search"]}) is graphs[0]
+    await cache.get({"tools": []})
+    await cache.get({"model": "other"})
+    stats = cache.stats()
+    assert stats["variants"] == 2 and stats["evictions"] == 1 and stats["hits"] == 1
+    assert await cache.get({"tools": ["web_search"]}) is not graphs[0]
+
+
+@pytest.mark.asyncio
+async def test_default_lookups_and_clear_during_compile(monkeypatch):
+    build = conversation_graph.build_workflow
+
+    def slow_build(*args):
+        time.sleep(0.1)
+        return build(*args)
+
+    monkeypatch.setattr(conversation_graph, "build_workflow", slow_build)
+    cache = GraphCache(max_variants=2)
+    await cache.get({})
+    assert cache.stats()["default_lookups"] == 1 and cache.stats()["hit_rate"] == 0.0
+
+    pending = asyncio.create_task(cache.get({"tools": ["web_search"]}))
+    await asyncio.sleep(0.02)
+    cache.clear()  # e.g. the global graph was recompiled with a new checkpointer
+    graph = await pending
+    # The compile that straddled clear() was discarded and redone
+    stats = cache.stats()
+    assert stats["misses"] == 2 and stats["compiles"] == 1 and stats["variants"] == 1
+    assert await cache.get({"tools": ["web_search"]}) is graph
+    assert cache.stats()["hit_rate"] == round(1 / 3, 4)
+
+
+class RecordingModel:
+    models = []
+
+    def __init__(self, model=None, **_):
+        self.model = model
+        self.tools = None
+
+    def bind_tools(self, tools, **kwargs):
+        self.tools = [t.name for t in tools]
+        return self
+
+    async def ainvoke(self, messages):
+        RecordingModel.models.append((self.model, self.tools))
+        return AIMessage(content="ok")
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(graph_nodes, "ChatOllama", RecordingModel)
+    RecordingModel.models = []
+    from api.main import app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+
+@pytest.mark.asyncio
+async def test_sessions_run_on_their_variant(client):
+    response = await client.post("/api/v1/simulate/start", json={
+        "user_id": "g1", "mode": "chat", "agent_config": {"tools": ["fetch_pages"], "model": "small"}
+    })
+    assert response.json()["model_loaded"] == "small"
+    session_id = response.json()["session_id"]
+
+    response = await client.post(f"/api/v1/simulate/{session_id}/message", json={"content": "hi"})
+    assert response.status_code == 200 and response.json()["model"] == "small"
+    assert RecordingModel.models == [("small", ["fetch_pages"])]
+    assert (await client.get("/api/v1/admin/graph-cache")).json()["variants"] == 1
+
+    response = await client.post("/api/v1/simulate/start", json={
+        "user_id": "g1", "mode": "chat", "agent_config": {"tools": ["shell"]}
+    })
+    assert response.status_code == 400
+    response = await client.post("/api/v1/simulate/start", json={
+        "user_id": "g1", "mode": "chat", "agent_config": {"model": "smal"}
+    })
+    assert response.status_code == 400
+
+
+def test_unknown_model_errors_are_not_backend_failures():
+    ollama = pytest.importorskip("ollama")
+    from api.services.vllm_client import is_backend_failure
+
+    assert not is_backend_failure(ollama.ResponseError("model 'smal' not found", 404))
+    assert is_backend_failure(ollama.ResponseError("boom", 500))
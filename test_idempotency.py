@@ -0,0 +1,69 @@
+"""IdempotencyStore: one run per key, attach to in-flight runs, replay stored responses."""
+import asyncio
+
+import pytest
+
+from api.services.idempotency import IdempotencyConflict, IdempotencyInProgress, IdempotencyStore
+from api.services.redis_client import RedisClient
+
+
+@pytest.fixture(params=["redis", "memory"])
+def store(request):
+    if request.param == "redis":
+        client = request.getfixturevalue("fake_redis")
+    else:
+        client = RedisClient(url="redis://localhost:6379")
+        client.client = None
+    return IdempotencyStore(client, ttl_seconds=60, poll_interval=0.01)
+
+
+@pytest.mark.asyncio
+async def test_retries_attach_and_replay(store):
+    runs = []
+    release = asyncio.Event()
+
+    async def compute():
+        runs.append(1)
+        await release.wait()
+        return {"response": "hello"}
+
+    first = asyncio.create_task(store.run_once("k", "fp", compute, wait_seconds=5))
+    await asyncio.sleep(0.01)
+    retry = asyncio.create_task(store.run_once("k", "fp", compute, wait_seconds=5))
+    await asyncio.sleep(0.01)
+    release.set()
+    assert await first == ({"response": "hello"}, False)
+    assert await retry == ({"response": "hello"}, True)
+    # Completed: later retries get the stored response
+    assert await store.run_once("k", "fp", compute, wait_seconds=5) == ({"response": "hello"}, True)
+    assert len(runs) == 1
+
+    with pytest.raises(IdempotencyConflict):
+        await store.run_once("k", "other body", compute, wait_seconds=5)
+
+
+@pytest.mark.asyncio
+async def test_failed_run_releases_key(store):
+    async def fail():
+        raise RuntimeError("backend down")
+
+    async def succeed():
+        return {"response": "ok"}
+
+    with pytest.raises(RuntimeError):
+        await store.run_once("k", "fp", fail, wait_seconds=1)
+    assert await store.run_once("k", "fp", succeed, wait_seconds=1) == ({"response": "ok"}, False)
+
+
+@pytest.mark.asyncio
+async def test_running_elsewhere_times_out(store):
+    # Claimed by another worker that has not finished
+    assert await store._claim("k", "fp")
+
+    async def compute():
+        return {"response": "duplicate"}
+
+    with pytest.raises(IdempotencyInProgress):
+        await store.run_once("k", "fp", compute, wait_seconds=0.05)
+    await store._finish("k", {"state": "done", "fingerprint": "fp", "response": {"response": "original"}})
+    assert await store.run_once("k", "fp", compute, wait_seconds=0.05) == ({"response": "original"}, True)
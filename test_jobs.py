@@ -0,0 +1,112 @@
+"""Job API: queue semantics on both backends, and submit/poll/stream through in-process workers."""
+import asyncio
+import uuid
+
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessage
+
+from api.logic import graph_nodes
+from api.services.job_queue import MemoryJobQueue, RedisJobQueue, new_job
+
+
+@pytest.fixture(params=["memory", "redis"])
+def queue(request):
+    if request.param == "memory":
+        return MemoryJobQueue(ttl_seconds=60, max_events=100)
+    return RedisJobQueue(request.getfixturevalue("fake_redis"), ttl_seconds=60, max_events=100)
+
+
+@pytest.mark.asyncio
+async def test_claim_publish_and_resume(queue):
+    assert await queue.claim(0.05) is None
+    jobs = [new_job(uuid.uuid4(), f"question {n}", 30.0) for n in range(2)]
+    for job in jobs:
+        await queue.submit(job)
+
+    claimed = await queue.claim(1)
+    assert claimed["job_id"] == jobs[0]["job_id"] and claimed["status"] == "queued"
+    await queue.update(claimed["job_id"], status="running", worker="w1")
+    assert (await queue.get(claimed["job_id"]))["worker"] == "w1"
+
+    waiting = asyncio.create_task(queue.read_events(claimed["job_id"], "0", timeout=1))
+    await asyncio.sleep(0.05)
+    await queue.publish(claimed["job_id"], {"type": "token", "content": "hel"})
+    first = await waiting
+    assert [event for _, event in first] == [{"type": "token", "content": "hel"}]
+
+    await queue.publish(claimed["job_id"], {"type": "done", "response": "hello"})
+    resumed = await queue.read_events(claimed["job_id"], first[-1][0], timeout=0.05)
+    assert [event["type"] for _, event in resumed] == ["done"]
+    assert await queue.read_events(claimed["job_id"], resumed[-1][0], timeout=0.05) == []
+    assert (await queue.claim(1))["job_id"] == jobs[1]["job_id"]
+
+
+class SlowModel:
+    delay = 0.2
+    fail = False
+
+    def __init__(self, **_):
+        pass
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("model exploded")
+        return AIMessage(content="job answer")
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(graph_nodes, "ChatOllama", SlowModel)
+    from api.main import app
+    async with app.router.lifespan_context(app):  # JOB_BACKEND=memory: workers run in process
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/api/v1/simulate/start", json={"user_id": "u1", "mode": "chat", "agent_config": {}})
+            client.session_id = response.json()["session_id"]
+            yield client
+
+
+def parse_sse(body: bytes):
+    return [
+        orjson.loads(line[len("data: "):])
+        for block in body.decode().split("\n\n") for line in block.splitlines() if line.startswith("data: ")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_submit_poll_and_stream(client):
+    response = await client.post(f"/api/v1/simulate/{client.session_id}/jobs", json={"content": "hi"})
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+
+    events = parse_sse((await client.get(job["events_url"])).content)
+    assert [event["type"] for event in events] == ["token", "done"]
+
+    status = (await client.get(job["status_url"])).json()
+    assert status["status"] == "done"
+    assert status["result"]["response"] == "job answer" and status["result"]["iterations"] == 1
+    assert status["started_at"] >= status["submitted_at"]
+
+    replay = await client.get(job["events_url"], headers={"Last-Event-ID": "1-0"})
+    assert [event["type"] for event in parse_sse(replay.content)] == ["done"]
+    other_session = job["status_url"].replace(client.session_id, str(uuid.uuid4()))
+    assert (await client.get(other_session)).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_failed_job_reports_error(client, monkeypatch):
+    monkeypatch.setattr(SlowModel, "fail", True)
+    job = (await client.post(f"/api/v1/simulate/{client.session_id}/jobs", json={"content": "hi"})).json()
+
+    events = parse_sse((await client.get(job["events_url"])).content)
+    assert events[-1]["type"] == "error" and events[-1]["status"] == 500
+    status = (await client.get(job["status_url"])).json()
+    assert status["status"] == "failed" and "model exploded" in status["error"]
@@ -0,0 +1,170 @@
+"""KVSlotManager against a fake llama-server implementing the slot API, and agent turns pinned to slots."""
+import json
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from api.logic import graph_nodes
+from api.services.kv_slots import KVSlotManager
+
+
+class FakeLlamaServer:
+    """/props and /slots/{id}?action=save|restore, with slot files in ``save_dir``."""
+
+    def __init__(self, save_dir, total_slots=2, slots_supported=True):
+        self.save_dir = save_dir
+        self.total_slots = total_slots
+        self.slots_supported = slots_supported
+        self.cache = {}  # slot id -> content of its KV cache
+        self.calls = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/props":
+            if not self.slots_supported:
+                return httpx.Response(404)
+            return httpx.Response(200, json={"total_slots": self.total_slots})
+        slot_id = int(request.url.path.rsplit("/", 1)[1])
+        action = request.url.params["action"]
+        filename = json.loads(request.content)["filename"]
+        self.calls.append((action, slot_id, filename))
+        path = self.save_dir / filename
+        if action == "save":
+            data = self.cache.get(slot_id, "").encode()
+            path.write_bytes(data)
+            return httpx.Response(200, json={"id_slot": slot_id, "n_saved": len(data), "n_written": len(data)})
+        if not path.exists():
+            return httpx.Response(400, json={"error": "failed to load slot file"})
+        self.cache[slot_id] = path.read_text()
+        return httpx.Response(200, json={"id_slot": slot_id, "n_restored": len(self.cache[slot_id])})
+
+
+def make_manager(server, **kwargs):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(server.handler), base_url="http://llama")
+    return KVSlotManager(client=client, save_dir=str(server.save_dir), **kwargs)
+
+
+async def turn(manager, server, session, prefix=None):
+    async with manager.session_slot(session, prefix) as slot_id:
+        # What cache_prompt does: the slot's cache ends up holding this session's prompt
+        server.cache[slot_id] = server.cache.get(slot_id, "") if server.cache.get(slot_id, "").startswith(
+            session) else session
+        server.cache[slot_id] += "+"
+        return slot_id
+
+
+@pytest.mark.asyncio
+async def test_sessions_keep_their_slot_and_are_saved_before_eviction(tmp_path):
+    server = FakeLlamaServer(tmp_path, total_slots=2)
+    manager = make_manager(server, idle_seconds=3600)
+    assert await manager.start()
+
+    slot_a = await turn(manager, server, "a")
+    assert await turn(manager, server, "a") == slot_a
+    slot_b = await turn(manager, server, "b")
+    assert slot_b != slot_a
+    assert server.calls == []
+
+    # "c" takes the least recently used slot; a's cache is saved first
+    assert await turn(manager, server, "c") == slot_a
+    assert server.calls == [("save", slot_a, "a.bin")]
+    assert (tmp_path / "a.bin").read_text() == "a++"
+
+    # "a" comes back: b's slot is saved, then a's cache restored into it
+    server.calls.clear()
+    assert await turn(manager, server, "a") == slot_b
+    assert server.calls == [("save", slot_b, "b.bin"), ("restore", slot_b, "a.bin")]
+    assert server.cache[slot_b] == "a+++"
+    stats = manager.stats()
+    assert (stats["hits"], stats["saves"], stats["restores"]) == (1, 2, 1)
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_idle_save_lru_files_and_prefix_restore(tmp_path):
+    server = FakeLlamaServer(tmp_path, total_slots=1)
+    manager = make_manager(server, idle_seconds=0, max_saved_files=1)
+    await manager.start()
+
+    await turn(manager, server, "a")
+    assert await manager.save_idle() == 1
+    assert await manager.save_idle() == 0  # unchanged since the last save
+    await turn(manager, server, "b")
+    assert await manager.save_idle() == 1
+    # Only the most recent file is kept
+    assert not (tmp_path / "a.bin").exists() and (tmp_path / "b.bin").exists()
+    assert list(manager.saved) == ["b"]
+
+    # A fork of "a" with nothing saved of its own starts from a's cache
+    await turn(manager, server, "a")
+    server.calls.clear()
+    await turn(manager, server, "fork", prefix="a")
+    assert server.calls == [("save", 0, "a.bin"), ("restore", 0, "a.bin")]
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_inactive_without_slot_api(tmp_path):
+    server = FakeLlamaServer(tmp_path, slots_supported=False)
+    manager = make_manager(server)
+    assert not await manager.start()
+    async with manager.session_slot("a") as slot_id:
+        assert slot_id is None
+    assert server.calls == []
+    await manager.close()
+
+
+class RecordingChatModel:
+    """Stands in for ChatOpenAI against llama-server; records the slot each call was pinned to."""
+
+    calls = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.extra_body = None
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def bind(self, extra_body=None, **kwargs):
+        self.extra_body = extra_body
+        return self
+
+    async def ainvoke(self, messages):
+        RecordingChatModel.calls.append(self.extra_body)
+        return AIMessage(content="ok")
+
+
+@pytest.mark.asyncio
+async def test_agent_turns_run_in_their_session_slot(tmp_path, monkeypatch):
+    server = FakeLlamaServer(tmp_path, total_slots=2)
+    manager = make_manager(server, idle_seconds=3600)
+    await manager.start()
+    monkeypatch.setattr(graph_nodes, "kv_slots", manager)
+    monkeypatch.setattr(graph_nodes, "ChatOpenAI", RecordingChatModel)
+    RecordingChatModel.calls = []
+
+    for thread in ("a", "b", "a"):
+        state = {"messages": [HumanMessage(content="hi")], "agent_config": {}}
+        await graph_nodes.call_model(state, {"configurable": {"thread_id": thread}})
+    slots = [call["id_slot"] for call in RecordingChatModel.calls]
+    assert slots[0] == slots[2] != slots[1]
+    assert all(call["cache_prompt"] for call in RecordingChatModel.calls)
+    assert manager.stats()["hits"] == 1 and not any(slot["busy"] for slot in manager.stats()["slots"])
+    await manager.close()
+
+
+def test_sessions_report_and_cache_on_the_served_model(monkeypatch):
+    from api.core.config import settings
+    from api.logic import conversation_graph
+    from api.services import response_cache as caching
+    from api.services.kv_slots import kv_slots
+
+    assert conversation_graph.model_name({"model": "small"}) == "small"
+    on_ollama = caching.context_key({"model": "small"}, [], [])
+    assert on_ollama != caching.context_key({}, [], [])
+
+    # llama-server serves its one model whatever the session asked for
+    monkeypatch.setattr(kv_slots, "slots", [object()])
+    assert conversation_graph.model_name({"model": "small"}) == settings.VLLM_MODEL_NAME
+    assert caching.context_key({"model": "small"}, [], []) == caching.context_key({}, [], []) != on_ollama
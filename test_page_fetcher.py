@@ -0,0 +1,97 @@
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api.services.page_fetcher import PageFetcher, extract_main_text
+
+ARTICLE = """<html><head><title>  Test   Article </title><script>var tracking = "nope";</script></head>
+<body>
+<nav><a href="/">Home</a> <a href="/about">About us and everything else on this site</a></nav>
+<article>
+<h1>Main heading</h1>
+<p>This is the first paragraph of the article and it is long enough to be kept.</p>
+<p>Short.</p>
+<p>The second paragraph also carries real content about the topic at hand.</p>
+</article>
+<footer>Copyright notice that is quite long but still not part of the article body.</footer>
+</body></html>"""
+
+
+class DictCache:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ttl_seconds):
+        self.data[key] = value
+
+
+@pytest.fixture
+def static_server(tmp_path):
+    (tmp_path / "article.html").write_text(ARTICLE)
+    (tmp_path / "big.html").write_text("<p>" + "x" * 50_000 + "</p>")
+    statuses = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_request(self, code="-", size="-"):
+            statuses.append((self.path, int(code)))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=str(tmp_path)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", statuses
+    server.shutdown()
+    server.server_close()
+
+
+def test_extract_main_text_skips_boilerplate():
+    page = extract_main_text(ARTICLE)
+    assert page["title"] == "Test Article"
+    assert page["text"].splitlines() == [
+        "Main heading",
+        "This is the first paragraph of the article and it is long enough to be kept.",
+        "The second paragraph also carries real content about the topic at hand.",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fetch_extracts_in_process_pool_and_revalidates(static_server):
+    base_url, statuses = static_server
+    fetcher = PageFetcher(cache=DictCache(), parser_workers=1)
+    try:
+        first = await fetcher.fetch(f"{base_url}/article.html")
+        second = await fetcher.fetch(f"{base_url}/article.html")
+    finally:
+        await fetcher.close()
+
+    assert first["title"] == "Test Article"
+    assert "first paragraph" in first["text"]
+    assert not first["cached"]
+    assert second["cached"]
+    assert second["text"] == first["text"]
+    assert [code for _, code in statuses] == [200, 304]
+
+
+@pytest.mark.asyncio
+async def test_fetch_many_caps_bytes_and_isolates_failures(static_server):
+    base_url, _ = static_server
+    fetcher = PageFetcher(cache=None, parser_workers=0, max_bytes=1024, max_concurrency=2)
+    try:
+        pages = await fetcher.fetch_many([
+            f"{base_url}/big.html",
+            f"{base_url}/missing.html",
+            f"{base_url}/article.html",
+            f"{base_url}/article.html",
+        ])
+    finally:
+        await fetcher.close()
+
+    assert len(pages) == 3
+    big, missing, article = pages
+    assert big["truncated"] and big["bytes"] == 1024
+    assert "error" in missing
+    assert article["title"] == "Test Article"
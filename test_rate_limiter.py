@@ -0,0 +1,131 @@
+"""Rate limiter: token buckets in Redis and in process, fallback, and 429s from the API."""
+import httpx
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessage, HumanMessage
+
+from api.logic import graph_nodes
+from api.services import rate_limiter as limiting
+from api.services.idempotency import IdempotencyStore
+from api.services.rate_limiter import RateLimiter
+from api.services.redis_client import RedisClient
+
+LIMITS = {
+    ("user", limiting.REQUESTS): 5,
+    ("session", limiting.REQUESTS): 3,
+    ("user", limiting.TOKENS): 0,
+    ("session", limiting.TOKENS): 600,
+    ("user", limiting.TOOL_CALLS): 0,
+    ("session", limiting.TOOL_CALLS): 2,
+}
+
+
+@pytest.fixture(params=["memory", "redis"])
+def limiter(request):
+    redis = None
+    if request.param == "redis":
+        redis = request.getfixturevalue("fake_redis")
+    limiter = RateLimiter(redis=redis, enabled=True)
+    limiter.limits = dict(LIMITS)
+    return limiter
+
+
+@pytest.mark.asyncio
+async def test_buckets_per_user_and_session(limiter):
+    for n in range(3):
+        decision = await limiter.admit("u1", "s1", "hello")
+        assert decision.allowed and decision.headers()["RateLimit-Limit"] == "3"
+    assert decision.headers()["RateLimit-Remaining"] == "0"
+
+    denied = await limiter.admit("u1", "s1", "hello")
+    assert not denied.allowed and denied.budget == "session requests"
+    assert 1 <= int(denied.headers()["Retry-After"]) <= 20
+    # Another session of the same user runs into the user budget after two more
+    assert (await limiter.admit("u1", "s2", "hi")).allowed
+    assert (await limiter.admit("u1", "s2", "hi")).allowed
+    assert (await limiter.admit("u1", "s2", "hi")).budget == "user requests"
+    assert (await limiter.admit("u2", "s3", "hi")).allowed
+
+
+@pytest.mark.asyncio
+async def test_token_and_tool_call_budgets(limiter):
+    # Charged answers leave the bucket in debt; the next admission waits it out
+    await limiter.charge_tokens("u1", "s1", "x" * 4000)
+    denied = await limiter.admit("u1", "s1", "hello")
+    assert not denied.allowed and denied.budget == "session tokens"
+
+    assert (await limiter.acquire_tool_calls("u1", "s1", 2)).allowed
+    assert not (await limiter.acquire_tool_calls("u1", "s1", 1)).allowed
+
+
+@pytest.mark.asyncio
+async def test_falls_back_in_process_when_redis_is_down():
+    limiter = RateLimiter(redis=RedisClient(url="redis://127.0.0.1:1"), enabled=True, redis_retry_seconds=60)
+    limiter.limits = dict(LIMITS)
+    assert [(await limiter.admit("u1", "s1", "hi")).allowed for _ in range(4)] == [True, True, True, False]
+    stats = limiter.stats()
+    assert stats["redis_fallbacks"] == 1 and stats["backend"] == "memory"
+
+
+class QuietModel:
+    def __init__(self, **_):
+        pass
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        return AIMessage(content="ok")
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(graph_nodes, "ChatOllama", QuietModel)
+    monkeypatch.setattr(limiting.rate_limiter, "limits", dict(LIMITS))
+    monkeypatch.setattr(limiting.rate_limiter, "_local", {})
+    from api.main import app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/api/v1/simulate/start", json={"user_id": "rl-user", "mode": "chat", "agent_config": {}})
+            client.session_id = response.json()["session_id"]
+            yield client
+
+
+@pytest.mark.asyncio
+async def test_message_endpoint_returns_429(client):
+    url = f"/api/v1/simulate/{client.session_id}/message"
+    statuses = []
+    for _ in range(4):
+        response = await client.post(url, json={"content": "hi"})
+        statuses.append(response.status_code)
+        assert "RateLimit-Remaining" in response.headers
+    assert statuses == [200, 200, 200, 429]
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "session requests" in response.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_idempotent_retries_are_not_charged(client, monkeypatch, fake_redis):
+    from api.v1.endpoints import simulate
+    monkeypatch.setattr(simulate, "idempotency_store", IdempotencyStore(fake_redis, ttl_seconds=60))
+    url = f"/api/v1/simulate/{client.session_id}/message"
+    first = await client.post(url, json={"content": "hi"}, headers={"Idempotency-Key": "k1"})
+    assert first.status_code == 200 and "RateLimit-Remaining" in first.headers
+    for _ in range(4):
+        retry = await client.post(url, json={"content": "hi"}, headers={"Idempotency-Key": "k1"})
+        assert retry.status_code == 200 and retry.headers["idempotent-replayed"] == "true"
+    # Only the first request took from the session's budget of 3
+    statuses = [(await client.post(url, json={"content": "hi"})).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_over_the_limit_are_skipped(client):
+    calls = [{"name": "web_search", "args": {"query": "q"}, "id": f"c{n}"} for n in range(3)]
+    state = {"messages": [HumanMessage(content="hi"), AIMessage(content="", tool_calls=calls)],
+             "user_id": "rl-user", "agent_config": {}, "iterations": 1}
+    assert (await limiting.rate_limiter.acquire_tool_calls("rl-user", client.session_id, 2)).allowed
+    result = await graph_nodes.call_tool(state, {"configurable": {"thread_id": client.session_id}})
+    assert [m.tool_call_id for m in result["messages"]] == ["c0", "c1", "c2"]
+    assert all("rate limit" in m.content for m in result["messages"])
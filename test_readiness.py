@@ -0,0 +1,81 @@
+"""Liveness and readiness endpoints: dependency checks, caching and draining."""
+import httpx
+import pytest
+import pytest_asyncio
+
+from api.services import readiness as readiness_module
+from api.services.readiness import ReadinessProbe, readiness
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(readiness, "cache_seconds", 60)
+    monkeypatch.setattr(readiness, "_result", None)
+    from api.main import app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    readiness.draining = False
+
+
+@pytest.mark.asyncio
+async def test_not_ready_while_llm_is_unreachable(client, monkeypatch):
+    async def unreachable(self):
+        raise httpx.ConnectError("connection refused")
+
+    monkeypatch.setattr(ReadinessProbe, "_check_llm", unreachable)
+    assert (await client.get("/live")).json() == {"status": "alive"}
+    response = await client.get("/ready")
+    assert response.status_code == 503
+    report = response.json()
+    assert report["status"] == "not_ready" and not report["warm"]
+    assert report["checks"]["llm"] == {**report["checks"]["llm"], "ok": False, "critical": True}
+    assert report["checks"]["graph"]["ok"] and report["checks"]["checkpointer"]["ok"]
+
+
+@pytest.mark.asyncio
+async def test_ready_cached_and_draining(client, monkeypatch):
+    calls = []
+
+    async def warm(self):
+        calls.append(1)
+        return "warm"
+
+    monkeypatch.setattr(ReadinessProbe, "_check_llm", warm)
+    first = await client.get("/ready")
+    assert first.status_code == 200
+    report = first.json()
+    # mem0 is not configured here: reported, but not critical
+    assert report["ready"] and report["warm"] and report["status"] == "degraded"
+    assert not report["checks"]["memory"]["ok"] and not report["checks"]["memory"]["critical"]
+    assert (await client.get("/ready")).json()["checked_at"] == report["checked_at"]
+    assert len(calls) == 1
+
+    assert (await client.post("/api/v1/admin/drain")).json() == {"draining": True}
+    drained = await client.get("/ready")
+    assert drained.status_code == 503 and drained.json()["status"] == "draining"
+    await client.post("/api/v1/admin/drain", params={"resume": "true"})
+    assert (await client.get("/ready")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_llm_check_probes_the_backend_turns_use(monkeypatch):
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        if request.url.path == "/api/ps":
+            return httpx.Response(200, json={"models": []})
+        return httpx.Response(200, json={"status": "ok"})
+
+    probe = ReadinessProbe()
+    probe._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    assert await probe._check_llm() == "cold"
+
+    kv_slots = readiness_module.kv_slots
+    monkeypatch.setattr(kv_slots, "slots", [object()])
+    monkeypatch.setattr(kv_slots, "base_url", "http://llama:8080")
+    assert await probe._check_llm() == "warm"
+    assert requested == ["/api/ps", "/health"]
+    await probe.close()
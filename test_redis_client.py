@@ -0,0 +1,95 @@
+"""RedisClient: value codec framing and compression, batched reads/writes, pipelines and op stats."""
+import json
+
+import pytest
+
+from api.services import redis_client as rc
+from api.services.redis_client import RedisClient, RedisCodec
+
+VALUE = {"user_id": "u1", "history": [{"user": "hi", "ai": "hello"}], "count": 3, "ok": True}
+
+needs_msgpack = pytest.mark.skipif(rc.msgpack is None, reason="msgpack is not installed")
+needs_zstd = pytest.mark.skipif(rc.zstandard is None, reason="zstandard is not installed")
+
+
+@pytest.mark.parametrize("format, tag", [
+    pytest.param("msgpack", rc._TAG_MSGPACK, marks=needs_msgpack),
+    ("json", rc._TAG_JSON),
+])
+def test_values_carry_a_one_byte_format_tag(format, tag):
+    codec = RedisCodec(format=format, compress_threshold=0)
+    data = codec.encode(VALUE)
+    assert data[0] == tag
+    assert codec.decode(data) == VALUE
+    # Either format reads the other's values
+    other = RedisCodec(format="json" if format == "msgpack" else "msgpack", compress_threshold=0)
+    assert other.decode(data) == VALUE
+
+
+@needs_zstd
+def test_values_are_compressed_above_the_threshold():
+    codec = RedisCodec(format="json", compress_threshold=256)
+    small = codec.encode({"text": "x" * 10})
+    assert not small[0] & rc._FLAG_ZSTD
+
+    large_value = {"text": "repeated words " * 200}
+    large = codec.encode(large_value)
+    assert large[0] == rc._TAG_JSON | rc._FLAG_ZSTD
+    assert len(large) < len(json.dumps(large_value))
+    assert codec.decode(large) == large_value
+    assert RedisCodec(format="json", compress_threshold=0).decode(large) == large_value
+
+
+def test_legacy_plain_json_values_still_decode():
+    codec = RedisCodec(format="json")
+    legacy = json.dumps(VALUE)
+    assert codec.decode(legacy.encode()) == VALUE
+    assert codec.decode(legacy) == VALUE  # decode_responses clients hand back str
+    assert codec.decode(None) is None
+    assert codec.is_encoded(codec.encode("text")) and not codec.is_encoded(b"text")
+
+
+@pytest.mark.asyncio
+async def test_get_set_mget_mset(fake_redis):
+    await fake_redis.set("one", VALUE, ttl_seconds=30)
+    assert await fake_redis.get("one") == VALUE
+    assert 0 < await fake_redis.client.ttl("one") <= 30
+
+    assert await fake_redis.mset({"a": 1, "b": [2, 3]}, ttl_seconds=60)
+    assert await fake_redis.mset({"c": "no ttl"})
+    assert await fake_redis.mget(["a", "missing", "b", "c"]) == [1, None, [2, 3], "no ttl"]
+    assert 0 < await fake_redis.client.ttl("a") <= 60
+    assert await fake_redis.client.ttl("c") == -1
+    assert await fake_redis.mget([]) == []
+
+    assert await fake_redis.delete("a", "b", "missing") == 2
+    assert await fake_redis.mget(["a", "b"]) == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_results(fake_redis):
+    async with fake_redis.pipeline() as pipe:
+        pipe.set("k", fake_redis.encode({"n": 1}), ex=60)
+        pipe.get("k")
+        pipe.expire("k", 30)
+    ok, raw, expired = pipe.results
+    assert ok and expired
+    assert fake_redis.decode(raw) == {"n": 1}
+    assert fake_redis.stats()["pipeline"]["keys"] == 3
+
+
+@pytest.mark.asyncio
+async def test_op_stats_count_calls_and_errors(fake_redis):
+    await fake_redis.set("k", 1)
+    await fake_redis.mget(["k", "other"])
+    stats = fake_redis.stats()
+    assert stats["set"]["calls"] == 1 and stats["set"]["errors"] == 0
+    assert stats["mget"]["keys"] == 2
+
+    down = RedisClient(url="redis://127.0.0.1:1", connect_timeout=0.2)
+    assert await down.get("k") is None
+    assert not await down.mset({"a": 1}, ttl_seconds=10)
+    assert not await down.ping()
+    stats = down.stats()
+    assert all(stats[op]["calls"] == 1 and stats[op]["errors"] == 1 for op in ("get", "mset", "ping"))
+    await down.close()
@@ -0,0 +1,120 @@
+"""Response cache: opt-in policy, exact and semantic tiers, and a cached turn through the API."""
+import asyncio
+
+import httpx
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessage
+
+from api.logic import graph_nodes
+from api.services import response_cache as caching
+from api.services.response_cache import ResponseCache
+
+VECTORS = {
+    "what is the capital of france?": [1.0, 0.0, 0.0],
+    "which city is france's capital?": [0.98, 0.1, 0.0],
+    "how tall is everest?": [0.0, 1.0, 0.0],
+}
+
+
+async def fake_embed(text):
+    return VECTORS[text]
+
+
+def test_policy_requires_opt_in_and_low_temperature():
+    assert caching.policy({}) is None
+    assert caching.policy({"response_cache": "exact", "temperature": 0}) == "exact"
+    assert caching.policy({"response_cache": "semantic", "temperature": 0.7}) is None
+    assert caching.policy({"response_cache": "semantic", "temperature": 0.7, "response_cache_max_temperature": 1}) == "semantic"
+    assert caching.policy({"response_cache": "everything", "temperature": 0}) is None
+    # The cache settings themselves do not change the context
+    assert caching.context_key({"response_cache": "exact"}, [], []) == caching.context_key({}, [], [])
+    assert caching.context_key({}, [], ["memory"]) != caching.context_key({}, [], [])
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    redis = None
+    if request.param == "redis":
+        redis = request.getfixturevalue("fake_redis")
+    return ResponseCache(redis=redis, ttl_seconds=60, max_entries=10, similarity=0.9, embed=fake_embed)
+
+
+@pytest.mark.asyncio
+async def test_exact_and_semantic_tiers(cache):
+    miss = await cache.lookup("semantic", "ctx", "What is the capital of France?")
+    assert miss.hit is None
+    await cache.store(miss, {"response": "Paris", "thinking_time": 2.0})
+
+    exact = await cache.lookup("exact", "ctx", "  what IS the capital of   france? ")
+    assert exact.hit == "exact" and exact.entry["response"] == "Paris"
+    semantic = await cache.lookup("semantic", "ctx", "Which city is France's capital?")
+    assert semantic.hit == "semantic" and semantic.entry["response"] == "Paris"
+    assert (await cache.lookup("semantic", "ctx", "How tall is Everest?")).hit is None
+    assert (await cache.lookup("semantic", "other", "Which city is France's capital?")).hit is None
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 3)
+    assert stats["saved_seconds"] > 3.5
+
+
+@pytest.mark.asyncio
+async def test_embedding_failure_falls_back_to_a_miss():
+    async def broken(text):
+        raise ConnectionError("ollama down")
+
+    cache = ResponseCache(ttl_seconds=60, max_entries=10, embed=broken)
+    lookup = await cache.lookup("semantic", "ctx", "hello")
+    assert lookup.hit is None and cache.stats()["errors"] == 1
+    await cache.store(lookup, {"response": "hi", "thinking_time": 1.0})
+    assert (await cache.lookup("semantic", "ctx", "hello")).hit == "exact"
+
+
+class CountingModel:
+    calls = 0
+
+    def __init__(self, **_):
+        pass
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        CountingModel.calls += 1
+        await asyncio.sleep(0.05)
+        return AIMessage(content="Paris")
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(graph_nodes, "ChatOllama", CountingModel)
+    monkeypatch.setattr(caching, "response_cache", ResponseCache(ttl_seconds=60, max_entries=10, embed=fake_embed))
+    from api.main import app
+    from api.v1.endpoints import admin, simulate
+    monkeypatch.setattr(simulate, "response_cache", caching.response_cache)
+    monkeypatch.setattr(admin, "response_cache", caching.response_cache)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+
+@pytest.mark.asyncio
+async def test_repeated_prompt_is_answered_from_cache(client):
+    agent_config = {"response_cache": "semantic", "temperature": 0}
+    answers = []
+    for _ in range(2):
+        start = await client.post("/api/v1/simulate/start", json={"user_id": "u1", "mode": "chat", "agent_config": agent_config})
+        session_id = start.json()["session_id"]
+        response = await client.post(f"/api/v1/simulate/{session_id}/message", json={"content": "What is the capital of France?"})
+        assert response.status_code == 200
+        answers.append(response.json())
+
+    assert CountingModel.calls == 1
+    assert answers[0]["cached"] is None and answers[1]["cached"] == "exact"
+    assert answers[1]["response"] == "Paris"
+    status = await client.get(f"/api/v1/simulate/{session_id}/status")
+    assert status.status_code == 200
+
+    stats = (await client.get("/api/v1/admin/response-cache")).json()
+    assert stats["exact_hits"] == 1 and stats["stores"] == 1
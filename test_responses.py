@@ -0,0 +1,90 @@
+"""Response layer: orjson/trusted bodies, and negotiated compression of large complete bodies."""
+import httpx
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessage
+
+from api.core import responses
+from api.logic import graph_nodes
+from api.services.idempotency import IdempotencyStore
+from api.services.memory_client import memory_client
+
+
+def test_negotiate_encoding(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+    assert responses.negotiate_encoding("") is None
+    assert responses.negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert responses.negotiate_encoding("gzip;q=0, identity") is None
+    assert responses.negotiate_encoding("*") == "gzip"
+    monkeypatch.setattr(responses, "brotli", object())
+    assert responses.negotiate_encoding("gzip, br") == "br"
+    assert responses.negotiate_encoding("gzip, br;q=0.5") == "gzip"
+
+
+class EchoModel:
+    def __init__(self, **_):
+        pass
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        return AIMessage(content="word " * 400)
+
+
+MEMORIES = [
+    {"id": f"m{n}", "text": f"the user likes topic {n}", "user_id": "u1", "timestamp": "2024-01-01T00:00:00Z",
+     "metadata": {"n": n}, "score": 0.5}
+    for n in range(200)
+]
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(graph_nodes, "ChatOllama", EchoModel)
+
+    async def get_all_memories(user_id):
+        return MEMORIES
+
+    monkeypatch.setattr(memory_client, "get_all_memories", get_all_memories)
+    from api.main import app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/api/v1/simulate/start", json={"user_id": "u1", "mode": "chat", "agent_config": {}})
+            client.session_id = response.json()["session_id"]
+            yield client
+
+
+@pytest.mark.asyncio
+async def test_large_bodies_are_gzipped(client):
+    url = f"/api/v1/simulate/{client.session_id}/memory"
+    plain = await client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    memories = plain.json()["memories"]
+    assert len(memories) == 200 and memories[3]["metadata"] == {"n": 3} and "score" not in memories[3]
+
+    zipped = await client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["content-encoding"] == "gzip" and "Accept-Encoding" in zipped.headers["vary"]
+    assert int(zipped.headers["content-length"]) < len(plain.content) / 4
+    assert zipped.json() == plain.json()  # httpx decodes transparently
+
+    small = await client.get(f"/api/v1/simulate/{client.session_id}/status", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers and small.json()["memory_size"] == 200
+
+
+@pytest.mark.asyncio
+async def test_message_responses_and_streams(client, monkeypatch, fake_redis):
+    from api.v1.endpoints import simulate
+    monkeypatch.setattr(simulate, "idempotency_store", IdempotencyStore(fake_redis, ttl_seconds=60))
+    url = f"/api/v1/simulate/{client.session_id}/message"
+    response = await client.post(url, json={"content": "hi"}, headers={"Accept-Encoding": "gzip", "Idempotency-Key": "k1"})
+    assert response.status_code == 200 and response.headers["content-encoding"] == "gzip"
+    body = response.json()
+    assert body["response"].startswith("word") and body["iterations"] == 1
+    replay = await client.post(url, json={"content": "hi"}, headers={"Idempotency-Key": "k1"})
+    assert replay.headers["idempotent-replayed"] == "true" and replay.json() == body
+
+    streamed = await client.post(url, params={"stream": "true"}, json={"content": "hi"}, headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in streamed.headers
@@ -0,0 +1,119 @@
+"""Session export: NDJSON stream, Parquet files and bulk export."""
+import uuid
+
+import orjson
+import pytest
+
+pytest.importorskip("aiosqlite")
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+from api.logic.turns import MEMORY_MESSAGE_NAME
+from api.services import session_export
+from api.services.checkpoint_store import TunedSqliteSaver
+from api.services.session_manager import session_manager
+
+
+async def start_session(saver, turns):
+    session_id = await session_manager.create_session(user_id="u1", mode="chat", agent_config={})
+    messages = []
+    for turn in range(turns):
+        messages = messages + [HumanMessage(f"question {turn}"), AIMessage(f"answer {turn}")]
+        await session_manager.update_history(session_id, f"question {turn}", f"answer {turn}")
+    checkpoint = create_checkpoint(empty_checkpoint(), None, 0)
+    checkpoint["channel_values"] = {"messages": messages}
+    await saver.aput({"configurable": {"thread_id": str(session_id), "checkpoint_ns": ""}}, checkpoint, {}, {})
+    return session_id
+
+
+@pytest.mark.asyncio
+async def test_ndjson_stream(tmp_path):
+    saver = await TunedSqliteSaver.open(tmp_path / "cp.sqlite")
+    session_id = await start_session(saver, 3)
+    session = await session_manager.get_session(session_id)
+
+    chunks = [chunk async for chunk in session_export.stream_ndjson(session_id, session, saver)]
+    records = [orjson.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert records[0]["record"] == "session" and records[0]["user_id"] == "u1"
+    messages = [r for r in records if r["record"] == "message"]
+    assert [m["content"] for m in messages[:2]] == ["question 0", "answer 0"]
+    assert [m["role"] for m in messages[:2]] == ["human", "ai"]
+    assert len(messages) == 6
+    assert [r["index"] for r in records if r["record"] == "turn"] == [0, 1, 2]
+    await saver.close()
+
+
+@pytest.mark.asyncio
+async def test_bulk_export_files(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow.parquet")
+    saver = await TunedSqliteSaver.open(tmp_path / "cp.sqlite")
+    session_ids = [await start_session(saver, turns) for turns in (1, 2, 3)]
+    # Metadata gone, checkpoints still there: still exported
+    await session_manager.delete_session(session_ids[0])
+
+    results = await session_export.bulk_export(session_ids, saver, "parquet", concurrency=2, export_dir=tmp_path)
+    assert all("error" not in result for result in results)
+    table = pyarrow.read_table(results[2]["path"])
+    assert table.num_rows == results[2]["records"] == 3 * 2 + 3
+    assert table.column("content").to_pylist()[:2] == ["question 0", "answer 0"]
+    assert orjson.loads(table.schema.metadata[b"session"])["session_id"] == str(session_ids[2])
+    assert results[0]["records"] == 2
+
+    results = await session_export.bulk_export(session_ids[1:], saver, "ndjson", export_dir=tmp_path)
+    with open(results[0]["path"], "rb") as f:
+        assert len(f.read().splitlines()) == 1 + 2 * 2 + 2
+    assert not list(tmp_path.glob("*.partial"))
+
+    # Neither metadata nor checkpoints: reported, no file written
+    unknown = uuid.uuid4()
+    results = await session_export.bulk_export([unknown], saver, "ndjson", export_dir=tmp_path)
+    assert results == [{"session_id": str(unknown), "format": "ndjson", "status": "not_found", "error": "Session not found"}]
+    assert not list(tmp_path.glob(f"{unknown}.*"))
+    await saver.close()
+
+
+@pytest.mark.asyncio
+async def test_history_pages(tmp_path):
+    saver = await TunedSqliteSaver.open(tmp_path / "cp.sqlite")
+    session_id = await start_session(saver, 5)
+
+    turns, total = await session_export.history_page(session_id, saver, limit=2, batch_size=3)
+    assert total == 5 and [t["index"] for t in turns] == [3, 4]
+    assert turns[0] == {"index": 3, "user": "question 3", "ai": "answer 3"}
+    turns, _ = await session_export.history_page(session_id, saver, before=1, limit=2)
+    assert [t["user"] for t in turns] == ["question 0"]
+    # Without checkpoints, the session's recent history
+    turns, total = await session_export.history_page(session_id, None, limit=10)
+    assert total == 5 and turns[-1]["ai"] == "answer 4"
+    await saver.close()
+
+
+@pytest.mark.asyncio
+async def test_history_skips_recalled_memories(tmp_path):
+    saver = await TunedSqliteSaver.open(tmp_path / "cp.sqlite")
+    session_id = await session_manager.create_session(user_id="u1", mode="chat", agent_config={})
+    memories = HumanMessage("You have the following relevant memories:\n- likes tea\n", name=MEMORY_MESSAGE_NAME)
+    legacy = HumanMessage("You have the following relevant memories:\n- lives in Oslo\n")
+    messages = [memories, HumanMessage("question 0"), AIMessage("answer 0"),
+                legacy, HumanMessage("question 1"), AIMessage("answer 1")]
+    checkpoint = create_checkpoint(empty_checkpoint(), None, 0)
+    checkpoint["channel_values"] = {"messages": messages}
+    await saver.aput({"configurable": {"thread_id": str(session_id), "checkpoint_ns": ""}}, checkpoint, {}, {})
+
+    turns, total = await session_export.history_page(session_id, saver, limit=10)
+    assert total == 2
+    assert [(t["user"], t["ai"]) for t in turns] == [("question 0", "answer 0"), ("question 1", "answer 1")]
+    await saver.close()
+
+
+def test_bulk_export_request_is_bounded():
+    from pydantic import ValidationError
+    from api.core.config import settings
+    from api.v1.schemas.simulate import BulkExportRequest
+
+    ids = [uuid.uuid4()]
+    assert BulkExportRequest(session_ids=ids, concurrency=settings.EXPORT_MAX_CONCURRENCY).concurrency
+    with pytest.raises(ValidationError):
+        BulkExportRequest(session_ids=ids, concurrency=settings.EXPORT_MAX_CONCURRENCY + 1)
+    with pytest.raises(ValidationError):
+        BulkExportRequest(session_ids=ids * (settings.EXPORT_MAX_SESSIONS + 1))
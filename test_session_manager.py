@@ -0,0 +1,180 @@
+"""One behavioural suite run against every session backend.
+
+The Redis backend runs on the ``fake_redis`` fixture (conftest.py).
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from api.services.session_manager import RedisSessionManager, SessionManager
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_manager(request):
+    client = request.getfixturevalue("fake_redis") if request.param == "redis" else None
+
+    async def factory(ttl_seconds=60, history_turns=100):
+        if client is None:
+            return SessionManager(ttl_seconds=ttl_seconds, history_turns=history_turns)
+        return RedisSessionManager(client, ttl_seconds=ttl_seconds, history_turns=history_turns, near_cache_seconds=0)
+
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_create_and_get(make_manager):
+    manager = await make_manager()
+    session_id = await manager.create_session("user-1", "test", agent_config={"temperature": 0.2})
+
+    session = await manager.get_session(session_id)
+    assert session["user_id"] == "user-1"
+    assert session["mode"] == "test"
+    assert session["agent_config"] == {"temperature": 0.2}
+    assert session["graph_config"] == {"configurable": {"thread_id": str(session_id)}}
+    assert session["message_count"] == 0
+    assert await manager.get_session(uuid.uuid4()) is None
+
+
+@pytest.mark.asyncio
+async def test_update_session(make_manager):
+    manager = await make_manager()
+    session_id = await manager.create_session("user-1", "test")
+    await manager.update_session(session_id, {"agent_config": {"model": "x"}})
+    assert (await manager.get_session(session_id))["agent_config"] == {"model": "x"}
+
+    # Any structured field reads back as it was written, not just the known ones
+    await manager.update_session(session_id, {"x": {"tags": ["a", "b"], "n": 1}, "labels": ["ops"], "note": "plain"})
+    session = await manager.get_session(session_id)
+    assert session["x"] == {"tags": ["a", "b"], "n": 1} and session["labels"] == ["ops"] and session["note"] == "plain"
+
+    missing = uuid.uuid4()
+    await manager.update_session(missing, {"mode": "ghost"})
+    assert await manager.get_session(missing) is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_history_appends_are_atomic(make_manager):
+    manager = await make_manager()
+    session_id = await manager.create_session("user-1", "test")
+    await asyncio.gather(*(manager.update_history(session_id, f"q{i}", f"a{i}") for i in range(50)))
+
+    history = await manager.get_history(session_id)
+    assert len(history) == 50
+    assert {"user": "q7", "ai": "a7"} in history
+    assert (await manager.get_session(session_id))["message_count"] == 50
+
+
+@pytest.mark.asyncio
+async def test_history_keeps_only_recent_turns(make_manager):
+    manager = await make_manager(history_turns=3)
+    session_id = await manager.create_session("user-1", "test")
+    for i in range(5):
+        await manager.update_history(session_id, f"q{i}", f"a{i}")
+
+    assert [turn["user"] for turn in await manager.get_history(session_id)] == ["q2", "q3", "q4"]
+    assert (await manager.get_session(session_id))["message_count"] == 5
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_shared_between_manager_instances(make_manager):
+    # Two managers over the same store stand in for two workers
+    first = await make_manager()
+    if isinstance(first, SessionManager):
+        pytest.skip("in-memory sessions are per-process by design")
+    second = RedisSessionManager(first.redis, near_cache_seconds=0)
+
+    session_id = await first.create_session("user-1", "test")
+    await second.update_history(session_id, "hello", "hi")
+    assert (await first.get_session(session_id))["message_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_sessions_expire_and_activity_renews(make_manager):
+    manager = await make_manager(ttl_seconds=1)
+    session_id = await manager.create_session("user-1", "test")
+    await asyncio.sleep(0.7)
+    await manager.update_history(session_id, "still", "here")
+    await asyncio.sleep(0.7)
+    assert await manager.get_session(session_id) is not None
+    await asyncio.sleep(1.5)
+    assert await manager.get_session(session_id) is None
+    assert await manager.get_history(session_id) == []
+
+
+@pytest.mark.asyncio
+async def test_delete_session(make_manager):
+    manager = await make_manager()
+    session_id = await manager.create_session("user-1", "test")
+    await manager.update_history(session_id, "q", "a")
+    await manager.delete_session(session_id)
+    assert await manager.get_session(session_id) is None
+    assert await manager.get_history(session_id) == []
+
+
+@pytest.mark.asyncio
+async def test_memory_store_evicts_least_recently_used():
+    manager = SessionManager(max_sessions=2)
+    first = await manager.create_session("user-1", "test")
+    second = await manager.create_session("user-2", "test")
+    await manager.get_session(first)  # first is now more recently used than second
+    third = await manager.create_session("user-3", "test")
+
+    assert await manager.get_session(second) is None
+    assert await manager.get_session(first) is not None
+    assert await manager.get_session(third) is not None
+    assert manager.stats()["evicted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_store_tracks_bytes_and_enforces_cap():
+    manager = SessionManager(history_turns=2, max_bytes=10_000_000)
+    session_id = await manager.create_session("user-1", "test")
+    baseline = manager.stats()["approx_bytes"]
+    await manager.update_history(session_id, "q" * 10_000, "a" * 10_000)
+    grown = manager.stats()["approx_bytes"]
+    assert grown - baseline >= 20_000
+
+    for _ in range(5):  # ring buffer: size stays bounded by the last two turns
+        await manager.update_history(session_id, "q" * 10_000, "a" * 10_000)
+    assert manager.stats()["approx_bytes"] < baseline + 3 * 20_500
+
+    manager.max_bytes = baseline + 100
+    await manager.update_history(session_id, "q", "a")
+    assert manager.stats()["live_sessions"] == 0
+    assert manager.stats()["approx_bytes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_sweeper_expires_idle_sessions():
+    manager = SessionManager(ttl_seconds=0.2)
+    await manager.create_session("user-1", "test")
+    manager.start_sweeper(interval_seconds=0.1)
+    try:
+        await asyncio.sleep(0.5)
+    finally:
+        await manager.stop_sweeper()
+    assert manager.stats()["live_sessions"] == 0
+    assert manager.stats()["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fork_session(make_manager):
+    manager = await make_manager()
+    session_id = await manager.create_session("user-1", "test", agent_config={"temperature": 0.2})
+    await manager.update_history(session_id, "u0", "a0")
+
+    fork_id = await manager.fork_session(session_id, forked_from=str(session_id))
+    fork = await manager.get_session(fork_id)
+    assert fork["graph_config"] == {"configurable": {"thread_id": str(fork_id)}}
+    assert fork["agent_config"] == {"temperature": 0.2}
+    assert fork["forked_from"] == str(session_id)
+    assert fork["message_count"] == 1
+    assert await manager.get_history(fork_id) == [{"user": "u0", "ai": "a0"}]
+
+    # Independent from here on
+    await manager.update_history(fork_id, "u1", "fork")
+    assert len(await manager.get_history(session_id)) == 1
+    empty = await manager.fork_session(session_id, copy_history=False)
+    assert await manager.get_history(empty) == []
+    assert await manager.fork_session(uuid.uuid4()) is None
@@ -0,0 +1,114 @@
+"""SSE event streams: framing, token coalescing, keep-alives and Last-Event-ID resume."""
+import asyncio
+import itertools
+import uuid
+
+import httpx
+import orjson
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from api.logic import graph_nodes
+from api.services.sse import KEEP_ALIVE, EventStream, StreamGone, parse_event_id
+
+
+def parse(body: bytes):
+    """SSE body -> list of (id, event type, data) with keep-alive comments dropped."""
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["id"], fields["event"], orjson.loads(fields["data"])))
+    return events
+
+
+async def token_events(tokens, delay=0.0):
+    for token in tokens:
+        await asyncio.sleep(delay)
+        yield {"type": "token", "content": token}
+    yield {"type": "done", "response": "".join(tokens)}
+
+
+def new_stream(**kwargs):
+    options = {"max_events": 100, "coalesce_chars": 1000, "coalesce_seconds": 0.05, **kwargs}
+    return EventStream("s1", "owner", **options)
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_coalesced_and_framed():
+    stream = new_stream()
+    tokens = ["line one\n", "data: two\n\n", *["x"] * 50]
+    await stream.run(token_events(tokens))
+    body = b"".join([chunk async for chunk in stream.follow()])
+
+    events = parse(body)
+    assert [kind for _, kind, _ in events][-1] == "done"
+    text = "".join(data["content"] for _, kind, data in events if kind == "token")
+    assert text == "".join(tokens)  # newlines and "data:" inside content don't break framing
+    assert len(events) < 5  # first token at once, the rest merged
+    assert [event_id for event_id, _, _ in events] == [f"s1:{n}" for n in range(1, len(events) + 1)]
+
+
+@pytest.mark.asyncio
+async def test_slow_tokens_flush_by_time():
+    stream = new_stream(coalesce_seconds=0.02)
+    await stream.run(token_events(["a", "b", "c"], delay=0.05))
+    assert [data["content"] for _, kind, data in parse(b"".join(f for _, f in stream.frames)) if kind == "token"] == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_keep_alive_while_idle():
+    stream = new_stream()
+
+    async def slow():
+        await asyncio.sleep(0.25)
+        yield {"type": "done", "response": ""}
+
+    task = asyncio.create_task(stream.run(slow()))
+    chunks = [chunk async for chunk in stream.follow(heartbeat_seconds=0.1)]
+    await task
+    assert chunks.count(KEEP_ALIVE) >= 1
+    assert parse(chunks[-1])[0][1] == "done"
+
+
+@pytest.mark.asyncio
+async def test_resume_after_last_event_id():
+    stream = new_stream(max_events=3, coalesce_chars=1)
+    await stream.run(token_events(["a", "b", "c", "d"]))
+
+    assert parse_event_id("s1:3") == ("s1", 3)
+    resumed = parse(b"".join([chunk async for chunk in stream.follow(after=3)]))
+    assert [(event_id, data.get("content")) for event_id, _, data in resumed] == [("s1:4", "d"), ("s1:5", None)]
+    with pytest.raises(StreamGone):
+        stream.frames_after(1)
+    with pytest.raises(ValueError):
+        parse_event_id("no-stream")
+
+
+@pytest.mark.asyncio
+async def test_message_endpoint_streams_and_resumes(monkeypatch, tmp_path):
+    class StreamingModel(GenericFakeChatModel):
+        def bind_tools(self, *args, **kwargs):
+            return self
+
+    answer = AIMessage(content="line one\nline two")
+    monkeypatch.setattr(graph_nodes, "ChatOllama", lambda **_: StreamingModel(messages=itertools.repeat(answer)))
+    monkeypatch.chdir(tmp_path)
+    from api.main import app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/api/v1/simulate/start", json={"user_id": "u1", "mode": "chat", "agent_config": {}})
+            session_id = response.json()["session_id"]
+            response = await client.post(f"/api/v1/simulate/{session_id}/message?stream=true", json={"content": "hi"})
+            events = parse(response.content)
+            assert "".join(data["content"] for _, kind, data in events if kind == "token") == "line one\nline two"
+            assert events[-1][2]["response"] == "line one\nline two"
+
+            first_id = events[0][0]
+            resumed = await client.get(f"/api/v1/simulate/{session_id}/stream", headers={"Last-Event-ID": first_id})
+            assert parse(resumed.content) == events[1:]
+            other = await client.get(f"/api/v1/simulate/{uuid.uuid4()}/stream", headers={"Last-Event-ID": first_id})
+            assert other.status_code == 404  # another session's stream
+            missing = await client.get(f"/api/v1/simulate/{session_id}/stream", headers={"Last-Event-ID": "nope:1"})
+            assert missing.status_code == 404
@@ -0,0 +1,44 @@
+from api.logic.tool_results import compact_tool_result, estimate_tokens
+
+
+SEARCH_RESULTS = [
+    {"snippet": "Paris is the capital and most populous city of France.", "link": "https://en.wikipedia.org/wiki/Paris"},
+    {"snippet": "The Eiffel Tower was completed in 1889.", "link": "https://example.com/eiffel"},
+    {"snippet": "Paris is the capital and most populous city of France!", "link": "https://www.wikipedia.org/wiki/Paris-mirror"},
+    {"snippet": "Unrelated text about cooking pasta at home.", "link": "https://example.com/pasta"},
+]
+
+
+def test_search_results_are_deduped_and_ranked():
+    text, report = compact_tool_result("web_search", SEARCH_RESULTS, query="capital of France")
+    lines = text.splitlines()
+    assert report.items_in == 4
+    assert report.duplicates_dropped == 1
+    assert len(lines) == 3
+    assert lines[0].startswith("1. Paris is the capital")
+    assert "https://en.wikipedia.org/wiki/Paris" in lines[0]
+    assert "[{" not in text  # no Python repr leaks through
+
+
+def test_compaction_saves_tokens_against_raw_repr():
+    _, report = compact_tool_result("web_search", SEARCH_RESULTS, query="Paris")
+    assert report.raw_tokens == estimate_tokens(str(SEARCH_RESULTS))
+    assert report.compact_tokens < report.raw_tokens
+    assert report.as_dict()["saved_tokens"] == report.raw_tokens - report.compact_tokens
+
+
+def test_token_budget_is_enforced():
+    results = [{"snippet": f"result number {i} " + "word " * 60, "link": f"https://example.com/{i}"} for i in range(20)]
+    text, report = compact_tool_result("web_search", results, query="result", token_budget=200)
+    assert estimate_tokens(text) <= 200
+    assert report.truncated
+    assert report.items_kept < 20
+
+
+def test_non_search_results_fall_back_to_compact_text():
+    text, report = compact_tool_result("other", "Error performing   web search:\n timeout", token_budget=50)
+    assert text == "Error performing web search: timeout"
+    assert not report.truncated
+
+    text, _ = compact_tool_result("other", {"a": 1, "b": [1, 2]})
+    assert text == '{"a":1,"b":[1,2]}'
@@ -0,0 +1,132 @@
+"""WebSocket chat: turn events, in-band stop and frame errors."""
+import asyncio
+import uuid
+
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+from langchain_core.messages import AIMessage
+
+from api.logic import graph_nodes
+
+
+class SlowModel:
+    """Answers after ``delay`` seconds."""
+
+    delay = 0.0
+
+    def __init__(self, **_):
+        pass
+
+    def bind_tools(self, *args, **kwargs):
+        return self
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.delay)
+        return AIMessage(content="hello there", usage_metadata={"input_tokens": 5, "output_tokens": 2, "total_tokens": 7})
+
+
+class Socket:
+    """Minimal ASGI WebSocket client driving the app in process."""
+
+    def __init__(self, app, path):
+        self.incoming, self.outgoing = asyncio.Queue(), asyncio.Queue()
+        scope = {"type": "websocket", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+                 "headers": [], "scheme": "ws", "server": ("test", 80), "client": ("test", 1), "subprotocols": []}
+        self.broken = False  # when set, the transport fails every frame the app sends
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.create_task(app(scope, self.incoming.get, self._send))
+
+    async def _send(self, message):
+        if self.broken:
+            raise RuntimeError("socket is gone")
+        await self.outgoing.put(message)
+
+    async def receive(self):
+        while True:
+            message = await asyncio.wait_for(self.outgoing.get(), 10)
+            if message["type"] == "websocket.send":
+                return orjson.loads(message["text"])
+            if message["type"] == "websocket.close":
+                return {"type": "closed", "code": message["code"]}
+
+    def send(self, frame):
+        text = frame if isinstance(frame, str) else orjson.dumps(frame).decode()
+        self.incoming.put_nowait({"type": "websocket.receive", "text": text})
+
+    async def close(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 10)
+
+
+@pytest_asyncio.fixture
+async def app(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)  # checkpoints go to ./data
+    monkeypatch.setattr(graph_nodes, "ChatOllama", SlowModel)
+    from api.main import app
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/api/v1/simulate/start", json={"user_id": "u1", "mode": "chat", "agent_config": {}})
+            app.state.session_id = response.json()["session_id"]
+            yield app
+
+
+async def receive_until(ws, kind):
+    frames = []
+    while not frames or frames[-1]["type"] != kind:
+        frames.append(await ws.receive())
+    return frames
+
+
+@pytest.mark.asyncio
+async def test_turn_streams_events_then_records_history(app):
+    from api.services.session_manager import session_manager
+    ws = Socket(app, f"/api/v1/simulate/{app.state.session_id}/ws")
+    assert (await ws.receive())["type"] == "ready"
+    ws.send({"type": "message", "content": "hi"})
+    frames = await receive_until(ws, "done")
+    ws.send({"type": "ping"})
+    assert await ws.receive() == {"type": "pong"}
+    await ws.close()
+
+    assert [frame["type"] for frame in frames] == ["usage", "token", "done"]
+    assert frames[1]["content"] == "hello there"
+    assert frames[-1]["response"] == "hello there" and frames[-1]["iterations"] == 1
+    history = await session_manager.get_history(uuid.UUID(app.state.session_id))
+    assert history[-1] == {"user": "hi", "ai": "hello there"}
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_running_turn(app, monkeypatch):
+    monkeypatch.setattr(SlowModel, "delay", 30.0)
+    ws = Socket(app, f"/api/v1/simulate/{app.state.session_id}/ws")
+    await ws.receive()
+    ws.send({"type": "message", "content": "hi"})
+    ws.send({"type": "message", "content": "again"})
+    assert (await ws.receive())["status"] == 409
+    ws.send({"type": "stop"})
+    assert await ws.receive() == {"type": "stopped"}
+    ws.send("not json")
+    assert (await ws.receive())["status"] == 400
+    await ws.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_send_ends_the_connection(app, monkeypatch):
+    monkeypatch.setattr(SlowModel, "delay", 30.0)
+    ws = Socket(app, f"/api/v1/simulate/{app.state.session_id}/ws")
+    await ws.receive()
+    ws.send({"type": "message", "content": "hi"})
+    await asyncio.sleep(0.05)
+    ws.broken = True
+    ws.send({"type": "ping"})
+    # The handler returns by itself, cancelling the running turn, without waiting for a disconnect
+    await asyncio.wait_for(ws.task, 5)
+
+
+@pytest.mark.asyncio
+async def test_unknown_session_is_rejected(app):
+    ws = Socket(app, "/api/v1/simulate/00000000-0000-0000-0000-000000000000/ws")
+    assert await ws.receive() == {"type": "closed", "code": 1008}
+    await asyncio.wait_for(ws.task, 10)